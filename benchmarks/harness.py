@@ -0,0 +1,296 @@
+"""
+Shared machinery for the service load benchmarks
+
+- Stub upstreams (Shodan, SpiderFoot) on local ports with a fixed latency
+- Starting a service under uvicorn (subprocess, or in this process)
+- A closed-loop load driver: N concurrent clients pick weighted operations
+  for a fixed duration and record per-operation latency
+- Peak RSS of a service and its worker processes, and baseline comparison
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def app_dir(service: str) -> str:
+    return os.path.join(REPO, "services", service, "app")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ===== Stub upstreams =====
+
+def _stub_handler(latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, body: dict):
+            time.sleep(latency)
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path.startswith("/shodan/host/search"):
+                self._reply({"total": 2, "matches": [
+                    {"ip_str": "198.51.100.7", "port": 443, "org": "Example", "product": "nginx",
+                     "location": {"country_name": "US"}} for _ in range(2)
+                ]})
+            elif path.startswith("/shodan/host/"):
+                ip = path.rsplit("/", 1)[1]
+                self._reply({"ip_str": ip, "hostnames": [f"host-{ip}.example"], "ports": [22, 80, 443],
+                             "org": "Example", "country_name": "US",
+                             "data": [{"port": p, "banner": "x" * 200} for p in (22, 80, 443)]})
+            elif path.startswith("/dns/resolve"):
+                self._reply({"example.com": "93.184.216.34"})
+            elif path.startswith("/api-info"):
+                self._reply({"plan": "stub", "query_credits": 100, "scan_credits": 100})
+            elif path.startswith("/search"):  # exploits API
+                self._reply({"total": 1, "matches": [{"_id": 1, "description": "stub", "cve": ["CVE-2024-0001"]}]})
+            else:  # SpiderFoot UI root
+                self._reply({"spiderfoot": "stub"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            self._reply({"scan": "started"})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+class StubServer:
+    """Threaded HTTP server answering Shodan and SpiderFoot paths with canned JSON"""
+
+    def __init__(self, latency_ms: float = 50):
+        self.server = ThreadingHTTPServer(("127.0.0.1", free_port()), _stub_handler(latency_ms / 1000))
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+# ===== Running a service =====
+
+def _proc_kb(pid: int, field: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def _children(pid: int) -> List[int]:
+    pids = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                pids.extend(int(p) for p in f.read().split())
+    except OSError:
+        pass
+    return pids
+
+class ServiceProcess:
+    """A service under uvicorn in a subprocess, with the repo root on PYTHONPATH for shared/"""
+
+    def __init__(self, service: str, env: Dict[str, str], workdir: str):
+        self.service = service
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {**os.environ, "PYTHONPATH": REPO, "PYTHONUNBUFFERED": "1", "LOG_LEVEL": "WARNING", **env}
+        self.workdir = workdir
+        self.proc: Optional[subprocess.Popen] = None
+        self._peak_workers_kb = 0
+
+    def __enter__(self):
+        self.log = open(os.path.join(self.workdir, f"{self.service}.log"), "wb")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port), "--log-level", "warning",
+             "--no-access-log"],
+            cwd=app_dir(self.service), env=self.env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        _wait_healthy(self.url, self.proc)
+        return self
+
+    def sample_workers(self):
+        """Track the worker pool's combined RSS (call periodically during a run)"""
+        total = sum(_proc_kb(pid, "VmRSS") for pid in _children(self.proc.pid))
+        self._peak_workers_kb = max(self._peak_workers_kb, total)
+
+    def memory(self) -> dict:
+        return {
+            "peak_rss_mb": round(_proc_kb(self.proc.pid, "VmHWM") / 1024, 1),
+            "workers_peak_rss_mb": round(self._peak_workers_kb / 1024, 1)
+        }
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+
+class InProcessService:
+    """
+    The same service served by uvicorn on a thread of this process. Avoids
+    process start-up and IPC noise; memory figures then include the driver.
+    One service per benchmark process (every app's module is called main).
+    """
+
+    def __init__(self, service: str, env: Dict[str, str], workdir: str):
+        self.service = service
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {"LOG_LEVEL": "WARNING", **env}
+
+    def __enter__(self):
+        import uvicorn
+
+        os.environ.update(self.env)
+        sys.path[:0] = [app_dir(self.service), REPO]
+        os.chdir(app_dir(self.service))
+        from main import app  # noqa: E402 - env must be set first
+
+        config = uvicorn.Config(app, port=self.port, log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        _wait_healthy(self.url)
+        return self
+
+    def sample_workers(self):
+        pass
+
+    def memory(self) -> dict:
+        return {"peak_rss_mb": round(_proc_kb(os.getpid(), "VmHWM") / 1024, 1), "workers_peak_rss_mb": None}
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(10)
+
+def _wait_healthy(url: str, proc: Optional[subprocess.Popen] = None, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Service exited with code {proc.returncode} during start-up")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy in {timeout:.0f}s")
+
+# ===== Load driver =====
+
+# An operation: (name, weight, build) where build(rng) -> (method, path, httpx request kwargs)
+Operation = Tuple[str, float, Callable[[random.Random], Tuple[str, str, dict]]]
+
+def _summary(latencies: List[float], errors: int, seconds: float) -> dict:
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2)
+    }
+
+async def _drive(url: str, operations: List[Operation], duration: float, concurrency: int, seed: int,
+                 on_tick: Callable[[], None]) -> dict:
+    names = [op[0] for op in operations]
+    weights = [op[1] for op in operations]
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def user(index: int):
+            rng = random.Random(seed * 1000 + index)
+            while time.perf_counter() < deadline:
+                name, _, build = rng.choices(operations, weights)[0]
+                method, path, kwargs = build(rng)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies[name].append(time.perf_counter() - start)
+                errors[name] += not ok
+
+        async def ticker():
+            while time.perf_counter() < deadline:
+                on_tick()
+                await asyncio.sleep(0.5)
+
+        start = time.perf_counter()
+        await asyncio.gather(ticker(), *[user(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    all_latencies = [value for name in names for value in latencies[name]]
+    return {
+        "total": _summary(all_latencies, sum(errors.values()), elapsed),
+        "operations": {name: _summary(latencies[name], errors[name], elapsed) for name in names if latencies[name]}
+    }
+
+def drive(url: str, operations: List[Operation], duration: float, concurrency: int, seed: int = 1,
+          on_tick: Callable[[], None] = lambda: None) -> dict:
+    """Closed-loop load: `concurrency` clients issue weighted operations back to back for `duration` s"""
+    return asyncio.run(_drive(url, operations, duration, concurrency, seed, on_tick))
+
+# ===== Baselines =====
+
+def _scenarios(report: dict) -> dict:
+    return {name: result for service in report.get("services", {}).values()
+            for name, result in service["scenarios"].items()}
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Regressions of p95 latency or throughput beyond `threshold` (fraction) per scenario operation"""
+    regressions = []
+    base_scenarios = _scenarios(baseline)
+    for scenario, result in _scenarios(current).items():
+        base = base_scenarios.get(scenario)
+        if not base:
+            continue
+        for name, stats in {"total": result["total"], **result["operations"]}.items():
+            ref = base["total"] if name == "total" else base["operations"].get(name)
+            if not ref:
+                continue
+            if ref["p95_ms"] > 0 and stats["p95_ms"] > ref["p95_ms"] * (1 + threshold):
+                regressions.append(f"{scenario}/{name}: p95 {ref['p95_ms']} -> {stats['p95_ms']} ms")
+            if ref["rps"] > 0 and stats["rps"] < ref["rps"] * (1 - threshold):
+                regressions.append(f"{scenario}/{name}: throughput {ref['rps']} -> {stats['rps']} req/s")
+            if stats["errors"] > ref["errors"] and stats["errors"] > 0.01 * max(stats["requests"], 1):
+                regressions.append(f"{scenario}/{name}: errors {ref['errors']} -> {stats['errors']}")
+    return regressions
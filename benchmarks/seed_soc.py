@@ -0,0 +1,115 @@
+"""
+Seed a SOC Core SQLite database for benchmarks
+
+Creates the schema with soc-core's own init_db() (in a subprocess, so the
+tables always match the current models), then bulk-inserts deterministic
+clients, cases and alerts: `rows` alerts, rows/10 cases, rows/100 clients.
+
+    python benchmarks/seed_soc.py /tmp/soc.db --rows 1000000
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import uuid
+
+from harness import REPO, app_dir
+
+SOURCES = ["osint", "ai-protect", "voice-protect", "manual"]
+ALERT_TYPES = ["exposed_service", "credential_leak", "deepfake_audio", "image_misuse", "dark_web_mention"]
+SEVERITIES = ["info", "info", "info", "warning", "warning", "critical"]
+CASE_STATUSES = ["open", "investigating", "resolved", "closed"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+BATCH = 50000
+
+def _init_schema(db_path: str):
+    env = {**os.environ, "PYTHONPATH": REPO, "DATABASE_URL": f"sqlite:///{os.path.abspath(db_path)}"}
+    subprocess.run([sys.executable, "-c", "from database import init_db; init_db()"],
+                   cwd=app_dir("soc-core"), env=env, check=True)
+
+def _insert(conn: sqlite3.Connection, table: str, rows):
+    """
+    Insert dict rows (all with the same keys), keeping only columns the
+    current schema has; columns the rows lack keep their server defaults
+    """
+    schema = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+    columns = None
+    batch = []
+    for row in rows:
+        if columns is None:
+            columns = [c for c in schema if c in row]
+        batch.append(tuple(row[c] for c in columns))
+        if len(batch) >= BATCH:
+            conn.executemany(f"INSERT INTO {table} ({','.join(columns)}) VALUES ({','.join('?' * len(columns))})", batch)
+            batch = []
+    if batch:
+        conn.executemany(f"INSERT INTO {table} ({','.join(columns)}) VALUES ({','.join('?' * len(columns))})", batch)
+
+def seed(db_path: str, rows: int, seed_value: int = 42) -> dict:
+    """Fresh database at db_path with `rows` alerts; returns the generated ids for request builders"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    start = time.perf_counter()
+    _init_schema(db_path)
+    rng = random.Random(seed_value)
+    now = datetime(2026, 1, 1)
+
+    def ts(max_days: int = 365) -> str:
+        return (now - timedelta(seconds=rng.randrange(max_days * 86400))).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    n_clients, n_cases = max(10, rows // 100), max(10, rows // 10)
+    client_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(n_clients)]
+    case_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(n_cases)]
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    with conn:
+        _insert(conn, "clients", ({
+            "id": cid, "name": f"Client {i}", "code_name": f"VIP-{i:05d}", "email": f"client{i}@example.com",
+            "risk_level": rng.choice(PRIORITIES), "status": "active", "created_at": ts(), "updated_at": ts()
+        } for i, cid in enumerate(client_ids)))
+        _insert(conn, "cases", ({
+            "id": cid, "client_id": rng.choice(client_ids), "title": f"Case {i}",
+            "description": "Seeded benchmark case", "status": rng.choice(CASE_STATUSES),
+            "priority": rng.choice(PRIORITIES), "assigned_to": f"analyst{i % 20}", "created_at": ts(), "updated_at": ts()
+        } for i, cid in enumerate(case_ids)))
+
+        def alerts():
+            for i in range(rows):
+                acknowledged = rng.random() < 0.7
+                created_at = ts()
+                yield {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "case_id": rng.choice(case_ids) if rng.random() < 0.3 else None,
+                    "source": rng.choice(SOURCES), "alert_type": rng.choice(ALERT_TYPES),
+                    "message": f"Seeded alert {i} for benchmark", "severity": rng.choice(SEVERITIES),
+                    "acknowledged": int(acknowledged), "acknowledged_by": "analyst" if acknowledged else None,
+                    "created_at": created_at, "last_seen_at": created_at,
+                    "occurrences": 1 if rng.random() < 0.8 else rng.randint(2, 50)
+                }
+        _insert(conn, "alerts", alerts())
+    conn.close()
+    return {
+        "rows": rows,
+        "seconds": round(time.perf_counter() - start, 2),
+        "bytes": os.path.getsize(db_path),
+        "client_ids": client_ids[:100],
+        "case_ids": case_ids[:1000]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+    info = seed(args.path, args.rows)
+    print(json.dumps({k: v for k, v in info.items() if not k.endswith("_ids")}, indent=2))
+
+if __name__ == "__main__":
+    main()
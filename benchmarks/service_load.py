@@ -0,0 +1,224 @@
+"""
+Load benchmark for the hot endpoints of every API service
+
+Starts each service under uvicorn (or, with --in-process, on a thread of
+this process) against stub Shodan/SpiderFoot upstreams and a seeded SOC
+database, then drives realistic request mixes with a fixed number of
+concurrent clients:
+
+    soc-dashboard     dashboard polling: summary, alert/case stats, alert lists, case detail
+    soc-ingest        alert ingestion with some list reads
+    osint-shodan      Shodan host lookups (repeating IPs), search, DNS, exploits
+    osint-spiderfoot  scan submission, module list, SpiderFoot health
+    protect-queue     Colab workers polling for jobs, dashboard stats, image uploads
+    voice-upload      audio analysis uploads, verify lookups, engine status
+
+Reports throughput and p50/p95/p99 latency per operation plus peak RSS as
+JSON. --baseline compares against a stored result and exits non-zero on
+regressions beyond --threshold.
+
+    python benchmarks/service_load.py --rows 100000 --json results.json
+    python benchmarks/service_load.py --services soc-core --baseline results.json
+"""
+from typing import Dict, List
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import InProcessService, ServiceProcess, StubServer, compare, drive
+from seed_soc import seed, SOURCES, ALERT_TYPES
+
+SERVICES = ["soc-core", "osint", "ai-protect", "voice-protect"]
+BASE_ENV = {"RATE_LIMIT": "1000000000", "DISABLE_AUTH": "true", "LOG_SAMPLE_RATE": "0"}
+
+# ===== Request mixes =====
+
+def soc_scenarios(ids: dict) -> Dict[str, list]:
+    case_ids, client_ids = ids["case_ids"], ids["client_ids"]
+    get = lambda path: lambda rng: ("GET", path, {})  # noqa: E731
+
+    def new_alert(rng):
+        body = {"source": rng.choice(SOURCES), "alert_type": rng.choice(ALERT_TYPES),
+                "message": f"Benchmark alert {rng.getrandbits(32):08x}", "severity": rng.choice(["info", "warning", "critical"])}
+        if rng.random() < 0.2:
+            body["case_id"] = rng.choice(case_ids)
+        return "POST", "/api/soc/alerts/", {"json": body}
+
+    return {
+        "soc-dashboard": [
+            ("summary", 2, get("/api/soc/summary")),
+            ("alert_stats", 2, get("/api/soc/alerts/stats")),
+            ("case_stats", 2, get("/api/soc/cases/stats/overview")),
+            ("recent_alerts", 4, get("/api/soc/alerts/?limit=50")),
+            ("open_critical", 2, get("/api/soc/alerts/?severity=critical&acknowledged=false&limit=50")),
+            ("alert_trend", 1, get("/api/soc/alerts/timeseries?bucket=1h&by=severity")),
+            ("case_detail", 2, lambda rng: ("GET", f"/api/soc/cases/{rng.choice(case_ids)}", {})),
+            ("client_cases", 1, lambda rng: ("GET", f"/api/soc/clients/{rng.choice(client_ids)}/cases", {}))
+        ],
+        "soc-ingest": [
+            ("create_alert", 8, new_alert),
+            ("recent_alerts", 2, get("/api/soc/alerts/?limit=50"))
+        ]
+    }
+
+def osint_scenarios() -> Dict[str, list]:
+    ips = [f"198.51.100.{i}" for i in range(1, 201)]
+    return {
+        "osint-shodan": [
+            ("host", 6, lambda rng: ("GET", f"/api/osint/shodan/host/{rng.choice(ips)}", {})),
+            ("search", 2, lambda rng: ("GET", "/api/osint/shodan/search", {"params": {"query": f"port:{rng.choice([22, 80, 443, 3389])}"}})),
+            ("dns", 1, lambda rng: ("GET", "/api/osint/shodan/dns/example.com", {})),
+            ("exploits", 1, lambda rng: ("GET", "/api/osint/shodan/exploits", {"params": {"query": "apache"}}))
+        ],
+        "osint-spiderfoot": [
+            ("scan", 1, lambda rng: ("POST", "/api/osint/spiderfoot/scan", {"json": {"target": f"t{rng.getrandbits(16)}.example.com"}})),
+            ("modules", 2, lambda rng: ("GET", "/api/osint/spiderfoot/modules", {})),
+            ("health", 2, lambda rng: ("GET", "/api/osint/spiderfoot/health", {}))
+        ]
+    }
+
+def _png_pool(n: int) -> List[bytes]:
+    from PIL import Image
+
+    rng = np.random.default_rng(3)
+    pool = []
+    for _ in range(n):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (96, 96, 3), dtype=np.uint8)).save(buffer, format="PNG")
+        pool.append(buffer.getvalue())
+    return pool
+
+def protect_scenarios() -> Dict[str, list]:
+    images = _png_pool(50)
+
+    def upload(rng):
+        files = {"image": ("bench.png", rng.choice(images), "image/png")}
+        data = {"type": "fawkes", "client_id": f"client-{rng.randrange(20)}",
+                "priority": rng.choice(["rush", "normal", "normal", "backlog"])}
+        return "POST", "/api/protect/queue/add", {"files": files, "data": data}
+
+    return {
+        "protect-queue": [
+            ("worker_poll", 6, lambda rng: ("GET", "/api/protect/queue/pending", {})),
+            ("queue_stats", 2, lambda rng: ("GET", "/api/protect/queue/stats", {})),
+            ("upload", 2, upload)
+        ]
+    }
+
+def _wav_pool(n: int, seconds: float = 3.0) -> List[bytes]:
+    import soundfile as sf
+
+    rng = np.random.default_rng(5)
+    pool = []
+    for _ in range(n):
+        t = np.arange(int(16000 * seconds)) / 16000
+        signal = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 300) * t) + 0.05 * rng.standard_normal(len(t))
+        buffer = io.BytesIO()
+        sf.write(buffer, signal.astype(np.float32), 16000, format="WAV")
+        pool.append(buffer.getvalue())
+    return pool
+
+def voice_scenarios() -> Dict[str, list]:
+    clips = _wav_pool(10)
+
+    def analyze(rng):
+        return "POST", "/api/voice/analyze", {"files": {"audio": ("bench.wav", rng.choice(clips), "audio/wav")}}
+
+    return {
+        "voice-upload": [
+            ("analyze", 3, analyze),
+            ("verify_id", 3, lambda rng: ("GET", f"/api/voice/verify/{rng.getrandbits(32):08X}", {})),
+            ("engine", 1, lambda rng: ("GET", "/api/voice/engine", {}))
+        ]
+    }
+
+# ===== Running =====
+
+def run_service(service: str, args, workdir: str, stub: StubServer) -> dict:
+    env = dict(BASE_ENV)
+    meta = {}
+    if service == "soc-core":
+        db_path = os.path.join(workdir, "soc.db")
+        ids = seed(db_path, args.rows)
+        meta["seed"] = {k: v for k, v in ids.items() if not k.endswith("_ids")}
+        env["DATABASE_URL"] = f"sqlite:///{db_path}"
+        scenarios = soc_scenarios(ids)
+    elif service == "osint":
+        env.update({"SHODAN_API_KEY": "benchmark", "SHODAN_BASE_URL": stub.url,
+                    "SHODAN_EXPLOITS_URL": stub.url, "SPIDERFOOT_URL": stub.url})
+        scenarios = osint_scenarios()
+    elif service == "ai-protect":
+        env.update({"PROTECT_UPLOAD_DIR": os.path.join(workdir, "protect", "uploads"),
+                    "PROTECT_OUTPUT_DIR": os.path.join(workdir, "protect", "outputs"),
+                    "PROTECT_WORKERS": str(args.workers)})
+        scenarios = protect_scenarios()
+    else:
+        data = os.path.join(workdir, "voice")
+        env.update({"VOICE_DB_PATH": os.path.join(data, "voice.db"),
+                    "VOICE_UPLOAD_DIR": os.path.join(data, "uploads"),
+                    "VOICE_OUTPUT_DIR": os.path.join(data, "outputs"),
+                    "VOICE_AUDIO_CACHE_DIR": os.path.join(data, "decoded"),
+                    "VOICE_WORKERS": str(args.workers), "VOICE_BLOOM_CAPACITY": "100000"})
+        scenarios = voice_scenarios()
+
+    runner = InProcessService if args.in_process else ServiceProcess
+    results = {}
+    with runner(service, env, workdir) as svc:
+        for name, operations in scenarios.items():
+            results[name] = drive(svc.url, operations, args.duration, args.concurrency, on_tick=svc.sample_workers)
+        memory = svc.memory()
+    return {"scenarios": results, "memory": memory, **meta}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", default=",".join(SERVICES), help="Comma-separated subset of " + ",".join(SERVICES))
+    parser.add_argument("--rows", type=int, default=10000, help="Seeded SOC alerts (10000, 100000, 1000000)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for ai-protect / voice-protect")
+    parser.add_argument("--stub-latency-ms", type=float, default=50, help="Latency of the stub upstreams")
+    parser.add_argument("--in-process", action="store_true", help="Serve from this process (one service only)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json result")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95/throughput change (fraction)")
+    args = parser.parse_args()
+
+    services = [s.strip() for s in args.services.split(",") if s.strip()]
+    unknown = set(services) - set(SERVICES)
+    if unknown:
+        parser.error(f"unknown services: {', '.join(sorted(unknown))}")
+    if args.in_process and len(services) != 1:
+        parser.error("--in-process runs one service at a time")
+
+    report = {
+        "config": {k: getattr(args, k) for k in ("rows", "duration", "concurrency", "workers", "stub_latency_ms", "in_process")},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "services": {}
+    }
+    with tempfile.TemporaryDirectory() as workdir, StubServer(args.stub_latency_ms) as stub:
+        for service in services:
+            report["services"][service] = run_service(service, args, workdir, stub)
+
+    output = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
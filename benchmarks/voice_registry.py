@@ -0,0 +1,100 @@
+"""
+Lookup latency benchmark for the voice-protect watermark registry
+
+Fills a throwaway registry database with N watermark IDs, then times single
+verifies (registered, cold and LRU-warm; random unregistered) and batch
+verifies of 1,000 mixed IDs.
+
+    python benchmarks/voice_registry.py --ids 2000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "voice-protect", "app"))
+from database import Database  # noqa: E402
+from registry import WatermarkRegistry  # noqa: E402
+from voice_detection import _peak_rss_mb  # noqa: E402
+
+SAMPLES = 5000
+BATCH = 1000
+
+def _percentiles(samples: list) -> dict:
+    us = np.array(samples) * 1e6
+    return {"p50_us": round(float(np.percentile(us, 50)), 1), "p99_us": round(float(np.percentile(us, 99)), 1)}
+
+def _time_each(fn, keys, found: bool) -> dict:
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        record = fn(key)
+        samples.append(time.perf_counter() - start)
+        # Otherwise a registered verify would time a miss
+        assert (record is not None) == found, f"lookup({key}) returned {record!r}"
+    return _percentiles(samples)
+
+def run(n_ids: int) -> dict:
+    rng = np.random.default_rng(7)
+    values = np.unique(rng.integers(0, 2 ** 32, int(n_ids * 1.05), dtype=np.uint64))[:n_ids]
+    rng.shuffle(values)
+    registered = [f"{v:08X}" for v in values]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = WatermarkRegistry(Database(os.path.join(tmp, "registry.db")))
+        start = time.perf_counter()
+        # Issued watermarks have an output file; rows without one are reservations
+        registry.register_many(
+            {"watermark_id": w, "owner": f"owner-{i % 1000}", "output_path": f"/outputs/{w}_watermarked.wav"}
+            for i, w in enumerate(registered)
+        )
+        fill_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        registry.load()
+        load_seconds = time.perf_counter() - start
+
+        known = set(registered)
+        unknown = [f"{v:08X}" for v in rng.integers(0, 2 ** 32, SAMPLES * 2, dtype=np.uint64)]
+        unknown = [w for w in unknown if w not in known][:SAMPLES]
+        hits = [registered[i] for i in rng.integers(0, n_ids, SAMPLES)]
+
+        cold = _time_each(registry.lookup, hits, found=True)
+        warm = _time_each(registry.lookup, hits, found=True)
+        negative = _time_each(registry.lookup, unknown, found=False)
+
+        batch_samples = []
+        for i in range(20):
+            batch = [registered[j] for j in rng.integers(0, n_ids, BATCH // 2)] + unknown[:BATCH // 2]
+            start = time.perf_counter()
+            records = registry.lookup_many(batch)
+            batch_samples.append(time.perf_counter() - start)
+            assert all(records[w] for w in batch[:BATCH // 2]) and not any(records[w] for w in unknown[:BATCH // 2])
+
+        result = {
+            "registered_ids": n_ids,
+            "fill_seconds": round(fill_seconds, 2),
+            "bloom_load_seconds": round(load_seconds, 2),
+            "bloom_mb": round(registry.bloom.bits.nbytes / 2 ** 20, 1),
+            "verify_registered_cold": cold,
+            "verify_registered_lru": warm,
+            "verify_unregistered": negative,
+            "batch_verify_1000": {"p50_ms": round(float(np.median(batch_samples)) * 1e3, 2)},
+            "counters": registry.stats,
+            "peak_rss_mb": _peak_rss_mb()
+        }
+        registry.db.close()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, default=2000000, help="Registered watermark IDs")
+    args = parser.parse_args()
+    print(json.dumps(run(args.ids), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Per-frame latency benchmark for live voice-clone screening
+
+Replays a WAV at real-time speed in fixed-size PCM frames and reports
+processing-time percentiles per frame. By default frames go straight into
+RollingDetector in-process; with --url they are sent to a running
+voice-protect WebSocket and the round trip of each score message is
+measured as well.
+
+    python benchmarks/voice_stream_latency.py --wav call.wav
+    python benchmarks/voice_stream_latency.py --url ws://localhost:8020/api/voice/stream
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "voice-protect", "app"))
+from streaming import RollingDetector  # noqa: E402
+from voice_detection import write_wav  # noqa: E402
+
+def _percentiles(values_ms: list) -> dict:
+    values = np.array(values_ms)
+    return {
+        "frames": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+def _frames(path: str, frame_ms: int):
+    pcm, sr = sf.read(path, dtype="int16", always_2d=True)
+    pcm = pcm[:, 0]
+    step = int(sr * frame_ms / 1000)
+    return sr, [pcm[i:i + step] for i in range(0, len(pcm) - step + 1, step)]
+
+def replay_local(path: str, frame_ms: int, window: float, realtime: bool) -> dict:
+    sr, frames = _frames(path, frame_ms)
+    detector = RollingDetector(sr, window)
+    timings = []
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        if realtime:
+            # Pace to the audio clock so caches and CPU frequency look like a live call
+            delay = start + i * frame_ms / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t = time.perf_counter()
+        detector.push(frame)
+        detector.score()
+        timings.append((time.perf_counter() - t) * 1000)
+    return {"mode": "in-process", "frame_ms": frame_ms, "sample_rate": sr, **_percentiles(timings)}
+
+def replay_websocket(url: str, path: str, frame_ms: int, window: float) -> dict:
+    from websockets.sync.client import connect
+
+    sr, frames = _frames(path, frame_ms)
+    emit_every = frame_ms / 1000  # ask for a score after every frame
+    processing, round_trips = [], []
+    with connect(f"{url}?sample_rate={sr}&window={window}&emit_every={emit_every}") as ws:
+        start = time.perf_counter()
+        for i, frame in enumerate(frames):
+            delay = start + i * frame_ms / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t = time.perf_counter()
+            ws.send(frame.tobytes())
+            message = json.loads(ws.recv(timeout=5))
+            round_trips.append((time.perf_counter() - t) * 1000)
+            processing.append(message.get("processing_ms", 0.0))
+        ws.send(json.dumps({"type": "end"}))
+        summary = json.loads(ws.recv())
+    return {
+        "mode": "websocket",
+        "frame_ms": frame_ms,
+        "sample_rate": sr,
+        "server_processing": _percentiles(processing),
+        "round_trip": _percentiles(round_trips),
+        "summary": summary
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav", help="Recording to replay (default: 60 s synthetic speech)")
+    parser.add_argument("--url", help="voice-protect stream URL; omit to run in-process")
+    parser.add_argument("--frame-ms", type=int, default=20)
+    parser.add_argument("--window", type=float, default=4.0)
+    parser.add_argument("--fast", action="store_true", help="Don't pace to real time (in-process only)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.wav
+        if not path:
+            path = os.path.join(tmp, "call.wav")
+            write_wav(path, 60, 16000)
+        if args.url:
+            result = replay_websocket(args.url, path, args.frame_ms, args.window)
+        else:
+            result = replay_local(path, args.frame_ms, args.window, realtime=not args.fast)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -41,15 +41,18 @@ document.getElementById('protectForm').addEventListener('submit', async (e) => {
     formData.append('image', fileInput.files[0]);
 
     if (method === 'fawkes') {
-        // Legacy synchronous call
+        // Local CPU engine
         try {
             const res = await fetch(`${API_BASE}/api/protect/fawkes`, { method: 'POST', body: formData });
+            if (!res.ok) throw new Error(res.status === 503 ? "Server busy, try again shortly" : "Upload failed");
+
             const data = await res.json();
-            statusText.textContent = 'Completed (Fawkes)';
-            details.innerHTML = `<pre>${JSON.stringify(data, null, 2)}</pre>`;
-            if (data.path) {
-                // Assuming path is returned, normally we'd download
-            }
+            statusText.textContent = 'Queued (Fawkes)';
+            watchJob(
+                data.job_id,
+                `${API_BASE}/api/protect/status/${data.job_id}`,
+                `${API_BASE}/api/protect/download/${data.job_id}`
+            );
         } catch (e) {
             statusText.textContent = 'Error';
             details.textContent = e.message;
@@ -64,7 +67,11 @@ document.getElementById('protectForm').addEventListener('submit', async (e) => {
 
             const job = await res.json();
             statusText.textContent = 'Queued (Waiting for Worker...)';
-            pollJob(job.id);
+            watchJob(
+                job.id,
+                `${API_BASE}/api/protect/queue/status/${job.id}`,
+                `${API_BASE}/api/protect/queue/result/${job.id}`
+            );
         } catch (e) {
             statusText.textContent = 'Error Queueing';
             details.textContent = e.message;
@@ -72,28 +79,52 @@ document.getElementById('protectForm').addEventListener('submit', async (e) => {
     }
 });
 
-async function pollJob(jobId) {
+function showJob(job, resultUrl) {
     const statusText = document.getElementById('jobStatusText');
     const details = document.getElementById('jobDetails');
+
+    if (job.status === 'completed') {
+        statusText.textContent = 'Finished!';
+        details.innerHTML = `
+            <p>Protected Image Ready:</p>
+            <a href="${resultUrl}" target="_blank" class="button">Download Result</a>
+        `;
+        return true;
+    } else if (job.status === 'failed' || job.status === 'cancelled') {
+        statusText.textContent = job.status === 'failed' ? 'Failed' : 'Cancelled';
+        details.textContent = job.error || "Unknown error";
+        return true;
+    } else if (job.status === 'processing') {
+        statusText.textContent = job.progress ? `Processing... ${job.progress}%` : 'Processing...';
+    }
+    return false;
+}
+
+// Follow a job over the server-sent event stream; fall back to polling if it is unavailable
+function watchJob(jobId, statusUrl, resultUrl) {
+    if (!window.EventSource) {
+        pollJob(jobId, statusUrl, resultUrl);
+        return;
+    }
+
+    const source = new EventSource(`${API_BASE}/api/protect/events/stream?job_ids=${jobId}`);
+    let finished = false;
+    source.addEventListener('job', (e) => {
+        finished = showJob(JSON.parse(e.data), resultUrl) || finished;
+    });
+    source.addEventListener('end', () => source.close());
+    source.onerror = () => {
+        source.close();
+        if (!finished) pollJob(jobId, statusUrl, resultUrl);
+    };
+}
+
+async function pollJob(jobId, statusUrl, resultUrl) {
     const pollInterval = setInterval(async () => {
         try {
-            const res = await fetch(`${API_BASE}/api/protect/queue/status/${jobId}`);
+            const res = await fetch(statusUrl);
             const job = await res.json();
-
-            if (job.status === 'completed') {
-                clearInterval(pollInterval);
-                statusText.textContent = 'Finished!';
-                details.innerHTML = `
-                    <p>Protected Image Ready:</p>
-                    <a href="${API_BASE}/api/protect/queue/result/${jobId}" target="_blank" class="button">Download Result</a>
-                `;
-            } else if (job.status === 'failed') {
-                clearInterval(pollInterval);
-                statusText.textContent = 'Failed';
-                details.textContent = job.error || "Unknown error";
-            } else if (job.status === 'processing') {
-                statusText.textContent = 'Processing on GPU...';
-            }
+            if (showJob(job, resultUrl)) clearInterval(pollInterval);
         } catch (e) {
             console.error("Poll error", e);
         }
@@ -16,103 +16,284 @@ async function checkStatus() {
     }
 }
 
-// Load all data
+// Dashboard state, loaded once and then kept current from the change feed
+const state = { clients: [], cases: [], alerts: [], stats: {} };
+const ALERT_LIMIT = 20;
+let cursor = null;
+let feed = null;
+
+// Load all data, then follow changes from the cursor taken before loading
 async function loadAllData() {
-    loadStats();
-    loadClients();
-    loadCases();
-    loadAlerts();
+    try {
+        cursor = (await fetch(`${API_BASE}/api/soc/changes/`).then(r => r.json())).cursor;
+    } catch (e) {
+        cursor = null;
+    }
+    await Promise.all([loadStats(), loadClients(), loadCases(), loadAlerts(), loadTrend()]);
+    if (cursor !== null) followChanges();
 }
 
-// Load stats
+// Load stats - one aggregate request; the browser revalidates it with
+// If-None-Match, so an unchanged poll is a bodyless 304
 async function loadStats() {
     try {
-        // Clients count
-        const clients = await fetch(`${API_BASE}/api/soc/clients`).then(r => r.json());
-        document.getElementById('clientCount').textContent = clients.length;
-
-        // Cases stats
-        const caseStats = await fetch(`${API_BASE}/api/soc/cases/stats/overview`).then(r => r.json());
-        document.getElementById('openCases').textContent = caseStats.by_status?.open || 0;
-
-        // Alert stats
-        const alertStats = await fetch(`${API_BASE}/api/soc/alerts/stats`).then(r => r.json());
-        document.getElementById('unackAlerts').textContent = alertStats.unacknowledged || 0;
-        document.getElementById('criticalAlerts').textContent = alertStats.by_severity?.critical || 0;
+        const summary = await fetch(`${API_BASE}/api/soc/summary`).then(r => r.json());
+        state.stats.clientCount = summary.clients.total;
+        state.stats.openCases = summary.cases.open;
+        state.stats.unackAlerts = summary.alerts.unacknowledged;
+        state.stats.criticalAlerts = summary.alerts.critical;
+        renderStats();
     } catch (e) {
         console.error('Error loading stats:', e);
     }
 }
 
-// Load clients
-async function loadClients() {
-    const list = document.getElementById('clientList');
-    const select = document.getElementById('caseClient');
+function renderStats() {
+    document.getElementById('clientCount').textContent = state.stats.clientCount ?? '-';
+    document.getElementById('openCases').textContent = state.stats.openCases ?? '-';
+    document.getElementById('unackAlerts').textContent = state.stats.unackAlerts ?? '-';
+    document.getElementById('criticalAlerts').textContent = state.stats.criticalAlerts ?? '-';
+}
 
+// Load the alert trend - hourly counts by severity from pre-aggregated buckets
+const TREND_SEVERITIES = ['info', 'warning', 'critical'];
+
+async function loadTrend() {
     try {
-        const clients = await fetch(`${API_BASE}/api/soc/clients`).then(r => r.json());
-
-        // Update list
-        list.innerHTML = clients.map(c => `
-            <div class="list-item" onclick="viewClient('${c.id}')">
-                <div class="title">${c.name}</div>
-                <div class="meta">
-                    <span class="badge ${c.risk_level}">${c.risk_level}</span>
-                    ${c.code_name || ''} • ${c.case_count} cases
-                </div>
-            </div>
-        `).join('') || '<div class="list-item"><div class="meta">No clients yet</div></div>';
+        state.trend = await fetch(`${API_BASE}/api/soc/alerts/timeseries?bucket=1h&by=severity`).then(r => r.json());
+        renderTrend();
+    } catch (e) {
+        console.error('Error loading alert trend:', e);
+    }
+}
+
+function renderTrend() {
+    const { timestamps, total, series } = state.trend;
+    const peak = Math.max(1, ...total);
+    document.getElementById('alertTrend').innerHTML = timestamps.map((t, i) => `
+        <div class="trend-bar" title="${new Date(t + 'Z').toLocaleString()}: ${total[i]} alerts">
+            ${TREND_SEVERITIES.map(s => `<span class="${s}" style="height: ${100 * ((series[s] || [])[i] || 0) / peak}%"></span>`).join('')}
+        </div>
+    `).join('');
+}
 
-        // Update select dropdown
-        select.innerHTML = '<option value="">No Client</option>' +
-            clients.map(c => `<option value="${c.id}">${c.name}</option>`).join('');
+// Load clients
+async function loadClients() {
+    try {
+        state.clients = await fetch(`${API_BASE}/api/soc/clients`).then(r => r.json());
+        renderClients();
     } catch (e) {
-        list.innerHTML = '<div class="list-item"><div class="meta">Error loading clients</div></div>';
+        document.getElementById('clientList').innerHTML = '<div class="list-item"><div class="meta">Error loading clients</div></div>';
     }
 }
 
+function renderClients() {
+    const list = document.getElementById('clientList');
+    const select = document.getElementById('caseClient');
+    const clients = state.clients;
+
+    // Update list
+    list.innerHTML = clients.map(c => `
+        <div class="list-item" onclick="viewClient('${c.id}')">
+            <div class="title">${c.name}</div>
+            <div class="meta">
+                <span class="badge ${c.risk_level}">${c.risk_level}</span>
+                ${c.code_name || ''} • ${c.case_count} cases
+            </div>
+        </div>
+    `).join('') || '<div class="list-item"><div class="meta">No clients yet</div></div>';
+
+    // Update select dropdown, keeping the current choice
+    const selected = select.value;
+    select.innerHTML = '<option value="">No Client</option>' +
+        clients.map(c => `<option value="${c.id}">${c.name}</option>`).join('');
+    select.value = selected;
+}
+
 // Load cases
 async function loadCases() {
-    const list = document.getElementById('caseList');
-
     try {
-        const cases = await fetch(`${API_BASE}/api/soc/cases?status=open`).then(r => r.json());
-
-        list.innerHTML = cases.map(c => `
-            <div class="list-item" onclick="viewCase('${c.id}')">
-                <div class="title">${c.title}</div>
-                <div class="meta">
-                    <span class="badge ${c.status}">${c.status}</span>
-                    <span class="badge ${c.priority}">${c.priority}</span>
-                    ${c.alert_count} alerts
-                </div>
-            </div>
-        `).join('') || '<div class="list-item"><div class="meta">No open cases</div></div>';
+        state.cases = await fetch(`${API_BASE}/api/soc/cases?status=open`).then(r => r.json());
+        renderCases();
     } catch (e) {
-        list.innerHTML = '<div class="list-item"><div class="meta">Error loading cases</div></div>';
+        document.getElementById('caseList').innerHTML = '<div class="list-item"><div class="meta">Error loading cases</div></div>';
     }
 }
 
+function renderCases() {
+    document.getElementById('caseList').innerHTML = state.cases.map(c => `
+        <div class="list-item" onclick="viewCase('${c.id}')">
+            <div class="title">${c.title}</div>
+            <div class="meta">
+                <span class="badge ${c.status}">${c.status}</span>
+                <span class="badge ${c.priority}">${c.priority}</span>
+                ${c.alert_count} alerts
+            </div>
+        </div>
+    `).join('') || '<div class="list-item"><div class="meta">No open cases</div></div>';
+}
+
 // Load alerts
 async function loadAlerts() {
-    const list = document.getElementById('alertList');
-
     try {
-        const alerts = await fetch(`${API_BASE}/api/soc/alerts?acknowledged=false&limit=20`).then(r => r.json());
-
-        list.innerHTML = alerts.map(a => `
-            <div class="list-item alert-item" onclick="acknowledgeAlert('${a.id}')">
-                <div class="severity ${a.severity}"></div>
-                <div class="content">
-                    <div class="title">${a.alert_type}</div>
-                    <div class="meta">${a.message.substring(0, 100)}...</div>
-                    <div class="meta">${a.source} • ${new Date(a.created_at).toLocaleString()}</div>
-                </div>
+        state.alerts = await fetch(`${API_BASE}/api/soc/alerts?acknowledged=false&limit=${ALERT_LIMIT}`).then(r => r.json());
+        renderAlerts();
+    } catch (e) {
+        document.getElementById('alertList').innerHTML = '<div class="list-item"><div class="meta">Error loading alerts</div></div>';
+    }
+}
+
+function renderAlerts() {
+    document.getElementById('alertList').innerHTML = state.alerts.map(a => `
+        <div class="list-item alert-item" onclick="acknowledgeAlert('${a.id}')">
+            <div class="severity ${a.severity}"></div>
+            <div class="content">
+                <div class="title">${a.alert_type}${a.occurrences > 1 ? ` ×${a.occurrences}` : ''}</div>
+                <div class="meta">${a.message.substring(0, 100)}...</div>
+                <div class="meta">${a.source} • ${new Date(a.last_seen_at || a.created_at).toLocaleString()}</div>
             </div>
-        `).join('') || '<div class="list-item"><div class="meta">No unacknowledged alerts</div></div>';
+        </div>
+    `).join('') || '<div class="list-item"><div class="meta">No unacknowledged alerts</div></div>';
+}
+
+// ===== Change feed =====
+
+// Server-sent events; falls back to polling /changes when EventSource is missing
+function followChanges() {
+    if (feed) feed.close();
+    if (!window.EventSource) {
+        pollChanges();
+        return;
+    }
+    feed = new EventSource(`${API_BASE}/api/soc/changes/stream?since=${cursor}`);
+    feed.addEventListener('change', e => applyChanges([JSON.parse(e.data)]));
+    feed.addEventListener('reset', () => { feed.close(); feed = null; loadAllData(); });
+    feed.onopen = () => setStatus(true);
+    feed.onerror = () => setStatus(false);  // EventSource reconnects with Last-Event-ID
+}
+
+async function pollChanges() {
+    let page = null;
+    try {
+        page = await fetch(`${API_BASE}/api/soc/changes/?since=${cursor}`).then(r => r.json());
+        if (page.reset) return loadAllData();
+        applyChanges(page.events);
+        cursor = page.cursor;
     } catch (e) {
-        list.innerHTML = '<div class="list-item"><div class="meta">Error loading alerts</div></div>';
+        console.error('Error polling changes:', e);
+    }
+    setTimeout(pollChanges, page?.events?.length ? 0 : 5000);
+}
+
+const dirty = new Set();
+
+function applyChanges(events) {
+    for (const ev of events) {
+        cursor = Math.max(cursor, ev.id);
+        if (ev.entity === 'client') applyClient(ev);
+        else if (ev.entity === 'case') applyCase(ev);
+        else if (ev.entity === 'alert') applyAlert(ev);
+    }
+    // One render per animation frame however many events arrived
+    requestAnimationFrame(() => {
+        if (dirty.has('clients')) renderClients();
+        if (dirty.has('cases')) renderCases();
+        if (dirty.has('alerts')) renderAlerts();
+        if (dirty.has('trend')) scheduleTrend();
+        if (dirty.size) renderStats();
+        dirty.clear();
+    });
+}
+
+function upsert(list, item, keep, compare) {
+    const i = list.findIndex(x => x.id === item.id);
+    if (i >= 0) list.splice(i, 1);
+    if (keep) {
+        list.push(item);
+        list.sort(compare);
+    }
+}
+
+const newestFirst = (a, b) => new Date(b.created_at) - new Date(a.created_at);
+
+function applyClient(ev) {
+    if (ev.action === 'insert') state.stats.clientCount += 1;
+    if (ev.action === 'delete') state.stats.clientCount -= 1;
+    upsert(state.clients, ev.data, ev.action !== 'delete', newestFirst);
+    dirty.add('clients');
+}
+
+function applyCase(ev) {
+    const wasOpen = ev.action === 'insert' ? false : (ev.previous && 'status' in ev.previous ? ev.previous.status === 'open' : ev.data.status === 'open');
+    const isOpen = ev.data.status === 'open';
+    state.stats.openCases += isOpen - wasOpen;
+    upsert(state.cases, ev.data, isOpen, newestFirst);
+    if (ev.action === 'insert' && ev.data.client_id) {
+        const client = state.clients.find(c => c.id === ev.data.client_id);
+        if (client) client.case_count += 1;
+        dirty.add('clients');
     }
+    dirty.add('cases');
+}
+
+function applyAlert(ev) {
+    if (ev.action === 'archive') {
+        // Old acknowledged alerts left the table in bulk: refresh the counts
+        loadStats();
+        loadCases();
+        return;
+    }
+    const a = ev.data;
+    const critical = a.severity === 'critical';
+    if (ev.action === 'insert' || ev.action === 'repeat') dirty.add('trend');
+    if (ev.action === 'insert') {
+        state.stats.unackAlerts += 1;
+        state.stats.criticalAlerts += critical;
+        adjustCaseAlerts(a.case_id, 1);
+    } else if (ev.action === 'ack') {
+        if (ev.previous && !ev.previous.acknowledged) state.stats.unackAlerts -= 1;
+    } else if (ev.action === 'delete') {
+        state.stats.unackAlerts -= !a.acknowledged;
+        state.stats.criticalAlerts -= critical;
+        adjustCaseAlerts(a.case_id, -1);
+    } else if (ev.action === 'repeat' && ev.previous) {
+        // A duplicate folded into this alert: it may have escalated or been linked to a case
+        if ('severity' in ev.previous) state.stats.criticalAlerts += critical - (ev.previous.severity === 'critical');
+        if ('case_id' in ev.previous) adjustCaseAlerts(a.case_id, 1);
+    }
+    const shown = ev.action !== 'delete' && !a.acknowledged;
+    upsert(state.alerts, a, shown, newestFirst);
+    if (state.alerts.length > ALERT_LIMIT) {
+        state.alerts.length = ALERT_LIMIT;
+    } else if (!shown && state.alerts.length < Math.min(ALERT_LIMIT, state.stats.unackAlerts)) {
+        loadAlerts();  // refill the list from the server
+    }
+    dirty.add('alerts');
+}
+
+// New alerts refresh the trend at most once a minute (the server counts them)
+let trendTimer = null;
+
+function scheduleTrend() {
+    if (trendTimer) return;
+    trendTimer = setTimeout(() => {
+        trendTimer = null;
+        loadTrend();
+    }, 60000);
+}
+
+function adjustCaseAlerts(caseId, delta) {
+    const c = caseId && state.cases.find(x => x.id === caseId);
+    if (c) {
+        c.alert_count += delta;
+        dirty.add('cases');
+    }
+}
+
+function setStatus(connected) {
+    const status = document.getElementById('status');
+    status.textContent = connected ? '● Connected' : '○ Reconnecting';
+    status.className = connected ? 'status connected' : 'status';
 }
 
 // Modal functions
@@ -148,7 +329,7 @@ document.getElementById('addClientForm').addEventListener('submit', async (e) =>
 
         closeModal('addClientModal');
         e.target.reset();
-        loadAllData();
+        if (cursor === null) loadAllData();  // otherwise the change feed delivers it
     } catch (e) {
         alert('Error adding client');
     }
@@ -174,7 +355,7 @@ document.getElementById('addCaseForm').addEventListener('submit', async (e) => {
 
         closeModal('addCaseModal');
         e.target.reset();
-        loadAllData();
+        if (cursor === null) loadAllData();  // otherwise the change feed delivers it
     } catch (e) {
         alert('Error creating case');
     }
@@ -184,7 +365,7 @@ document.getElementById('addCaseForm').addEventListener('submit', async (e) => {
 async function acknowledgeAlert(id) {
     try {
         await fetch(`${API_BASE}/api/soc/alerts/${id}/acknowledge`, { method: 'PUT' });
-        loadAllData();
+        if (cursor === null) loadAllData();
     } catch (e) {
         console.error('Error acknowledging alert');
     }
@@ -202,7 +383,7 @@ async function acknowledgeAll() {
             body: JSON.stringify(ids)
         });
 
-        loadAllData();
+        if (cursor === null) loadAllData();
     } catch (e) {
         console.error('Error acknowledging alerts');
     }
@@ -214,4 +395,6 @@ function viewCase(id) { console.log('View case:', id); }
 
 // Init
 checkStatus();
-setInterval(loadAllData, 30000);
+setInterval(() => { if (cursor === null) checkStatus(); }, 30000);
+// Re-sync the headline counters now and then in case deltas drifted
+setInterval(loadStats, 300000);
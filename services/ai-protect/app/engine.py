@@ -0,0 +1,201 @@
+"""
+Execution engine for CPU-bound protection jobs
+
+Jobs run in a bounded ProcessPoolExecutor whose workers load the cloaking
+model once at startup, so the event loop only awaits futures and the API
+stays responsive while every core is busy. The Fawkes model is not shipped
+with the service yet: until it is, workers preload only the image libraries
+and cloak_image is a pass-through that re-encodes its input to PNG. The engine enforces per-job
+timeouts, supports cancellation and refuses new work past a queue-depth
+limit (surfaced by the routers as 503 + Retry-After).
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Coroutine, Dict, Optional
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import time
+
+from shared.metrics import Gauge, Histogram, JOB_BUCKETS
+
+logger = logging.getLogger("aegis-ai-protect")
+
+MAX_WORKERS = int(os.getenv("PROTECT_WORKERS", str(os.cpu_count() or 1)))
+MAX_QUEUE_DEPTH = int(os.getenv("PROTECT_MAX_QUEUE", "64"))  # queued + running jobs
+JOB_TIMEOUT = float(os.getenv("PROTECT_JOB_TIMEOUT", "300"))  # seconds
+
+class EngineBusy(Exception):
+    """Raised when the engine is at its queue-depth limit"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Protection engine busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class JobTimeout(Exception):
+    """Raised when a job exceeds its execution time limit"""
+
+# ===== Worker process side =====
+
+_model = None
+
+def load_fawkes_model():
+    """
+    Load the cloaking model (runs once per worker process). The Fawkes
+    feature extractor is not shipped yet, so this only preloads the image
+    libraries and returns a placeholder model description.
+    """
+    import numpy  # noqa: F401 - preload heavy imports so the first job doesn't pay for them
+    from PIL import Image  # noqa: F401
+    return {"name": "fawkes", "mode": "placeholder"}
+
+def _init_worker():
+    global _model
+    _model = load_fawkes_model()
+
+def _ping() -> int:
+    return os.getpid()
+
+def cloak_image(input_path: str, output_path: str) -> str:
+    """
+    Cloak a single image (runs in a worker process). Pass-through until the
+    Fawkes model exists: the image is re-encoded to PNG unchanged.
+    """
+    from PIL import Image
+
+    with Image.open(input_path) as img:
+        img = img.convert("RGB")
+        img.save(output_path, format="PNG")
+    return output_path
+
+# ===== Event loop side =====
+
+class ExecutionEngine:
+    def __init__(self, max_workers: int = MAX_WORKERS, max_queue_depth: int = MAX_QUEUE_DEPTH,
+                 job_timeout: float = JOB_TIMEOUT):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_depth = max(1, max_queue_depth)
+        self.job_timeout = job_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running: Dict[str, Future] = {}
+        self._avg_duration = 5.0  # seconds, exponentially weighted
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    async def _warm(self):
+        """Spawn every worker up front so the model is loaded before the first job"""
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        await asyncio.gather(*[loop.run_in_executor(executor, _ping) for _ in range(self.max_workers)])
+
+    async def start(self):
+        self._executor = self._new_executor()
+        self._slots = asyncio.Semaphore(self.max_workers)
+        await self._warm()
+        logger.info(f"Protection engine started with {self.max_workers} workers")
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def depth(self) -> int:
+        """Jobs admitted but not finished (queued + running)"""
+        return len(self._tasks)
+
+    def retry_after(self) -> int:
+        waves = self.depth / self.max_workers
+        return max(1, math.ceil(waves * self._avg_duration))
+
+    def check_capacity(self):
+        if self.depth >= self.max_queue_depth:
+            raise EngineBusy(self.retry_after())
+
+    def submit(self, task_id: str, coro: Coroutine) -> asyncio.Task:
+        """Admit a job coroutine. It should await run() for its CPU-bound part"""
+        self.check_capacity()
+        task = asyncio.create_task(coro)
+        self._tasks[task_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(task_id, None))
+        return task
+
+    def cancel(self, task_id: str) -> bool:
+        task = self._tasks.get(task_id)
+        if not task:
+            return False
+        task.cancel()
+        return True
+
+    def status(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "running": len(self._running),
+            "queued": self.depth - len(self._running),
+            "max_queue_depth": self.max_queue_depth,
+            "avg_job_seconds": round(self._avg_duration, 3)
+        }
+
+    def _recycle(self):
+        """Replace the pool, killing workers stuck on a timed-out or cancelled job"""
+        old = self._executor
+        self._executor = self._new_executor()
+        processes = list((getattr(old, "_processes", None) or {}).values())
+        old.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        asyncio.create_task(self._warm())
+        logger.warning("Protection engine recycled worker pool")
+
+    async def run(self, task_id: str, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Run fn(*args) in a worker process, honouring timeout and cancellation"""
+        timeout = timeout or self.job_timeout
+        async with self._slots:
+            # Jobs interrupted by a pool recycle (someone else's timeout) get one retry
+            for attempt in range(2):
+                executor = self._executor
+                start = time.monotonic()
+                future = executor.submit(fn, *args)
+                self._running[task_id] = future
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+                except BrokenProcessPool:
+                    if attempt == 0 and executor is not self._executor:
+                        continue
+                    raise
+                except asyncio.TimeoutError:
+                    JOB_SECONDS.labels(fn.__name__, "timeout").observe(time.monotonic() - start)
+                    if not future.done():
+                        self._recycle()
+                    raise JobTimeout(f"Job exceeded {timeout:.0f}s time limit")
+                except asyncio.CancelledError:
+                    if not future.done():
+                        self._recycle()
+                    raise
+                finally:
+                    self._running.pop(task_id, None)
+
+                elapsed = time.monotonic() - start
+                JOB_SECONDS.labels(fn.__name__, "ok").observe(elapsed)
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * elapsed
+                return result
+
+engine = ExecutionEngine()
+
+JOB_SECONDS = Histogram("protect_engine_job_seconds", "Worker-pool job execution time", ["function", "outcome"],
+                        buckets=JOB_BUCKETS)
+ENGINE_JOBS = Gauge("protect_engine_jobs", "Engine jobs by state", ["state"], function=lambda: {
+    ("running",): len(engine._running),
+    ("queued",): engine.depth - len(engine._running)
+})
@@ -0,0 +1,153 @@
+"""
+In-process pub/sub for job progress events
+
+Routers publish every job state transition and worker-reported progress
+update once; each dashboard connection subscribes to a set of job ids or a
+client id and receives only matching events through a bounded buffer. When
+a slow subscriber's buffer is full the oldest event is dropped, so one stuck
+connection can never grow memory or hold up publishers.
+
+A job's transitions may be published by any uvicorn worker while its
+dashboard stream is held by another, so with a shared state backend every
+event is also appended to the backend's event log and each worker tails the
+log, delivering the other workers' events to its own subscribers.
+
+Both job routers also index each client's jobs (client_jobs) so a stream
+subscribed by client id can start with a snapshot of that client's existing
+jobs without reading either whole job store.
+"""
+from typing import Dict, Iterable, Optional, Set
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from shared.state import StateStore, state_backend
+
+SUBSCRIBER_BUFFER = 256
+RELAY_CHANNEL = "protect-jobs"
+RELAY_INTERVAL = 0.2  # seconds between reads of the shared event log
+RELAY_RETENTION = 60  # seconds events stay in the log
+
+logger = logging.getLogger("aegis-ai-protect")
+
+def client_jobs(client_id: str) -> StateStore:
+    """A client's job ids from either job store, mapped to their creation time"""
+    return StateStore(f"protect-client-jobs:{client_id}")
+
+class Subscription:
+    def __init__(self, job_ids: Iterable[str] = (), client_id: Optional[str] = None,
+                 buffer_size: int = SUBSCRIBER_BUFFER):
+        self.job_ids: Set[str] = set(job_ids)
+        self.client_id = client_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class EventBus:
+    def __init__(self, backend=None):
+        self._by_job: Dict[str, Set[Subscription]] = {}
+        self._by_client: Dict[str, Set[Subscription]] = {}
+        self._relay = backend if backend is not None and backend.shared else None
+        self._origin = uuid.uuid4().hex  # tells this process's events apart in the shared log
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, job_ids: Iterable[str] = (), client_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(job_ids, client_id)
+        for job_id in sub.job_ids:
+            self._by_job.setdefault(job_id, set()).add(sub)
+        if client_id:
+            self._by_client.setdefault(client_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        for job_id in sub.job_ids:
+            subs = self._by_job.get(job_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_job[job_id]
+        if sub.client_id:
+            subs = self._by_client.get(sub.client_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_client[sub.client_id]
+
+    def publish(self, job_id: str, status: str, progress: int = 0,
+                client_id: Optional[str] = None, **extra):
+        """Fan an event out to the subscribers of its job id and client id"""
+        if self._relay is None and job_id not in self._by_job and client_id not in self._by_client:
+            return
+        event = {"job_id": job_id, "status": status, "progress": progress, "ts": time.time(), **extra}
+        if client_id:
+            event["client_id"] = client_id
+        self._deliver(event)
+        if self._relay is not None:
+            self._relay.publish(RELAY_CHANNEL, self._origin, json.dumps(event))
+
+    def _deliver(self, event: dict):
+        targets = set(self._by_job.get(event["job_id"], ()))
+        if event.get("client_id"):
+            targets |= self._by_client.get(event["client_id"], set())
+        for sub in targets:
+            sub.put(event)
+
+    # ----- cross-worker relay -----
+
+    async def start(self):
+        if self._relay is not None:
+            self._task = asyncio.create_task(self._tail(await run_in_threadpool(self._relay.last_event_id)))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _read(self, after: int):
+        if not self._by_job and not self._by_client:
+            return self._relay.last_event_id(), []  # nobody listening here: just keep up
+        return after, self._relay.read_events(RELAY_CHANNEL, after)
+
+    async def _tail(self, cursor: int):
+        pruned = time.monotonic()
+        while True:
+            try:
+                cursor, rows = await run_in_threadpool(self._read, cursor)
+                for cursor, origin, payload in rows:
+                    if origin != self._origin:
+                        self._deliver(json.loads(payload))
+                if time.monotonic() - pruned > RELAY_RETENTION:
+                    await run_in_threadpool(self._relay.prune_events, RELAY_RETENTION)
+                    pruned = time.monotonic()
+            except Exception:
+                logger.exception("Reading the shared event log failed")
+            await asyncio.sleep(RELAY_INTERVAL)
+
+    @property
+    def subscriber_count(self) -> int:
+        subs = set()
+        for group in list(self._by_job.values()) + list(self._by_client.values()):
+            subs |= group
+        return len(subs)
+
+# Shared by all routers
+bus = EventBus(state_backend())
@@ -1,11 +1,30 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import health, fawkes, queue
+from contextlib import asynccontextmanager
+from routers import health, fawkes, queue, events
+from engine import engine
+from events import bus
+from shared.metrics import instrument
+from shared.security import configure_logging, RequestLoggingMiddleware
+from shared.profiling import enable_profiling
+
+configure_logging("ai-protect")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup - spawn and warm the worker pool, follow other workers' job events
+    await engine.start()
+    await bus.start()
+    yield
+    # Shutdown
+    await bus.stop()
+    await engine.stop()
 
 app = FastAPI(
     title="Aegis AI Protection API",
     description="AI-powered image and face protection service",
     version="1.0.0",
+    lifespan=lifespan,
     docs_url="/api/docs",
     openapi_url="/api/openapi.json"
 )
@@ -18,9 +37,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-only request profiling (X-Profile: 1), inside logging and metrics
+enable_profiling(app, "/api/protect/profiles")
+
+# Request IDs and sampled JSON access logs, then metrics outermost so latency
+# includes the other middleware; serves /metrics
+app.add_middleware(RequestLoggingMiddleware)
+instrument(app)
+
 app.include_router(health.router)
 app.include_router(fawkes.router, prefix="/api/protect", tags=["Protection"])
 app.include_router(queue.router, prefix="/api/protect/queue", tags=["Queue"])
+app.include_router(events.router, prefix="/api/protect/events", tags=["Events"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,8 +1,9 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Any, List
 from enum import Enum
 import uuid
 import time
+from storage import cache_key
 
 class JobStatus(str, Enum):
     PENDING = "pending"
@@ -15,22 +16,47 @@ class JobType(str, Enum):
     MIST = "mist"
     PHOTOGUARD = "photoguard"
 
+class JobPriority(str, Enum):
+    RUSH = "rush"  # Critical-client rush work
+    NORMAL = "normal"
+    BACKLOG = "backlog"  # Bulk onboarding and other non-urgent work
+
 class Job(BaseModel):
     id: str
     type: JobType
     status: JobStatus
+    priority: JobPriority = JobPriority.NORMAL
     created_at: float
+    started_at: Optional[float] = None
     completed_at: Optional[float] = None
+    queue_seconds: Optional[float] = None  # Enqueue to start
+    run_seconds: Optional[float] = None  # Start to finish
     input_path: str
     output_path: Optional[str] = None
     error: Optional[str] = None
+    input_sha256: Optional[str] = None
+    params: Dict[str, Any] = {}
+    cached: bool = False  # Result reused from an identical earlier job
+    client_id: Optional[str] = None
+    progress: int = 0  # Percent, reported by the worker
+    parent_id: Optional[str] = None  # Set on the child jobs of a bulk submission
+    children: List[str] = []
+    face_box: Optional[List[int]] = None  # (x0, y0, x1, y1) found by the bulk pre-filter
+    batch_stats: List[Dict[str, Any]] = []
 
     @classmethod
-    def create(cls, job_type: JobType, input_path: str):
+    def create(cls, job_type: JobType, input_path: str, input_sha256: Optional[str] = None,
+               params: Optional[Dict[str, Any]] = None):
         return cls(
             id=str(uuid.uuid4()),
             type=job_type,
             status=JobStatus.PENDING,
             created_at=time.time(),
-            input_path=input_path
+            input_path=input_path,
+            input_sha256=input_sha256,
+            params=params or {}
         )
+
+    @property
+    def cache_key(self) -> str:
+        return cache_key(self.input_sha256 or self.id, self.type.value, self.params)
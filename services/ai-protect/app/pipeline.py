@@ -0,0 +1,174 @@
+"""
+Batched image preprocessing and face detection for bulk protection jobs
+
+Images are decoded and downscaled on a thread pool, stacked into one
+(N, S, S, 3) array and run through face detection and alignment as
+vectorized NumPy operations, so a bulk upload costs a handful of array
+passes per batch instead of per-image Python work. Images without a face
+are skipped before they ever reach the cloaking queue.
+
+The built-in detector is a fast skin-tone + facial-feature heuristic meant
+as a pre-filter; a model-based detector can be swapped in by passing any
+callable with the same (batch) -> (boxes, scores) contract to process_batch.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+import os
+import time
+
+from PIL import Image
+
+DETECT_SIZE = 128  # side of the square detection canvas
+ALIGN_SIZE = 112  # side of the aligned face chip
+GRID = 16  # detection grid cells per side
+DECODE_WORKERS = int(os.getenv("PROTECT_DECODE_WORKERS", "8"))
+MIN_FACE_SCORE = float(os.getenv("PROTECT_MIN_FACE_SCORE", "0.5"))
+
+Detector = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+def _decode(path: str, size: int) -> Optional[Tuple[np.ndarray, Tuple[int, int]]]:
+    try:
+        with Image.open(path) as img:
+            original_size = img.size
+            img.draft("RGB", (size, size))  # cheap DCT-domain downscale for JPEGs
+            img = img.convert("RGB").resize((size, size), Image.BILINEAR)
+            return np.asarray(img, dtype=np.uint8), original_size
+    except Exception:
+        return None
+
+def decode_images(paths: List[str], size: int = DETECT_SIZE,
+                  max_workers: int = DECODE_WORKERS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode images in parallel into a (N, size, size, 3) uint8 batch.
+
+    Returns (batch, ok, original_sizes); rows that failed to decode are zero
+    and flagged False in ok. original_sizes is (N, 2) as (width, height).
+    """
+    batch = np.zeros((len(paths), size, size, 3), dtype=np.uint8)
+    ok = np.zeros(len(paths), dtype=bool)
+    sizes = np.zeros((len(paths), 2), dtype=np.int64)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for i, decoded in enumerate(pool.map(lambda p: _decode(p, size), paths)):
+            if decoded is not None:
+                batch[i], sizes[i] = decoded
+                ok[i] = True
+    return batch, ok, sizes
+
+def _skin_mask(batch: np.ndarray) -> np.ndarray:
+    """Per-pixel skin mask from YCbCr chroma bounds (Chai & Ngan)"""
+    rgb = batch.astype(np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    cb = 128.0 - 0.168736 * r - 0.331264 * g + 0.5 * b
+    cr = 128.0 + 0.5 * r - 0.418688 * g - 0.081312 * b
+    return (cr >= 133) & (cr <= 173) & (cb >= 77) & (cb <= 127)
+
+def _first_last(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """First and last True index along the last axis (0, 0 for empty rows)"""
+    first = mask.argmax(axis=-1)
+    last = mask.shape[-1] - 1 - mask[..., ::-1].argmax(axis=-1)
+    empty = ~mask.any(axis=-1)
+    first[empty] = 0
+    last[empty] = 0
+    return first, last
+
+def align_faces(batch: np.ndarray, boxes: np.ndarray, size: int = ALIGN_SIZE) -> np.ndarray:
+    """
+    Crop every box and resample it to a (size, size) chip in one gather.
+
+    boxes are (N, 4) normalized (x0, y0, x1, y1); returns (N, size, size, 3).
+    """
+    n, h, w = batch.shape[:3]
+    steps = (np.arange(size, dtype=np.float32) + 0.5) / size
+    xs = boxes[:, 0:1] + (boxes[:, 2:3] - boxes[:, 0:1]) * steps
+    ys = boxes[:, 1:2] + (boxes[:, 3:4] - boxes[:, 1:2]) * steps
+    xi = np.clip((xs * w).astype(np.int64), 0, w - 1)
+    yi = np.clip((ys * h).astype(np.int64), 0, h - 1)
+    return batch[np.arange(n)[:, None, None], yi[:, :, None], xi[:, None, :]]
+
+def detect_faces(batch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Detect the dominant face in every image of a batch.
+
+    Returns (boxes, scores): boxes are (N, 4) normalized (x0, y0, x1, y1) and
+    scores (N,) in [0, 1]; images without a plausible face score 0.
+    """
+    n, size = batch.shape[0], batch.shape[1]
+    cell = size // GRID
+
+    # Skin density per grid cell, then the bounding box of dense cells
+    skin = _skin_mask(batch)
+    density = skin[:, :GRID * cell, :GRID * cell].reshape(n, GRID, cell, GRID, cell).mean(axis=(2, 4))
+    dense = density > 0.5
+    x0, x1 = _first_last(dense.any(axis=1))
+    y0, y1 = _first_last(dense.any(axis=2))
+    boxes = np.stack([x0, y0, x1 + 1, y1 + 1], axis=1).astype(np.float32) / GRID
+
+    width = boxes[:, 2] - boxes[:, 0]
+    height = boxes[:, 3] - boxes[:, 1]
+    area = width * height
+    aspect = width / np.maximum(height, 1e-6)
+
+    # Skin fill inside the box
+    cols = np.arange(GRID)
+    inside = (
+        (cols[None, :, None] >= y0[:, None, None]) & (cols[None, :, None] <= y1[:, None, None]) &
+        (cols[None, None, :] >= x0[:, None, None]) & (cols[None, None, :] <= x1[:, None, None])
+    )
+    fill = (density * inside).sum(axis=(1, 2)) / np.maximum(inside.sum(axis=(1, 2)), 1)
+
+    # Faces have dark, non-skin features (eyes, brows, mouth) inside the skin region
+    chips = align_faces(batch, boxes, size=32)
+    chip_skin = _skin_mask(chips)
+    luma = chips.astype(np.float32).mean(axis=-1)
+    dark = (luma < luma.mean(axis=(1, 2), keepdims=True) * 0.6) & ~chip_skin
+    features = dark[:, 4:28, 4:28].mean(axis=(1, 2))
+
+    # The square canvas distorts aspect ratio by up to ~2x for typical photos
+    plausible = dense.any(axis=(1, 2)) & (area >= 0.02) & (area <= 0.95) & (aspect >= 0.3) & (aspect <= 2.5)
+    scores = np.clip(fill, 0, 1) * np.clip(features / 0.01, 0, 1)
+    scores = np.where(plausible, scores, 0.0)
+    return boxes, scores
+
+def process_batch(paths: List[str], detector: Detector = detect_faces,
+                  min_score: float = MIN_FACE_SCORE) -> Tuple[List[dict], dict]:
+    """
+    Decode, detect and align a batch of images.
+
+    Returns one result per path ({"path", "ok", "has_face", "score", "box"},
+    box in original pixel coordinates) plus throughput stats for the batch.
+    """
+    started = time.perf_counter()
+    batch, ok, sizes = decode_images(paths)
+    decoded = time.perf_counter()
+
+    boxes, scores = detector(batch)
+    has_face = ok & (scores >= min_score)
+    detected = time.perf_counter()
+
+    scale = np.concatenate([sizes, sizes], axis=1)
+    pixel_boxes = np.rint(boxes * scale).astype(np.int64)
+    results = [
+        {
+            "path": path,
+            "ok": bool(ok[i]),
+            "has_face": bool(has_face[i]),
+            "score": round(float(scores[i]), 3),
+            "box": pixel_boxes[i].tolist() if has_face[i] else None
+        }
+        for i, path in enumerate(paths)
+    ]
+
+    total = detected - started
+    stats = {
+        "images": len(paths),
+        "decoded": int(ok.sum()),
+        "failed": int((~ok).sum()),
+        "with_faces": int(has_face.sum()),
+        "skipped": int((ok & ~has_face).sum()),
+        "decode_seconds": round(decoded - started, 4),
+        "detect_seconds": round(detected - decoded, 4),
+        "images_per_second": round(len(paths) / total, 1) if total > 0 else None
+    }
+    return results, stats
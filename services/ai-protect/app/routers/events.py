@@ -0,0 +1,91 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import json
+import time
+from events import bus, client_jobs
+from routers import fawkes, queue
+
+router = APIRouter()
+
+HEARTBEAT_SECONDS = 15
+TERMINAL_STATES = {"completed", "failed", "cancelled"}
+
+def _snapshot(job_id: str) -> Optional[dict]:
+    """Current state of a job from either job store, in event form"""
+    job = queue.jobs.get(job_id)
+    if job:
+        event = {"job_id": job_id, "status": job.status.value, "progress": job.progress, "ts": time.time()}
+        if job.client_id:
+            event["client_id"] = job.client_id
+        if job.error:
+            event["error"] = job.error
+        return event
+
+    job = fawkes.jobs.get(job_id)
+    if job:
+        progress = 100 if job["status"] == "completed" else 0
+        event = {"job_id": job_id, "status": job["status"], "progress": progress, "ts": time.time()}
+        if job.get("client_id"):
+            event["client_id"] = job["client_id"]
+        if job.get("error"):
+            event["error"] = job["error"]
+        return event
+    return None
+
+def _format(event: dict, name: str = "job") -> str:
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    job_ids: Optional[str] = Query(None, description="Comma-separated job IDs"),
+    client_id: Optional[str] = None
+):
+    """Server-sent event stream of job state transitions and progress"""
+    ids = [j for j in (job_ids or "").split(",") if j]
+    if not ids and not client_id:
+        raise HTTPException(status_code=400, detail="Provide job_ids and/or client_id")
+
+    # Subscribe before taking the snapshot so no transition falls in between
+    sub = bus.subscribe(ids, client_id)
+    snapshot = [e for e in (_snapshot(j) for j in ids) if e]
+    known = {event["job_id"] for event in snapshot}
+    if not known and not client_id:
+        bus.unsubscribe(sub)
+        raise HTTPException(status_code=404, detail="Job not found")
+    if client_id:
+        # Read through the client's job index, oldest first, rather than scanning both job stores
+        indexed = sorted(client_jobs(client_id).items(), key=lambda item: item[1])
+        snapshot += [e for e in (_snapshot(j) for j, _ in indexed if j not in ids) if e]
+
+    async def events():
+        # A stream for explicit job IDs closes once all of them are finished;
+        # unknown IDs would never finish, so they are not waited for
+        open_jobs = set(known)
+        try:
+            for event in snapshot:
+                if event["status"] in TERMINAL_STATES:
+                    open_jobs.discard(event["job_id"])
+                yield _format(event)
+
+            while client_id or open_jobs:
+                if await request.is_disconnected():
+                    break
+                event = await sub.get(timeout=HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event["status"] in TERMINAL_STATES:
+                    open_jobs.discard(event["job_id"])
+                yield _format(event)
+
+            yield _format({"dropped": sub.dropped}, name="end")
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,56 +1,88 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import time
 import uuid
 import os
+from models import JobType
+from storage import store_upload, store_file, cache_key, result_cache
+from engine import engine, cloak_image, EngineBusy
+from events import bus, client_jobs
+from shared.state import StateStore
 
 router = APIRouter()
 
-# In-memory job storage (use Redis in production)
-jobs = {}
+UPLOAD_DIR = os.getenv("PROTECT_UPLOAD_DIR", "/app/data/uploads")
+OUTPUT_DIR = os.getenv("PROTECT_OUTPUT_DIR", "/app/data/outputs")
+
+# Job dicts, visible to every worker process (see shared/state.py)
+jobs = StateStore("protect-fawkes-jobs")
 
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # pending, processing, completed, failed
+    status: str  # pending, processing, completed, failed, cancelled
     result_url: Optional[str] = None
     error: Optional[str] = None
 
 @router.post("/fawkes")
-async def fawkes_protect(
-    background_tasks: BackgroundTasks,
-    image: UploadFile = File(...)
-):
+async def fawkes_protect(image: UploadFile = File(...), client_id: Optional[str] = Form(None)):
     """Apply Fawkes face cloaking to protect image from facial recognition"""
     
     # Validate file type
     if not image.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
+    # Save uploaded file (content-addressed, hashed while streaming)
+    sha256, file_path = await store_upload(image, UPLOAD_DIR)
+    key = cache_key(sha256, JobType.FAWKES.value, scope="fawkes")
+    
+    # Identical image already cloaked - reuse the output
+    cached_path = result_cache.lookup(key)
+    
+    # New work must fit in the engine queue
+    if not cached_path and not result_cache.waiting(key):
+        try:
+            engine.check_capacity()
+        except EngineBusy as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Protection engine at capacity, please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+    
     # Create job
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {"status": "pending", "result_url": None, "error": None}
-    
-    # Save uploaded file
-    upload_dir = "/app/data/uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = f"{upload_dir}/{job_id}_{image.filename}"
+    job = {
+        "status": "pending", "result_url": None, "error": None, "cache_key": key, "client_id": client_id
+    }
+    jobs.set(job_id, job)
+    if client_id:
+        client_jobs(client_id).set(job_id, time.time())
     
-    with open(file_path, "wb") as f:
-        content = await image.read()
-        f.write(content)
+    if cached_path:
+        _complete(job_id, cached_path)
+        return {"job_id": job_id, "status": "completed", "cached": True}
     
-    # Add processing to background
-    background_tasks.add_task(process_fawkes, job_id, file_path)
+    # Hand off to the engine, unless the same image is already in flight
+    leader_id = result_cache.join(key, job_id)
+    if leader_id == job_id:
+        engine.submit(key, process_fawkes(key, file_path))
+    else:
+        leader = jobs.get(leader_id, job)
+        job = _update(job_id, status=leader["status"]) or job
+    _publish(job_id, job)
     
-    return {"job_id": job_id, "status": "pending"}
+    return {"job_id": job_id, "status": job["status"]}
 
 @router.get("/status/{job_id}", response_model=JobStatus)
 async def get_status(job_id: str):
     """Get status of a protection job"""
-    if job_id not in jobs:
+    job = jobs.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
     return JobStatus(
         job_id=job_id,
         status=job["status"],
@@ -58,44 +90,110 @@ async def get_status(job_id: str):
         error=job.get("error")
     )
 
-async def process_fawkes(job_id: str, file_path: str):
-    """Background task to run Fawkes protection"""
+def _publish(job_id: str, job: dict):
+    """Push the job's current state to event stream subscribers"""
+    extra = {"error": job["error"]} if job.get("error") else {}
+    progress = 100 if job["status"] == "completed" else 0
+    bus.publish(job_id, job["status"], progress, job.get("client_id"), **extra)
+
+def _update(job_id: str, **changes) -> Optional[dict]:
+    """
+    Atomically apply changes to a job, unless it is gone or was cancelled
+    meanwhile (possibly by another worker); returns the job if changed
+    """
+    changed = False
+
+    def apply(job: Optional[dict]) -> Optional[dict]:
+        nonlocal changed
+        if job is None or job["status"] == "cancelled":
+            return job
+        job.update(changes)
+        changed = True
+        return job
+
+    job = jobs.update(job_id, apply)
+    return job if changed else None
+
+def _complete(job_id: str, result_path: str):
+    job = _update(
+        job_id, status="completed", result_url=f"/api/protect/download/{job_id}", output_path=result_path
+    )
+    if job:
+        _publish(job_id, job)
+
+async def process_fawkes(key: str, file_path: str):
+    """Run Fawkes protection in the engine's worker pool"""
+    tmp_path = os.path.join(OUTPUT_DIR, f".work-{uuid.uuid4()}.png")
     try:
-        jobs[job_id]["status"] = "processing"
+        for job_id in result_cache.waiting(key):
+            job = _update(job_id, status="processing")
+            if job:
+                _publish(job_id, job)
         
-        # TODO: Integrate actual Fawkes processing
-        # from services.fawkes_runner import run_fawkes
-        # result_path = await run_fawkes(file_path)
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        await engine.run(key, cloak_image, file_path, tmp_path)
+        _, result_path = await run_in_threadpool(store_file, tmp_path, OUTPUT_DIR)
         
-        # Placeholder - simulate processing
-        import asyncio
-        await asyncio.sleep(2)
-        
-        output_dir = "/app/data/outputs"
-        os.makedirs(output_dir, exist_ok=True)
-        result_path = f"{output_dir}/{job_id}_protected.png"
-        
-        # For now, just copy the file
-        import shutil
-        shutil.copy(file_path, result_path)
-        
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["result_url"] = f"/api/protect/download/{job_id}"
+        for job_id in result_cache.resolve(key, result_path):
+            _complete(job_id, result_path)
         
+    except asyncio.CancelledError:
+        # Every waiting job was cancelled
+        result_cache.fail(key)
+        raise
     except Exception as e:
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
+        for job_id in result_cache.fail(key):
+            job = _update(job_id, status="failed", error=str(e) or type(e).__name__)
+            if job:
+                _publish(job_id, job)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@router.delete("/fawkes/{job_id}")
+async def cancel_fawkes(job_id: str):
+    """Cancel a pending or running protection job"""
+    previous = None
+
+    def cancel(job: Optional[dict]) -> Optional[dict]:
+        nonlocal previous
+        if job is not None:
+            previous = job["status"]
+            if previous in ("pending", "processing"):
+                job["status"] = "cancelled"
+        return job
+
+    job = jobs.update(job_id, cancel)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if previous not in ("pending", "processing"):
+        raise HTTPException(status_code=400, detail=f"Job already {previous}")
+    
+    _publish(job_id, job)
+    # Stop the work only if no identical job is still waiting on it (the
+    # engine of the worker process running it; elsewhere the work finishes
+    # and only fills the result cache)
+    if result_cache.leave(job["cache_key"], job_id):
+        engine.cancel(job["cache_key"])
+    
+    return {"message": f"Job {job_id} cancelled"}
+
+@router.get("/engine")
+async def engine_status():
+    """Worker pool utilisation and queue depth"""
+    return engine.status()
 
 @router.get("/download/{job_id}")
 async def download_result(job_id: str):
     """Download protected image"""
     from fastapi.responses import FileResponse
     
-    if job_id not in jobs or jobs[job_id]["status"] != "completed":
+    job = jobs.get(job_id)
+    if job is None or job["status"] != "completed":
         raise HTTPException(status_code=404, detail="Result not available")
     
-    result_path = f"/app/data/outputs/{job_id}_protected.png"
-    if not os.path.exists(result_path):
+    result_path = job.get("output_path")
+    if not result_path or not os.path.exists(result_path):
         raise HTTPException(status_code=404, detail="File not found")
     
     return FileResponse(result_path, filename=f"protected_{job_id}.png")
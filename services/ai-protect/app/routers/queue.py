@@ -1,53 +1,302 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, BackgroundTasks
 from fastapi.responses import FileResponse
-from typing import List, Dict, Optional
-import shutil
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, List, Optional, Tuple
+import json
 import os
 import time
-import uuid
-from models import Job, JobStatus, JobType
+import zipfile
+from models import Job, JobStatus, JobType, JobPriority
+from scheduler import create_scheduler
+from pipeline import process_batch
+from storage import store_upload, store_stream, extension, result_cache
+from events import bus, client_jobs
+from shared.metrics import Gauge, Histogram, JOB_BUCKETS
+from shared.state import StateStore
 
 router = APIRouter()
 
-# In-memory job store (replace with DB for production persistence)
-jobs: Dict[str, Job] = {}
-queue: List[str] = []
+# Jobs, queue and bulk bookkeeping live in the state backend (shared/state.py)
+# so every worker process sees the same ones. Records read from a store are
+# copies: changes go back through jobs.set() or, for jobs other requests may
+# touch at the same time, atomically through _change()
+jobs = StateStore("protect-jobs", encode=Job.model_dump_json, decode=Job.model_validate_json)
+scheduler = create_scheduler()
+_prefiltering = StateStore("protect-prefiltering")  # Bulk parents still creating child jobs
+_children_done = StateStore("protect-children-done")  # Bulk parent -> {child id: final status}
 
-UPLOAD_DIR = "/app/data/uploads"
-OUTPUT_DIR = "/app/data/outputs"
+QUEUE_DEPTH = Gauge("protect_queue_depth", "Jobs waiting for a worker", ["priority"],
+                    function=lambda: {(p,): n for p, n in scheduler.depths().items()})
+QUEUE_WAIT = Histogram("protect_job_queue_seconds", "Time from submission to dispatch", ["priority"],
+                       buckets=JOB_BUCKETS)
+JOB_RUN = Histogram("protect_job_run_seconds", "Time from dispatch to completion", ["priority", "status"],
+                    buckets=JOB_BUCKETS)
+
+UPLOAD_DIR = os.getenv("PROTECT_UPLOAD_DIR", "/app/data/uploads")
+OUTPUT_DIR = os.getenv("PROTECT_OUTPUT_DIR", "/app/data/outputs")
+
+BULK_BATCH_SIZE = int(os.getenv("PROTECT_BULK_BATCH_SIZE", "64"))
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "bmp", "tif", "tiff"}
 
 # Ensure dirs exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+def _parse_params(params: Optional[str]) -> dict:
+    try:
+        job_params = json.loads(params) if params else {}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="params must be a JSON object")
+    if not isinstance(job_params, dict):
+        raise HTTPException(status_code=400, detail="params must be a JSON object")
+    return job_params
+
+def _publish(job: Job):
+    """Push the job's current state to event stream subscribers"""
+    extra = {"parent_id": job.parent_id} if job.parent_id else {}
+    if job.error:
+        extra["error"] = job.error
+    bus.publish(job.id, job.status.value, job.progress, job.client_id, **extra)
+
+def _change(job_id: str, fn: Callable[[Job], None]) -> Optional[Job]:
+    """Atomically apply fn to a stored job; returns the changed job, or None if there is none"""
+    def apply(job: Optional[Job]) -> Optional[Job]:
+        if job is not None:
+            fn(job)
+        return job
+
+    return jobs.update(job_id, apply)
+
+def _track(job: Job):
+    """Index a new job under its client for event stream snapshots"""
+    if job.client_id:
+        client_jobs(job.client_id).set(job.id, job.created_at)
+
+def _enqueue(job: Job) -> Job:
+    """Register a job, finishing it from cache or queueing it for a worker"""
+    _track(job)
+    # Identical input already protected - finish instantly
+    cached_path = result_cache.lookup(job.cache_key)
+    if cached_path:
+        job.status = JobStatus.COMPLETED
+        job.completed_at = time.time()
+        job.output_path = cached_path
+        job.cached = True
+        job.progress = 100
+        jobs.set(job.id, job)
+        _publish(job)
+        _update_parent(job)
+        return job
+
+    # Only the first of several identical jobs goes to the worker; a
+    # higher-priority duplicate lifts the queued one to its class
+    jobs.set(job.id, job)
+    leader_id = result_cache.join(job.cache_key, job.id)
+    if leader_id == job.id:
+        scheduler.push(job.id, job.client_id, job.priority)
+    else:
+        scheduler.promote(leader_id, job.priority)
+
+    _publish(job)
+    return job
+
+def _finish(job: Job, status: JobStatus, now: float):
+    """Move a job to a terminal state and record its latencies"""
+    job.status = status
+    job.completed_at = now
+    if job.started_at is not None:
+        job.run_seconds = round(now - job.started_at, 3)
+        scheduler.record(job.priority, None, job.run_seconds)
+        JOB_RUN.labels(job.priority.value, status.value).observe(now - job.started_at)
+
+def _update_parent(child: Job):
+    """Count a finished child towards its bulk parent"""
+    if not child.parent_id:
+        return
+    if child.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+        _children_done.update(child.parent_id, lambda done: {**(done or {}), child.id: child.status.value})
+    _check_parent(child.parent_id)
+
+def _check_parent(parent_id: str):
+    """Complete a bulk parent job once all of its children are done"""
+    if parent_id in _prefiltering:
+        return
+    changed = False
+
+    def apply(parent: Optional[Job]) -> Optional[Job]:
+        nonlocal changed
+        if parent is None or parent.status != JobStatus.PROCESSING:
+            return parent
+        # Children are only counted once they finish, so one small record is
+        # read here instead of every child job
+        done = _children_done.get(parent_id, {})
+        total = len(parent.children)
+        parent.progress = int(100 * len(done) / total) if total else 100
+        if len(done) >= total:
+            parent.status = JobStatus.COMPLETED
+            parent.completed_at = time.time()
+            failed = sum(status == JobStatus.FAILED.value for status in done.values())
+            if failed:
+                parent.error = f"{failed} of {total} images failed"
+            _children_done.delete(parent_id)
+        changed = True
+        return parent
+
+    parent = jobs.update(parent_id, apply)
+    if changed:
+        _publish(parent)
+
 @router.post("/add", response_model=Job)
-async def add_job(type: JobType = Form(...), image: UploadFile = File(...)):
+async def add_job(
+    type: JobType = Form(...),
+    image: UploadFile = File(...),
+    params: Optional[str] = Form(None),
+    client_id: Optional[str] = Form(None),
+    priority: JobPriority = Form(JobPriority.NORMAL)
+):
     """Add a new job to the queue (called by Dashboard)"""
-    file_ext = image.filename.split('.')[-1]
-    filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
-    
-    job = Job.create(type, file_path)
-    jobs[job.id] = job
-    queue.append(job.id)
-    
-    return job
+    job_params = _parse_params(params)
+    sha256, file_path = await store_upload(image, UPLOAD_DIR)
+    job = Job.create(type, file_path, input_sha256=sha256, params=job_params)
+    job.client_id = client_id
+    job.priority = priority
+    return _enqueue(job)
+
+def _store_bulk_upload(upload: UploadFile) -> List[Tuple[str, str]]:
+    """Store an uploaded image, or every image inside an uploaded zip"""
+    is_zip = upload.content_type in ("application/zip", "application/x-zip-compressed") or \
+        (upload.filename or "").lower().endswith(".zip")
+    if not is_zip:
+        upload.file.seek(0)
+        return [store_stream(upload.file, UPLOAD_DIR, extension(upload.filename, "png"))]
+
+    stored = []
+    try:
+        with zipfile.ZipFile(upload.file) as archive:
+            for member in archive.infolist():
+                ext = extension(member.filename, "")
+                if member.is_dir() or ext not in IMAGE_EXTENSIONS:
+                    continue
+                with archive.open(member) as src:
+                    stored.append(store_stream(src, UPLOAD_DIR, ext))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive")
+    return stored
+
+async def process_bulk(parent_id: str, stored: List[Tuple[str, str]]):
+    """Face pre-filter a bulk submission in batches and queue a child job per usable image"""
+    parent = jobs.get(parent_id)
+    hashes = {path: sha256 for sha256, path in stored}
+    paths = list(hashes)
+    _prefiltering.set(parent_id, True)
+    try:
+        for i in range(0, len(paths), BULK_BATCH_SIZE):
+            results, stats = await run_in_threadpool(process_batch, paths[i:i + BULK_BATCH_SIZE])
+            children = []
+            for result in results:
+                if not result["has_face"]:
+                    continue
+                child = Job.create(
+                    parent.type,
+                    result["path"],
+                    input_sha256=hashes[result["path"]],
+                    params=parent.params
+                )
+                child.parent_id = parent.id
+                child.client_id = parent.client_id
+                child.priority = parent.priority
+                child.face_box = result["box"]
+                children.append(child)
+
+            # One write of the parent per batch, before its children can finish
+            def add_batch(job: Job):
+                job.batch_stats = job.batch_stats + [stats]
+                job.children = job.children + [child.id for child in children]
+
+            parent = _change(parent_id, add_batch)
+            for child in children:
+                _enqueue(child)
+    except Exception as e:
+        def failed(job: Job):
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            job.completed_at = time.time()
+
+        parent = _change(parent_id, failed)
+        _publish(parent)
+        return
+    finally:
+        _prefiltering.delete(parent_id)
+
+    # Nothing to cloak, or every child was already cached
+    if parent.children:
+        _check_parent(parent_id)
+    else:
+        def completed(job: Job):
+            job.status = JobStatus.COMPLETED
+            job.completed_at = time.time()
+            job.progress = 100
+
+        _publish(_change(parent_id, completed))
+
+@router.post("/bulk", response_model=Job)
+async def add_bulk_job(
+    background_tasks: BackgroundTasks,
+    type: JobType = Form(...),
+    images: List[UploadFile] = File(...),
+    params: Optional[str] = Form(None),
+    client_id: Optional[str] = Form(None),
+    priority: JobPriority = Form(JobPriority.BACKLOG)
+):
+    """Submit many images (or zip archives of images) as one parent job"""
+    job_params = _parse_params(params)
+
+    stored = []
+    for upload in images:
+        stored.extend(await run_in_threadpool(_store_bulk_upload, upload))
+    if not stored:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+
+    parent = Job.create(type, "", params=job_params)
+    parent.status = JobStatus.PROCESSING
+    parent.client_id = client_id
+    parent.priority = priority
+    jobs.set(parent.id, parent)
+    _track(parent)
+    _publish(parent)
+
+    background_tasks.add_task(process_bulk, parent.id, stored)
+    return parent
 
 @router.get("/pending", response_model=Optional[Job])
 async def get_pending_job():
     """Get the next pending job (called by Colab Worker)"""
-    # Simple FIFO, but check if we have any "pending" jobs in the list
-    # We iterate copy to allow modification if needed, though here we just look
-    for job_id in queue:
+    # Highest priority class first, weighted fair across clients within it
+    while True:
+        job_id = scheduler.pop()
+        if job_id is None:
+            return None
         job = jobs.get(job_id)
         if job and job.status == JobStatus.PENDING:
-            # Mark as processing
-            job.status = JobStatus.PROCESSING
-            return job
-    return None
+            break
+
+    # Mark as processing, along with identical jobs coalesced onto it
+    now = time.time()
+
+    def dispatched(waiting_job: Job):
+        waiting_job.status = JobStatus.PROCESSING
+        waiting_job.started_at = now
+        waiting_job.queue_seconds = round(now - waiting_job.created_at, 3)
+
+    for waiting_id in set(result_cache.waiting(job.cache_key)) | {job_id}:
+        waiting_job = _change(waiting_id, dispatched)
+        if waiting_job:
+            scheduler.record(waiting_job.priority, waiting_job.queue_seconds, None)
+            QUEUE_WAIT.labels(waiting_job.priority.value).observe(now - waiting_job.created_at)
+            _publish(waiting_job)
+            if waiting_id == job_id:
+                job = waiting_job
+    return job
 
 @router.get("/image/{job_id}")
 async def get_job_image(job_id: str):
@@ -65,20 +314,28 @@ async def complete_job(job_id: str, file: UploadFile = File(...)):
         raise HTTPException(status_code=404, detail="Job not found")
     
     # Save output
-    file_ext = file.filename.split('.')[-1]
-    output_filename = f"processed_{job_id}.{file_ext}"
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
-    
-    with open(output_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    job.status = JobStatus.COMPLETED
-    job.completed_at = time.time()
-    job.output_path = output_path
+    _, output_path = await store_upload(file, OUTPUT_DIR)
+
+    # Complete this job and every identical job coalesced onto it
+    now = time.time()
+    waiting = result_cache.resolve(job.cache_key, output_path)
+    for waiting_id in set(waiting) | {job_id}:
+        def completed(waiting_job: Job):
+            _finish(waiting_job, JobStatus.COMPLETED, now)
+            waiting_job.output_path = output_path
+            waiting_job.cached = waiting_job.id != job_id
+            waiting_job.progress = 100
+
+        waiting_job = _change(waiting_id, completed)
+        if not waiting_job:
+            continue
+        if waiting_id == job_id:
+            job = waiting_job
+        _publish(waiting_job)
+        _update_parent(waiting_job)
     
-    # Remove from queue list (it's done)
-    if job_id in queue:
-        queue.remove(job_id)
+    # Remove from the queue if it was never dispatched
+    scheduler.discard(job_id)
         
     return job
 
@@ -89,15 +346,55 @@ async def fail_job(job_id: str, reason: str = Form(...)):
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job.status = JobStatus.FAILED
-    job.error = reason
-    job.completed_at = time.time()
+    now = time.time()
+    waiting = result_cache.fail(job.cache_key)
+    def failed(waiting_job: Job):
+        waiting_job.error = reason
+        _finish(waiting_job, JobStatus.FAILED, now)
+
+    for waiting_id in set(waiting) | {job_id}:
+        waiting_job = _change(waiting_id, failed)
+        if not waiting_job:
+            continue
+        if waiting_id == job_id:
+            job = waiting_job
+        _publish(waiting_job)
+        _update_parent(waiting_job)
     
-    if job_id in queue:
-        queue.remove(job_id)
+    scheduler.discard(job_id)
         
     return job
 
+@router.post("/progress/{job_id}")
+async def report_progress(job_id: str, progress: int = Form(..., ge=0, le=100)):
+    """Report processing progress in percent (called by Colab Worker)"""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != JobStatus.PROCESSING:
+        raise HTTPException(status_code=400, detail=f"Job is {job.status.value}")
+
+    # Identical jobs coalesced onto this one progress with it
+    def progressed(waiting_job: Job):
+        waiting_job.progress = progress
+
+    for waiting_id in set(result_cache.waiting(job.cache_key)) | {job_id}:
+        waiting_job = _change(waiting_id, progressed)
+        if waiting_job:
+            _publish(waiting_job)
+    return {"job_id": job_id, "progress": progress}
+
+@router.put("/weights/{client_id}")
+async def set_client_weight(client_id: str, weight: float = Form(..., gt=0, le=100)):
+    """Set a client's fair-share weight within its priority class"""
+    scheduler.set_weight(client_id, weight)
+    return {"client_id": client_id, "weight": weight}
+
+@router.get("/stats")
+async def get_queue_stats():
+    """Queue depth per priority and client, plus wait/run latency percentiles"""
+    return scheduler.stats()
+
 @router.get("/status/{job_id}", response_model=Job)
 async def get_job_status(job_id: str):
     """Check status (called by Dashboard)"""
@@ -0,0 +1,155 @@
+"""
+Content-addressed storage and result cache for protection jobs
+
+Uploads and outputs are stored under their SHA-256 digest so the same photo
+is only kept once on disk, and a job whose (sha256, type, params) matches a
+completed one can reuse its output instead of being cloaked again. The
+cache and its waiter lists live in the state backend (shared/state.py), so
+identical jobs coalesce across uvicorn workers too.
+"""
+from fastapi import UploadFile
+from typing import BinaryIO, List, Optional, Tuple
+import aiofiles
+import hashlib
+import json
+import os
+import uuid
+
+from shared.state import StateStore
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+def extension(filename: Optional[str], default: str) -> str:
+    if filename and "." in filename:
+        ext = filename.rsplit(".", 1)[-1].lower()
+        if ext.isalnum():
+            return ext
+    return default
+
+def _commit(tmp_path: str, directory: str, digest: str, ext: str) -> str:
+    """Move a fully written temp file to its content-addressed path"""
+    final_path = os.path.join(directory, f"{digest}.{ext}")
+    if os.path.exists(final_path):
+        # Already stored - drop the duplicate
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, final_path)
+    return final_path
+
+async def store_upload(upload: UploadFile, directory: str, default_ext: str = "png") -> Tuple[str, str]:
+    """Stream an upload to disk, hashing it on the way. Returns (sha256, path)"""
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4()}")
+    digest = hashlib.sha256()
+
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                await f.write(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    sha256 = digest.hexdigest()
+    return sha256, _commit(tmp_path, directory, sha256, extension(upload.filename, default_ext))
+
+def store_stream(src: BinaryIO, directory: str, ext: str = "png") -> Tuple[str, str]:
+    """Copy a file-like object into content-addressed storage. Returns (sha256, path)"""
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4()}")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    sha256 = digest.hexdigest()
+    return sha256, _commit(tmp_path, directory, sha256, ext)
+
+def store_file(src_path: str, directory: str, ext: str = "png") -> Tuple[str, str]:
+    """Move a locally produced file into content-addressed storage. Returns (sha256, path)"""
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    with open(src_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    sha256 = digest.hexdigest()
+    tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4()}")
+    os.replace(src_path, tmp_path)
+    return sha256, _commit(tmp_path, directory, sha256, ext)
+
+def cache_key(sha256: str, job_type: str, params: Optional[dict] = None, scope: str = "queue") -> str:
+    """
+    Stable key for a (input hash, job type, params) combination. `scope` names
+    the router whose job store the waiters live in: resolve()/fail() hand back
+    bare job ids, so the Fawkes and queue routers must never share a key.
+    """
+    canonical = json.dumps(params or {}, sort_keys=True, separators=(",", ":"))
+    return f"{scope}:{job_type}:{sha256}:{hashlib.sha256(canonical.encode()).hexdigest()[:16]}"
+
+class ResultCache:
+    """
+    Maps cache keys to finished outputs and coalesces identical in-flight jobs.
+
+    Every job waiting on a key is registered with join(); only the first one
+    (the leader) needs to actually run. When the work finishes,
+    resolve()/fail() hand back all waiting job ids so the caller can update
+    them together.
+    """
+
+    def __init__(self):
+        self._results = StateStore("protect-results")  # key -> output path
+        self._waiters = StateStore("protect-waiters")  # key -> job ids, first one doing the work
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the cached output path for a key, if it is still on disk"""
+        path = self._results.get(key)
+        if path and not os.path.exists(path):
+            self._results.delete(key)
+            return None
+        return path
+
+    def join(self, key: str, job_id: str) -> str:
+        """
+        Register a job as waiting on key and return the leader (the first
+        waiter, read in the same update). The caller must start the work if
+        that is its own job id.
+        """
+        waiters = self._waiters.update(key, lambda waiters: (waiters or []) + [job_id])
+        return waiters[0]
+
+    def leave(self, key: str, job_id: str) -> bool:
+        """Detach a job from key. True if nobody is waiting on the work anymore"""
+        def remove(waiters: Optional[List[str]]) -> Optional[List[str]]:
+            if waiters and job_id in waiters:
+                waiters.remove(job_id)
+            return waiters or None
+
+        return self._waiters.update(key, remove) is None
+
+    def waiting(self, key: str) -> List[str]:
+        """Jobs currently waiting on key"""
+        return self._waiters.get(key, [])
+
+    def resolve(self, key: str, output_path: str) -> List[str]:
+        """Record a finished output and return the jobs that were waiting on it"""
+        self._results.set(key, output_path)
+        return self._waiters.pop(key, [])
+
+    def fail(self, key: str) -> List[str]:
+        """Drop in-flight work for key and return the jobs that were waiting on it"""
+        return self._waiters.pop(key, [])
+
+# Shared by the Fawkes and queue routers
+result_cache = ResultCache()
@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+from models import JobPriority
+from scheduler import FairScheduler
+
+def drain(scheduler: FairScheduler) -> list:
+    popped = []
+    while (job_id := scheduler.pop()) is not None:
+        popped.append(job_id)
+    return popped
+
+def test_promote_then_pop_until_empty():
+    scheduler = FairScheduler()
+    scheduler.push("a", "c1", JobPriority.BACKLOG)
+    scheduler.push("b", "c1", JobPriority.BACKLOG)
+    scheduler.promote("a", JobPriority.RUSH)
+
+    assert drain(scheduler) == ["a", "b"]
+    assert len(scheduler) == 0
+    assert scheduler.depths() == {"rush": 0, "normal": 0, "backlog": 0}
+
+def test_promote_ignores_lower_priority():
+    scheduler = FairScheduler()
+    scheduler.push("a", "c1", JobPriority.RUSH)
+    scheduler.promote("a", JobPriority.BACKLOG)
+
+    assert drain(scheduler) == ["a"]
+
+def test_discard_then_push_again():
+    scheduler = FairScheduler()
+    scheduler.push("a", "c1", JobPriority.NORMAL)
+    scheduler.discard("a")
+    scheduler.push("a", "c1", JobPriority.NORMAL)
+
+    assert drain(scheduler) == ["a"]
+
+def test_discarded_job_is_skipped():
+    scheduler = FairScheduler()
+    scheduler.push("a", "c1", JobPriority.NORMAL)
+    scheduler.push("b", "c2", JobPriority.NORMAL)
+    scheduler.discard("a")
+
+    assert drain(scheduler) == ["b"]
@@ -1,7 +1,12 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from routers import health, osint, shodan, spiderfoot
-from security import RateLimitMiddleware, LoggingMiddleware, verify_api_key
+from security import RateLimitMiddleware, verify_api_key
+from shared.metrics import instrument
+from shared.security import configure_logging, RequestLoggingMiddleware
+from shared.profiling import enable_profiling
+
+configure_logging("osint")
 
 app = FastAPI(
     title="Aegis OSINT API",
@@ -12,7 +17,6 @@ app = FastAPI(
 )
 
 # Security middleware
-app.add_middleware(LoggingMiddleware)
 app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
@@ -23,6 +27,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-only request profiling (X-Profile: 1), inside logging and metrics
+enable_profiling(app, "/api/osint/profiles")
+
+# Request IDs and sampled JSON access logs, then metrics outermost so latency
+# includes the other middleware; serves /metrics
+app.add_middleware(RequestLoggingMiddleware)
+instrument(app)
+
 app.include_router(health.router)
 app.include_router(osint.router, prefix="/api/osint", tags=["OSINT"], dependencies=[Depends(verify_api_key)])
 app.include_router(shodan.router, prefix="/api/osint/shodan", tags=["Shodan"], dependencies=[Depends(verify_api_key)])
@@ -1,14 +1,56 @@
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from collections import OrderedDict
 import os
+import time
 import httpx
+from shared.metrics import Counter, Histogram
+from shared.profiling import HTTP_EVENT_HOOKS
 
 router = APIRouter()
 
 # Shodan API configuration
 SHODAN_API_KEY = os.getenv("SHODAN_API_KEY", "")
-SHODAN_BASE_URL = "https://api.shodan.io"
+SHODAN_BASE_URL = os.getenv("SHODAN_BASE_URL", "https://api.shodan.io")
+SHODAN_EXPLOITS_URL = os.getenv("SHODAN_EXPLOITS_URL", "https://exploits.shodan.io/api")
+CACHE_TTL = float(os.getenv("SHODAN_CACHE_TTL", "300"))  # seconds; Shodan data changes slowly
+CACHE_MAX_ENTRIES = int(os.getenv("SHODAN_CACHE_MAX_ENTRIES", "1024"))
+
+# Upstream metrics
+UPSTREAM_SECONDS = Histogram("shodan_upstream_duration_seconds", "Shodan API call latency", ["endpoint", "status"])
+CACHE_REQUESTS = Counter("shodan_cache_requests_total", "Shodan response cache lookups", ["endpoint", "result"])
+
+# (url, params) -> (expires_at, data), oldest first
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+async def _shodan_get(endpoint: str, url: str, params: Dict[str, Any], cache: bool = True) -> Any:
+    """GET a Shodan API URL and return its JSON, served from the TTL cache when fresh"""
+    key = (url, tuple(sorted(params.items())))
+    if cache and CACHE_TTL > 0:
+        entry = _cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            CACHE_REQUESTS.labels(endpoint, "hit").inc()
+            return entry[1]
+        CACHE_REQUESTS.labels(endpoint, "miss").inc()
+
+    status = "error"
+    start = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
+            response = await client.get(url, params={**params, "key": SHODAN_API_KEY})
+        status = str(response.status_code)
+        response.raise_for_status()
+        data = response.json()
+    finally:
+        UPSTREAM_SECONDS.labels(endpoint, status).observe(time.perf_counter() - start)
+
+    if cache and CACHE_TTL > 0:
+        _cache[key] = (time.monotonic() + CACHE_TTL, data)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return data
 
 class HostInfo(BaseModel):
     ip: str
@@ -40,36 +82,27 @@ async def get_host_info(ip: str):
             detail="Shodan API key not configured. Set SHODAN_API_KEY environment variable."
         )
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{SHODAN_BASE_URL}/shodan/host/{ip}",
-                params={"key": SHODAN_API_KEY}
-            )
-            
-            if response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Host not found in Shodan database")
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            return HostInfo(
-                ip=data.get("ip_str", ip),
-                hostnames=data.get("hostnames", []),
-                ports=data.get("ports", []),
-                vulns=list(data.get("vulns", {}).keys()) if data.get("vulns") else [],
-                org=data.get("org"),
-                isp=data.get("isp"),
-                country=data.get("country_name"),
-                city=data.get("city"),
-                last_update=data.get("last_update"),
-                data=data.get("data", [])[:5]  # Limit to first 5 service entries
-            )
-            
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail=str(e))
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        data = await _shodan_get("host", f"{SHODAN_BASE_URL}/shodan/host/{ip}", {})
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Host not found in Shodan database")
+        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return HostInfo(
+        ip=data.get("ip_str", ip),
+        hostnames=data.get("hostnames", []),
+        ports=data.get("ports", []),
+        vulns=list(data.get("vulns", {}).keys()) if data.get("vulns") else [],
+        org=data.get("org"),
+        isp=data.get("isp"),
+        country=data.get("country_name"),
+        city=data.get("city"),
+        last_update=data.get("last_update"),
+        data=data.get("data", [])[:5]  # Limit to first 5 service entries
+    )
 
 @router.get("/search", response_model=SearchResult)
 async def search_shodan(
@@ -84,38 +117,27 @@ async def search_shodan(
             detail="Shodan API key not configured"
         )
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{SHODAN_BASE_URL}/shodan/host/search",
-                params={
-                    "key": SHODAN_API_KEY,
-                    "query": query,
-                    "page": page
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return SearchResult(
-                total=data.get("total", 0),
-                matches=[
-                    {
-                        "ip": m.get("ip_str"),
-                        "port": m.get("port"),
-                        "org": m.get("org"),
-                        "product": m.get("product"),
-                        "version": m.get("version"),
-                        "country": m.get("location", {}).get("country_name")
-                    }
-                    for m in data.get("matches", [])[:20]
-                ]
-            )
-            
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail=str(e))
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        data = await _shodan_get("search", f"{SHODAN_BASE_URL}/shodan/host/search", {"query": query, "page": page})
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return SearchResult(
+        total=data.get("total", 0),
+        matches=[
+            {
+                "ip": m.get("ip_str"),
+                "port": m.get("port"),
+                "org": m.get("org"),
+                "product": m.get("product"),
+                "version": m.get("version"),
+                "country": m.get("location", {}).get("country_name")
+            }
+            for m in data.get("matches", [])[:20]
+        ]
+    )
 
 @router.get("/exploits", response_model=ExploitResult)
 async def search_exploits(
@@ -129,43 +151,27 @@ async def search_exploits(
             detail="Shodan API key not configured"
         )
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{SHODAN_BASE_URL}/api-info",
-                params={"key": SHODAN_API_KEY}
-            )
-            
-            # Use exploits API
-            response = await client.get(
-                "https://exploits.shodan.io/api/search",
-                params={
-                    "key": SHODAN_API_KEY,
-                    "query": query
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return ExploitResult(
-                total=data.get("total", 0),
-                exploits=[
-                    {
-                        "id": e.get("_id"),
-                        "description": e.get("description", "")[:200],
-                        "source": e.get("source"),
-                        "type": e.get("type"),
-                        "platform": e.get("platform"),
-                        "cve": e.get("cve", [])
-                    }
-                    for e in data.get("matches", [])[:20]
-                ]
-            )
-            
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail=str(e))
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        data = await _shodan_get("exploits", f"{SHODAN_EXPLOITS_URL}/search", {"query": query})
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return ExploitResult(
+        total=data.get("total", 0),
+        exploits=[
+            {
+                "id": e.get("_id"),
+                "description": e.get("description", "")[:200],
+                "source": e.get("source"),
+                "type": e.get("type"),
+                "platform": e.get("platform"),
+                "cve": e.get("cve", [])
+            }
+            for e in data.get("matches", [])[:20]
+        ]
+    )
 
 @router.get("/dns/{domain}")
 async def dns_lookup(domain: str):
@@ -174,20 +180,10 @@ async def dns_lookup(domain: str):
     if not SHODAN_API_KEY:
         raise HTTPException(status_code=500, detail="Shodan API key not configured")
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{SHODAN_BASE_URL}/dns/resolve",
-                params={
-                    "key": SHODAN_API_KEY,
-                    "hostnames": domain
-                }
-            )
-            response.raise_for_status()
-            return response.json()
-            
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        return await _shodan_get("dns", f"{SHODAN_BASE_URL}/dns/resolve", {"hostnames": domain})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/api-info")
 async def get_api_info():
@@ -196,21 +192,15 @@ async def get_api_info():
     if not SHODAN_API_KEY:
         return {"status": "not_configured", "message": "Set SHODAN_API_KEY environment variable"}
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{SHODAN_BASE_URL}/api-info",
-                params={"key": SHODAN_API_KEY}
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "status": "configured",
-                "plan": data.get("plan"),
-                "query_credits": data.get("query_credits"),
-                "scan_credits": data.get("scan_credits")
-            }
-            
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+    try:
+        # Credits change with every query, so never cached
+        data = await _shodan_get("api-info", f"{SHODAN_BASE_URL}/api-info", {}, cache=False)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+    return {
+        "status": "configured",
+        "plan": data.get("plan"),
+        "query_credits": data.get("query_credits"),
+        "scan_credits": data.get("scan_credits")
+    }
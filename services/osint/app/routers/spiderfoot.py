@@ -4,14 +4,16 @@ from typing import Optional, List, Dict, Any
 import os
 import httpx
 import uuid
+from shared.profiling import HTTP_EVENT_HOOKS
+from shared.state import StateStore
 
 router = APIRouter()
 
 # SpiderFoot configuration - runs as a separate container
 SPIDERFOOT_URL = os.getenv("SPIDERFOOT_URL", "http://spiderfoot:5001")
 
-# In-memory scan storage (use Redis in production)
-scans = {}
+# Scan dicts, visible to every worker process (see shared/state.py)
+scans = StateStore("osint-scans")
 
 class ScanRequest(BaseModel):
     target: str  # Domain, IP, email, or username
@@ -38,13 +40,13 @@ async def start_scan(request: ScanRequest, background_tasks: BackgroundTasks):
     scan_id = str(uuid.uuid4())[:8].upper()
     
     # Store scan info
-    scans[scan_id] = {
+    scans.set(scan_id, {
         "status": "queued",
         "target": request.target,
         "scan_type": request.scan_type,
         "progress": 0,
         "results": []
-    }
+    })
     
     # Start scan in background
     background_tasks.add_task(run_spiderfoot_scan, scan_id, request)
@@ -61,10 +63,10 @@ async def start_scan(request: ScanRequest, background_tasks: BackgroundTasks):
 async def get_scan_status(scan_id: str):
     """Get status of a running or completed scan"""
     
-    if scan_id not in scans:
+    scan = scans.get(scan_id)
+    if scan is None:
         raise HTTPException(status_code=404, detail="Scan not found")
     
-    scan = scans[scan_id]
     return ScanStatus(
         scan_id=scan_id,
         status=scan["status"],
@@ -77,11 +79,10 @@ async def get_scan_status(scan_id: str):
 async def get_scan_results(scan_id: str):
     """Get results of a completed scan"""
     
-    if scan_id not in scans:
+    scan = scans.get(scan_id)
+    if scan is None:
         raise HTTPException(status_code=404, detail="Scan not found")
     
-    scan = scans[scan_id]
-    
     if scan["status"] != "completed":
         raise HTTPException(
             status_code=400, 
@@ -130,10 +131,13 @@ async def list_modules():
 async def cancel_scan(scan_id: str):
     """Cancel a running scan"""
     
-    if scan_id not in scans:
-        raise HTTPException(status_code=404, detail="Scan not found")
+    def cancel(scan: Optional[dict]) -> Optional[dict]:
+        if scan is not None:
+            scan["status"] = "cancelled"
+        return scan
     
-    scans[scan_id]["status"] = "cancelled"
+    if scans.update(scan_id, cancel) is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
     return {"message": f"Scan {scan_id} cancelled"}
 
 @router.get("/health")
@@ -141,7 +145,7 @@ async def spiderfoot_health():
     """Check if SpiderFoot service is available"""
     
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with httpx.AsyncClient(timeout=5.0, event_hooks=HTTP_EVENT_HOOKS) as client:
             response = await client.get(f"{SPIDERFOOT_URL}/")
             return {
                 "status": "available",
@@ -154,15 +158,23 @@ async def spiderfoot_health():
             "error": str(e)
         }
 
+def _update_scan(scan_id: str, **changes):
+    """Atomically apply changes to a scan, unless it was cancelled meanwhile (possibly by another worker)"""
+    def apply(scan: Optional[dict]) -> Optional[dict]:
+        if scan is not None and scan["status"] != "cancelled":
+            scan.update(changes)
+        return scan
+    
+    scans.update(scan_id, apply)
+
 async def run_spiderfoot_scan(scan_id: str, request: ScanRequest):
     """Background task to run SpiderFoot scan"""
     
     try:
-        scans[scan_id]["status"] = "running"
-        scans[scan_id]["progress"] = 10
+        _update_scan(scan_id, status="running", progress=10)
         
         # Try to connect to SpiderFoot
-        async with httpx.AsyncClient(timeout=300.0) as client:
+        async with httpx.AsyncClient(timeout=300.0, event_hooks=HTTP_EVENT_HOOKS) as client:
             try:
                 # Start scan via SpiderFoot API
                 response = await client.post(
@@ -174,7 +186,7 @@ async def run_spiderfoot_scan(scan_id: str, request: ScanRequest):
                     }
                 )
                 
-                scans[scan_id]["progress"] = 50
+                _update_scan(scan_id, progress=50)
                 
                 # In production, poll for completion
                 # For now, simulate results
@@ -184,14 +196,12 @@ async def run_spiderfoot_scan(scan_id: str, request: ScanRequest):
                 pass
         
         # Simulated results (replace with actual SpiderFoot API calls)
-        scans[scan_id]["results"] = [
+        results = [
             {"type": "DOMAIN_NAME", "data": request.target, "source": "DNS"},
             {"type": "IP_ADDRESS", "data": "Resolved IP", "source": "DNS"},
         ]
         
-        scans[scan_id]["status"] = "completed"
-        scans[scan_id]["progress"] = 100
+        _update_scan(scan_id, results=results, status="completed", progress=100)
         
     except Exception as e:
-        scans[scan_id]["status"] = "failed"
-        scans[scan_id]["error"] = str(e)
+        _update_scan(scan_id, status="failed", error=str(e))
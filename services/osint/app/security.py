@@ -1,17 +1,14 @@
 """
-API Security - Authentication, Rate Limiting, Logging
+API Security - Authentication, Rate Limiting
+(request logging lives in shared/security.py)
 """
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import APIKeyHeader
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
 import os
-import logging
 from collections import defaultdict
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger("aegis")
-
 API_KEY_HEADER = APIKeyHeader(name="X-API-Key", auto_error=False)
 VALID_API_KEYS = set(os.getenv("API_KEYS", "aegis-dev-key,aegis-admin-key").split(","))
 PUBLIC_PATHS = {"/", "/health", "/docs", "/openapi.json", "/redoc"}
@@ -43,10 +40,3 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             raise HTTPException(status_code=429, detail="Rate limit exceeded")
         rate_store[client].append(now)
         return await call_next(request)
-
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start = time.time()
-        response = await call_next(request)
-        logger.info(f"{request.method} {request.url.path} - {response.status_code} - {time.time()-start:.3f}s")
-        return response
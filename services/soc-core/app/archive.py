@@ -0,0 +1,212 @@
+"""
+Cold storage for old acknowledged alerts
+
+Acknowledged alerts older than ALERT_ARCHIVE_DAYS are moved out of the
+alerts table into one gzipped NDJSON segment per month of created_at
+(ALERT_ARCHIVE_DIR/alerts-YYYY-MM.jsonl.gz), so the hot table, its indexes
+and every query over it only carry live data.
+
+A run works in ARCHIVE_BATCH-row batches: append one gzip member per month
+(a multi-member file is still one valid .gz) and fsync it, then delete the
+rows and record the segment's new length in archive_segments in one short
+transaction. Writers are never locked out for long, and the committed
+length is the truth: bytes past it come from a batch that did not commit,
+so readers stop there and the next run truncates them.
+
+Archived alerts stay queryable by time range and filters through
+/api/soc/alerts/archive, which only opens the segments the range covers.
+Each run is logged as one `archive` change, so ETags and dashboards notice
+the rows leaving without a change event per row. The scheduled loop also
+prunes expired minute buckets of the alert histograms (timeseries.py).
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+import asyncio
+import gzip
+import logging
+import os
+import threading
+import zlib
+
+import orjson
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal, Alert, ArchiveSegment
+from changefeed import record_change
+from timeseries import prune_minute_buckets
+from shared.metrics import Counter
+
+ALERT_ARCHIVE_DAYS = int(os.getenv("ALERT_ARCHIVE_DAYS", "90"))  # 0 disables the scheduled runs
+ALERT_ARCHIVE_DIR = os.getenv("ALERT_ARCHIVE_DIR", "/app/data/archive")
+ALERT_ARCHIVE_INTERVAL = int(os.getenv("ALERT_ARCHIVE_INTERVAL", "3600"))  # seconds between runs
+ARCHIVE_BATCH = 2000
+
+# Everything needed to restore the row, in the list endpoints' field names
+ARCHIVE_COLUMNS = (Alert.id, Alert.case_id, Alert.source, Alert.alert_type, Alert.message, Alert.severity,
+                   Alert.acknowledged, Alert.acknowledged_by, Alert.acknowledged_at, Alert.created_at,
+                   Alert.occurrences, Alert.last_seen_at, Alert.fingerprint)
+
+ALERTS_ARCHIVED = Counter("soc_alerts_archived_total", "Alerts moved to cold storage")
+
+logger = logging.getLogger(__name__)
+
+def segment_path(month: str) -> str:
+    return os.path.join(ALERT_ARCHIVE_DIR, f"alerts-{month}.jsonl.gz")
+
+def _append(month: str, committed: int, lines: List[bytes]) -> int:
+    """
+    One gzip member at the segment's committed length, durable before the
+    rows are deleted; returns the new length
+    """
+    path = segment_path(month)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.truncate(committed)  # drop the tail of a batch that never committed
+        f.seek(committed)
+        f.write(gzip.compress(b"".join(lines), compresslevel=6))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+class AlertArchiver:
+    def __init__(self):
+        self._lock = threading.Lock()  # one run at a time (scheduled or on demand)
+        self._task: Optional[asyncio.Task] = None
+
+    def _archive_batch(self, db: Session, rows) -> int:
+        by_month: Dict[str, list] = {}
+        for row in rows:
+            by_month.setdefault(row.created_at.strftime("%Y-%m"), []).append(row)
+        for month, month_rows in by_month.items():
+            segment = db.get(ArchiveSegment, month) or ArchiveSegment(month=month, rows=0, bytes=0)
+            lines = [orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE) for row in month_rows]
+            segment.bytes = _append(month, segment.bytes, lines)
+            segment.rows += len(lines)
+            first, last = month_rows[0].created_at, month_rows[-1].created_at
+            segment.first_at = min(segment.first_at or first, first)
+            segment.last_at = max(segment.last_at or last, last)
+            db.add(segment)
+        db.execute(delete(Alert).where(Alert.id.in_([row.id for row in rows])),
+                   execution_options={"synchronize_session": False})
+        db.commit()
+        return len(rows)
+
+    def run(self, days: int = ALERT_ARCHIVE_DAYS) -> dict:
+        """Archive acknowledged alerts created more than `days` ago (blocking)"""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        archived, after = 0, None
+        with self._lock:
+            os.makedirs(ALERT_ARCHIVE_DIR, exist_ok=True)
+            while True:
+                with SessionLocal() as db:
+                    # Walk old rows by created_at and skip the unacknowledged in
+                    # Python: an acknowledged = 1 term would pull SQLite onto
+                    # ix_alerts_counts and a sort of every acknowledged alert
+                    statement = select(*ARCHIVE_COLUMNS).where(Alert.created_at < cutoff)
+                    if after is not None:
+                        statement = statement.where(tuple_(Alert.created_at, Alert.id) > after)
+                    rows = db.execute(statement.order_by(Alert.created_at, Alert.id).limit(ARCHIVE_BATCH)).all()
+                    if not rows:
+                        break
+                    after = (rows[-1].created_at, rows[-1].id)
+                    rows = [row for row in rows if row.acknowledged]
+                    if rows:
+                        count = self._archive_batch(db, rows)
+                        archived += count
+                        ALERTS_ARCHIVED.inc(count)
+
+            if archived:
+                with SessionLocal() as db:
+                    record_change(db, "alert", "archive", {
+                        "id": f"archive-{cutoff.isoformat()}", "archived": archived, "before": cutoff
+                    })
+                    db.commit()
+                logger.info("Archived %d alerts created before %s", archived, cutoff.isoformat())
+        return {"archived": archived, "before": cutoff}
+
+    # ----- lifecycle -----
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if ALERT_ARCHIVE_DAYS > 0:
+                    await run_in_threadpool(self.run)
+                await run_in_threadpool(prune_minute_buckets)
+            except Exception:
+                logger.exception("Alert retention run failed")
+            await asyncio.sleep(ALERT_ARCHIVE_INTERVAL)
+
+archiver = AlertArchiver()
+
+# ----- reading -----
+
+def segments(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[ArchiveSegment]:
+    """Segments holding alerts created in [start, end), oldest first"""
+    query = db.query(ArchiveSegment).filter(ArchiveSegment.rows > 0)
+    if start is not None:
+        query = query.filter(ArchiveSegment.last_at >= start)
+    if end is not None:
+        query = query.filter(ArchiveSegment.first_at < end)
+    return query.order_by(ArchiveSegment.month).all()
+
+def _lines(path: str, length: int) -> Iterator[bytes]:
+    """The decompressed lines in the first `length` (committed) bytes of a segment"""
+    decompressor = zlib.decompressobj(wbits=31)
+    pending = b""
+    with open(path, "rb") as f:
+        while length > 0:
+            data = f.read(min(1 << 16, length))
+            if not data:
+                break
+            length -= len(data)
+            while data:
+                pending += decompressor.decompress(data)
+                *lines, pending = pending.split(b"\n")
+                yield from lines
+                data = decompressor.unused_data
+                if decompressor.eof:
+                    decompressor = zlib.decompressobj(wbits=31)
+
+def read_archive(
+    months: Dict[str, int],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    match: Optional[Callable[[dict], bool]] = None,
+    limit: Optional[int] = None
+) -> Iterator[dict]:
+    """
+    Archived alerts with start <= created_at < end from the given
+    {month: committed bytes} segments, oldest segment first
+    """
+    start_key = start.isoformat() if start else None
+    end_key = end.isoformat() if end else None
+    count = 0
+    for month, length in months.items():
+        path = segment_path(month)
+        if not os.path.exists(path):
+            logger.warning("Archive segment %s is missing", path)
+            continue
+        for line in _lines(path, length):
+            alert = orjson.loads(line)
+            created = alert["created_at"]  # ISO 8601: compares correctly as a string
+            if (start_key and created < start_key) or (end_key and created >= end_key):
+                continue
+            if match and not match(alert):
+                continue
+            yield alert
+            count += 1
+            if limit and count >= limit:
+                return
@@ -0,0 +1,184 @@
+"""
+SOC change feed - alert/case/client changes pushed to dashboards
+
+Routers call record_change() inside the transaction that changes an entity,
+so the change_events row commits (or rolls back) with it. One ChangeFeed per
+process tails that table - woken immediately by local commits, polling every
+CHANGE_POLL_INTERVAL seconds to catch other writers - and keeps the newest
+events pre-serialized in a ring buffer. SSE subscribers and `?since=` polls
+are served from the buffer, so the cost of a viewer is the events it is
+sent, not a re-read of every table.
+"""
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, func, select, delete
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import engine, SessionLocal, ChangeEvent
+from shared.metrics import Gauge
+
+CHANGE_POLL_INTERVAL = float(os.getenv("CHANGE_POLL_INTERVAL", "1.0"))
+CHANGE_BUFFER_SIZE = int(os.getenv("CHANGE_BUFFER_SIZE", "2000"))
+CHANGE_RETENTION = int(os.getenv("CHANGE_RETENTION", "100000"))  # rows kept in change_events
+CHANGE_PAGE_SIZE = 500
+PRUNE_EVERY = 600  # polls
+
+logger = logging.getLogger(__name__)
+
+def record_change(db: Session, entity: str, action: str, data: dict, previous: Optional[dict] = None):
+    """Log a change in the caller's transaction; subscribers are woken after commit"""
+    payload = jsonable_encoder(data)
+    db.add(ChangeEvent(
+        entity=entity,
+        entity_id=str(payload["id"]),
+        action=action,
+        data=json.dumps(payload, separators=(",", ":")),
+        previous=json.dumps(jsonable_encoder(previous), separators=(",", ":")) if previous else None
+    ))
+    db.info["changes_pending"] = True
+
+def changed_fields(obj, values: dict) -> dict:
+    """Old values of the attributes that `values` would change"""
+    return {key: getattr(obj, key) for key, value in values.items() if getattr(obj, key) != value}
+
+@event.listens_for(SessionLocal, "after_commit")
+def _after_commit(session):
+    if session.info.pop("changes_pending", False):
+        feed.notify()
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("changes_pending", None)
+
+def _serialize(row) -> str:
+    """One event as a JSON string; data/previous are stored as JSON already"""
+    return (f'{{"id":{row.id},"entity":{json.dumps(row.entity)},"action":{json.dumps(row.action)},'
+            f'"entity_id":{json.dumps(row.entity_id)},"data":{row.data},'
+            f'"previous":{row.previous or "null"},"at":{json.dumps(row.created_at.isoformat())}}}')
+
+class ChangeFeed:
+    def __init__(self):
+        self.cursor = 0  # newest event id seen by this process
+        self.buffer: Deque[Tuple[int, str]] = deque(maxlen=CHANGE_BUFFER_SIZE)
+        self.subscribers = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ----- database -----
+
+    def _fetch(self, after: int, limit: int) -> List[Tuple[int, str]]:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(ChangeEvent.__table__).where(ChangeEvent.id > after).order_by(ChangeEvent.id).limit(limit)
+            ).all()
+        return [(row.id, _serialize(row)) for row in rows]
+
+    def _bounds(self) -> Tuple[int, int]:
+        with engine.connect() as conn:
+            oldest, newest = conn.execute(select(func.min(ChangeEvent.id), func.max(ChangeEvent.id))).one()
+        return oldest or 0, newest or 0
+
+    def _prune(self):
+        if self.cursor > CHANGE_RETENTION:
+            # The newest event of each entity stays: it is that entity's data version
+            newest = select(func.max(ChangeEvent.id)).group_by(ChangeEvent.entity)
+            with engine.begin() as conn:
+                conn.execute(delete(ChangeEvent).where(
+                    ChangeEvent.id <= self.cursor - CHANGE_RETENTION, ChangeEvent.id.not_in(newest)
+                ))
+
+    # ----- lifecycle -----
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._changed = asyncio.Event()
+        self.cursor = (await run_in_threadpool(self._bounds))[1]
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Wake the tailer (safe from any thread)"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        polls = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), CHANGE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while True:
+                    rows = await run_in_threadpool(self._fetch, self.cursor, CHANGE_PAGE_SIZE)
+                    if not rows:
+                        break
+                    self.buffer.extend(rows)
+                    self.cursor = rows[-1][0]
+                    # Wake everyone waiting on the previous generation
+                    self._changed.set()
+                    self._changed = asyncio.Event()
+                polls += 1
+                if polls % PRUNE_EVERY == 0:
+                    await run_in_threadpool(self._prune)
+            except Exception:
+                logger.exception("Change feed poll failed")
+
+    # ----- reading -----
+
+    async def read(self, since: int, limit: int = CHANGE_PAGE_SIZE) -> Tuple[List[Tuple[int, str]], bool]:
+        """
+        Events after `since`, oldest first, and whether the caller must reset
+        (its cursor predates the retained log, so it has to reload in full)
+        """
+        if since == self.cursor:
+            return [], False
+        if self.buffer and self.buffer[0][0] - 1 <= since < self.cursor:
+            events = []
+            for entry in reversed(self.buffer):
+                if entry[0] <= since:
+                    break
+                events.append(entry)
+            events.reverse()
+            return events[:limit], False
+        # Behind the buffer (or ahead of this process's tailer): read the log
+        rows = await run_in_threadpool(self._fetch, since, limit)
+        if since and (not rows or rows[0][0] > since + 1):
+            oldest, newest = await run_in_threadpool(self._bounds)
+            # Events after `since` were pruned, or the log was recreated
+            if oldest > since + 1 or since > newest:
+                return [], True
+        return rows, False
+
+    async def wait(self, since: int, timeout: float) -> bool:
+        """Wait until there is an event after `since`; False on timeout"""
+        if self.cursor > since:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+feed = ChangeFeed()
+
+SUBSCRIBERS = Gauge("soc_change_feed_subscribers", "Open change feed streams", function=lambda: feed.subscribers)
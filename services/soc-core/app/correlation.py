@@ -0,0 +1,136 @@
+"""
+Alert deduplication and correlation at ingest
+
+Scanners re-report the same finding on every run. An incoming alert whose
+(source, alert_type, message) fingerprint matches an unacknowledged alert
+seen within ALERT_DEDUP_WINDOW seconds is folded into that row: its
+occurrence count goes up, last_seen_at moves forward and the severity is
+raised if the repeat is more severe. Once an analyst acknowledges an alert,
+the next repeat opens a new one.
+
+The open fingerprints live in a per-process index with a TTL (warmed from
+the database at startup), so the duplicate check costs a dict lookup rather
+than a query per alert. Alerts sent with a client_id and no case_id are
+linked to that client's newest open case.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import hashlib
+import os
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Alert, Case
+from shared.metrics import Counter
+
+ALERT_DEDUP_WINDOW = int(os.getenv("ALERT_DEDUP_WINDOW", "3600"))  # seconds; 0 disables folding
+ALERT_DEDUP_MAX_KEYS = int(os.getenv("ALERT_DEDUP_MAX_KEYS", "100000"))
+OPEN_CASE_STATUSES = ("open", "investigating")
+SEVERITY_RANK = {"info": 0, "warning": 1, "critical": 2}
+
+ALERTS_INGESTED = Counter("soc_alerts_ingested_total", "Alerts received, by outcome", ["outcome"])
+
+def fingerprint(source: str, alert_type: str, message: str) -> str:
+    """Stable key for "the same alert": case and whitespace are ignored"""
+    key = "\x1f".join(" ".join(part.lower().split()) for part in (source, alert_type, message))
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+class FingerprintIndex:
+    """fingerprint -> (alert id, last seen), oldest first, entries expiring after the window"""
+
+    def __init__(self, ttl: float = ALERT_DEDUP_WINDOW, max_keys: int = ALERT_DEDUP_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        self._expire()
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def put(self, key: str, alert_id: str, seen: Optional[float] = None):
+        self._entries[key] = (alert_id, time.monotonic() if seen is None else seen)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: Optional[str]):
+        if key:
+            self._entries.pop(key, None)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, (_, seen) = next(iter(self._entries.items()))
+            if seen >= cutoff:
+                break
+            del self._entries[key]
+
+    def warm(self):
+        """Load the unacknowledged alerts still inside the window"""
+        self._entries.clear()
+        if self.ttl <= 0:
+            return
+        now, clock = datetime.utcnow(), time.monotonic()
+        with SessionLocal() as db:
+            # acknowledged is filtered here, not in SQL: an equality on it would
+            # steer SQLite to ix_alerts_counts instead of the partial index
+            rows = db.execute(
+                select(Alert.fingerprint, Alert.id, Alert.last_seen_at, Alert.acknowledged)
+                .where(Alert.fingerprint.is_not(None), Alert.last_seen_at >= now - timedelta(seconds=self.ttl))
+                .order_by(Alert.last_seen_at)
+            )
+            for key, alert_id, last_seen, acknowledged in rows:
+                if not acknowledged:
+                    self.put(key, alert_id, clock - (now - last_seen).total_seconds())
+
+index = FingerprintIndex()
+
+def open_case_for(db: Session, client_id: str) -> Optional[str]:
+    """The client's newest open or investigating case, if any"""
+    return db.execute(
+        select(Case.id)
+        .where(Case.client_id == client_id, Case.status.in_(OPEN_CASE_STATUSES))
+        .order_by(Case.created_at.desc())
+        .limit(1)
+    ).scalar()
+
+def find_repeat(db: Session, key: str) -> Optional[Alert]:
+    """The open alert a new alert with this fingerprint folds into"""
+    if index.ttl <= 0:
+        return None
+    alert_id = index.get(key)
+    if alert_id is None:
+        return None
+    alert = db.get(Alert, alert_id)
+    # Acknowledged or deleted by another writer since it was indexed
+    if alert is None or alert.acknowledged or alert.fingerprint != key:
+        index.discard(key)
+        return None
+    return alert
+
+def remember(key: str, alert_id: str):
+    """Index a newly inserted alert so its repeats fold into it"""
+    index.put(key, alert_id)
+    ALERTS_INGESTED.labels("new").inc()
+
+def fold(alert: Alert, severity: str, case_id: Optional[str]) -> dict:
+    """Count a repeat on `alert`; returns the old values of the fields changed"""
+    previous = {"occurrences": alert.occurrences, "last_seen_at": alert.last_seen_at}
+    alert.occurrences += 1
+    alert.last_seen_at = datetime.utcnow()
+    if SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(alert.severity, 0):
+        previous["severity"] = alert.severity
+        alert.severity = severity
+    if case_id and not alert.case_id:
+        previous["case_id"] = alert.case_id
+        alert.case_id = case_id
+    index.put(alert.fingerprint, alert.id)
+    ALERTS_INGESTED.labels("folded").inc()
+    return previous
@@ -1,16 +1,65 @@
-from sqlalchemy import create_engine, Column, String, Text, DateTime, Boolean, Enum, ForeignKey
+from sqlalchemy import create_engine, event, text, Index, MetaData, Table, Column, Integer, Float, String, Text, DateTime, Boolean, Enum, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
+from functools import lru_cache
+import os
+import re
+import time
 import uuid
 import enum
 
-DATABASE_URL = "sqlite:///./soc.db"
+from shared.metrics import Histogram, Counter, FAST_BUCKETS
+from shared.profiling import record_span
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./soc.db")
+
+# Handlers query on the event loop thread, so a pool checkout must never wait:
+# a blocked checkout stops the loop that would return the connection.
+# Overflow connections are closed again when returned.
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, max_overflow=-1)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: long reads (streamed exports, the change feed) don't block writers
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+# Query metrics
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement execution time",
+                             ["operation", "table"], buckets=FAST_BUCKETS)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised", ["operation", "table"])
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+"?(\w+)', re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def _statement_labels(statement: str) -> tuple:
+    """(operation, table) for a statement - compiled SQL repeats, so this is cached"""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    table = _TABLE.search(statement)
+    return operation, table.group(1) if table else ""
+
+@event.listens_for(engine, "before_cursor_execute")
+def _query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _query_end(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERY_SECONDS.labels(*_statement_labels(statement)).observe(elapsed)
+    record_span("sql", statement, elapsed)
+
+@event.listens_for(engine, "handle_error")
+def _query_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+    if exception_context.statement:
+        DB_QUERY_ERRORS.labels(*_statement_labels(exception_context.statement)).inc()
+
 # Enums
 class RiskLevel(str, enum.Enum):
     low = "low"
@@ -60,7 +109,7 @@ class Case(Base):
     __tablename__ = "cases"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    client_id = Column(String, ForeignKey("clients.id"), nullable=True)
+    client_id = Column(String, ForeignKey("clients.id"), nullable=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     status = Column(String, default="open")
@@ -77,7 +126,7 @@ class Alert(Base):
     __tablename__ = "alerts"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    case_id = Column(String, ForeignKey("cases.id"), nullable=True)
+    case_id = Column(String, ForeignKey("cases.id"), nullable=True, index=True)
     source = Column(String, nullable=False)  # osint, ai-protect, voice-protect, manual
     alert_type = Column(String, nullable=False)
     message = Column(Text, nullable=False)
@@ -85,13 +134,184 @@ class Alert(Base):
     acknowledged = Column(Boolean, default=False)
     acknowledged_by = Column(String, nullable=True)
     acknowledged_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # newest-first lists
+    # Deduplication (see correlation.py): repeats fold into one row
+    fingerprint = Column(String, nullable=True)
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
     
     case = relationship("Case", back_populates="alerts")
 
+    __table_args__ = (
+        # Covers the dashboard's alert counts without touching the table rows
+        Index("ix_alerts_counts", "acknowledged", "severity", "source"),
+        # Recently seen fingerprinted alerts: the dedup index warm-up at startup
+        Index("ix_alerts_fingerprint_seen", "last_seen_at", "fingerprint", "acknowledged",
+              sqlite_where=text("fingerprint IS NOT NULL")),
+    )
+
+class ChangeEvent(Base):
+    """Append-only log of client/case/alert changes; the id is the change feed cursor"""
+    __tablename__ = "change_events"
+    __table_args__ = (
+        Index("ix_change_events_entity_id", "entity", "id"),  # per-entity data versions
+        {"sqlite_autoincrement": True}  # ids never reused after pruning
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)  # client, case, alert
+    entity_id = Column(String, nullable=False)
+    action = Column(String, nullable=False)  # insert, update, repeat, ack, close, delete
+    data = Column(Text, nullable=False)  # JSON: the entity as the list endpoints return it
+    previous = Column(Text, nullable=True)  # JSON: old values of the changed fields
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchiveSegment(Base):
+    """A month of archived alerts (see archive.py); committed with the rows' deletion"""
+    __tablename__ = "archive_segments"
+
+    month = Column(String, primary_key=True)  # YYYY-MM of created_at
+    rows = Column(Integer, nullable=False, default=0)
+    bytes = Column(Integer, nullable=False, default=0)  # committed length; anything past it is an aborted batch
+    first_at = Column(DateTime, nullable=True)
+    last_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AlertBucket(Base):
+    """
+    Alerts raised per minute/hour, severity and source, maintained by
+    triggers on alerts (see timeseries.py); archiving or deleting alerts
+    leaves the history in place
+    """
+    __tablename__ = "alert_buckets"
+    __table_args__ = {"sqlite_with_rowid": False}  # rows live in the primary key order
+
+    resolution = Column(Integer, primary_key=True)  # bucket width in seconds: 60 or 3600
+    start = Column(Integer, primary_key=True)  # epoch seconds, UTC
+    severity = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)
+    alerts = Column(Integer, nullable=False, default=0)  # new alert rows
+    occurrences = Column(Integer, nullable=False, default=0)  # sightings, repeats folded into a row included
+
+BUCKET_RESOLUTIONS = (60, 3600)
+
+def _create_bucket_triggers(conn):
+    def bump(when: str, alerts: str, occurrences: str) -> str:
+        epoch = f"CAST(strftime('%s', {when}) AS INTEGER)"
+        return " ".join(
+            f"INSERT INTO alert_buckets(resolution, start, severity, source, alerts, occurrences) "
+            f"VALUES ({r}, {epoch} / {r} * {r}, coalesce(new.severity, 'info'), new.source, {alerts}, {occurrences}) "
+            f"ON CONFLICT(resolution, start, severity, source) DO UPDATE SET "
+            f"alerts = alerts + excluded.alerts, occurrences = occurrences + excluded.occurrences;"
+            for r in BUCKET_RESOLUTIONS
+        )
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS alert_buckets_ai AFTER INSERT ON alerts "
+        "WHEN new.created_at IS NOT NULL BEGIN "
+        + bump("new.created_at", "1", "coalesce(new.occurrences, 1)") + " END"
+    ))
+    # A repeat folded into an existing alert counts when it was seen
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS alert_buckets_au AFTER UPDATE OF occurrences ON alerts "
+        "WHEN new.occurrences > old.occurrences BEGIN "
+        + bump("coalesce(new.last_seen_at, new.created_at)", "0", "new.occurrences - old.occurrences") + " END"
+    ))
+
+def _backfill_buckets(conn):
+    """Buckets for the alerts already in the table (archived ones are gone)"""
+    for r in BUCKET_RESOLUTIONS:
+        conn.execute(text(
+            f"INSERT INTO alert_buckets(resolution, start, severity, source, alerts, occurrences) "
+            f"SELECT {r}, CAST(strftime('%s', created_at) AS INTEGER) / {r} * {r} AS bucket, "
+            f"coalesce(severity, 'info') AS sev, source, count(*), sum(coalesce(occurrences, 1)) "
+            f"FROM alerts WHERE created_at IS NOT NULL GROUP BY bucket, sev, source"
+        ))
+
+# Full-text search: an external-content FTS5 table per entity over its text
+# columns (rowid = the base table's rowid), kept in sync by triggers so every
+# writer is covered. Values are bm25 column weights.
+SEARCH_INDEXES = {
+    "alerts": {"alert_type": 2.0, "message": 1.0},
+    "cases": {"title": 3.0, "description": 1.0},
+    "clients": {"name": 3.0, "code_name": 3.0, "notes": 1.0}
+}
+SEARCH_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# Query-side descriptions of the FTS tables (not part of Base, never created by create_all)
+_search_metadata = MetaData()
+SEARCH_TABLES = {
+    table: Table(f"{table}_fts", _search_metadata, Column("rowid", Integer), Column("rank", Float),
+                 *(Column(name, Text) for name in columns))
+    for table, columns in SEARCH_INDEXES.items()
+}
+
+def _create_search_index(conn, table: str, columns: dict):
+    fts = f"{table}_fts"
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": fts}).first()
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+        f"content_rowid='rowid', tokenize='{SEARCH_TOKENIZER}')"
+    ))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                      f"INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new}); END"))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                      f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); END"))
+    # Only text edits touch the index (acknowledging an alert doesn't)
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table} BEGIN "
+                      f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); "
+                      f"INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new}); END"))
+    if not exists:
+        weights = ", ".join(str(w) for w in columns.values())
+        conn.execute(text(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25({weights})')"))
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))  # index existing rows
+
+def rebuild_search_indexes():
+    """Re-index every row, e.g. after VACUUM (which may renumber rowids)"""
+    with engine.begin() as conn:
+        for table in SEARCH_INDEXES:
+            conn.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+
+def _add_missing_columns(conn) -> set:
+    """
+    ALTER TABLE ADD COLUMN for model columns an existing database predates
+    (nullable or with a server default); returns the (table, column) pairs added
+    """
+    added = set()
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table.name})"))}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+            added.add((table.name, column.name))
+    return added
+
 # Create tables
 def init_db():
+    with engine.connect() as conn:
+        had_buckets = engine.dialect.has_table(conn, AlertBucket.__tablename__)
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        if ("alerts", "last_seen_at") in _add_missing_columns(conn):
+            conn.execute(text("UPDATE alerts SET last_seen_at = created_at"))
+        _create_bucket_triggers(conn)
+        if not had_buckets:
+            _backfill_buckets(conn)
+    # create_all only indexes tables it creates; add indexes new to existing databases
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        for table, columns in SEARCH_INDEXES.items():
+            _create_search_index(conn, table, columns)
 
 # Dependency
 def get_db():
@@ -3,15 +3,28 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from database import init_db
-from routers import health, clients, cases, alerts
-from security import RateLimitMiddleware, LoggingMiddleware, verify_api_key
+from routers import health, clients, cases, alerts, archive, changes, summary, search
+from changefeed import feed
+from archive import archiver
+import correlation
+from security import RateLimitMiddleware, verify_api_key
+from shared.metrics import instrument
+from shared.security import configure_logging, RequestLoggingMiddleware
+from shared.profiling import enable_profiling
+
+configure_logging("soc-core")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     init_db()
+    correlation.index.warm()
+    await feed.start()
+    await archiver.start()
     yield
     # Shutdown
+    await archiver.stop()
+    await feed.stop()
 
 app = FastAPI(
     title="Aegis SOC Core API",
@@ -23,7 +36,6 @@ app = FastAPI(
 )
 
 # Add security middleware
-app.add_middleware(LoggingMiddleware)
 app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
@@ -34,6 +46,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-only request profiling (X-Profile: 1), inside logging and metrics
+enable_profiling(app, "/api/soc/profiles")
+
+# Request IDs and sampled JSON access logs, then metrics outermost so latency
+# includes the other middleware; serves /metrics
+app.add_middleware(RequestLoggingMiddleware)
+instrument(app)
+
 # Include routers with optional API key dependency
 app.include_router(health.router, tags=["Health"])
 app.include_router(
@@ -48,12 +68,34 @@ app.include_router(
     tags=["Cases"],
     dependencies=[Depends(verify_api_key)]
 )
+app.include_router(
+    archive.router,
+    prefix="/api/soc/alerts/archive",
+    tags=["Archive"],
+    dependencies=[Depends(verify_api_key)]
+)
 app.include_router(
     alerts.router, 
     prefix="/api/soc/alerts", 
     tags=["Alerts"],
     dependencies=[Depends(verify_api_key)]
 )
+app.include_router(
+    summary.router,
+    tags=["Summary"],
+    dependencies=[Depends(verify_api_key)]
+)
+app.include_router(
+    search.router,
+    tags=["Search"],
+    dependencies=[Depends(verify_api_key)]
+)
+app.include_router(
+    changes.router,
+    prefix="/api/soc/changes",
+    tags=["Changes"],
+    dependencies=[Depends(verify_api_key)]
+)
 
 @app.get("/")
 async def root():
@@ -66,6 +108,10 @@ async def root():
             "clients": "/api/soc/clients",
             "cases": "/api/soc/cases",
             "alerts": "/api/soc/alerts",
+            "archive": "/api/soc/alerts/archive",
+            "changes": "/api/soc/changes",
+            "summary": "/api/soc/summary",
+            "search": "/api/soc/search?q=",
             "docs": "/docs"
         }
     }
@@ -1,15 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from database import get_db, Alert, Case
+from database import get_db, Alert, Case, Client
 from schemas import AlertCreate, AlertResponse, AlertStats
+from changefeed import record_change
+from versions import data_versions, check_etag
+from routers.summary import alert_counts
+from serialization import fields_of, json_rows, stream_export
+import correlation
+import timeseries
 
 router = APIRouter()
 
+ALERT_COLUMNS = (Alert.id, Alert.case_id, Alert.source, Alert.alert_type, Alert.message, Alert.severity,
+                 Alert.acknowledged, Alert.acknowledged_by, Alert.created_at, Alert.occurrences, Alert.last_seen_at)
+ALERT_FIELDS = fields_of(ALERT_COLUMNS)
+
+def filtered(statement, severity: Optional[str], source: Optional[str], acknowledged: Optional[bool]):
+    if severity:
+        statement = statement.where(Alert.severity == severity)
+    if source:
+        statement = statement.where(Alert.source == source)
+    if acknowledged is not None:
+        statement = statement.where(Alert.acknowledged == acknowledged)
+    return statement
+
+def _alert_dict(a: Alert) -> dict:
+    return {
+        "id": a.id,
+        "case_id": a.case_id,
+        "source": a.source,
+        "alert_type": a.alert_type,
+        "message": a.message,
+        "severity": a.severity,
+        "acknowledged": a.acknowledged,
+        "acknowledged_by": a.acknowledged_by,
+        "created_at": a.created_at,
+        "occurrences": a.occurrences,
+        "last_seen_at": a.last_seen_at
+    }
+
 @router.get("/", response_model=List[AlertResponse])
 async def list_alerts(
+    request: Request,
+    response: Response,
     severity: Optional[str] = None,
     source: Optional[str] = None,
     acknowledged: Optional[bool] = None,
@@ -17,63 +54,70 @@ async def list_alerts(
     db: Session = Depends(get_db)
 ):
     """List alerts with optional filters"""
-    query = db.query(Alert)
+    not_modified = check_etag(request, response, "alerts", data_versions(db, ["alert"]))
+    if not_modified:
+        return not_modified
+    statement = filtered(select(*ALERT_COLUMNS), severity, source, acknowledged)
+    rows = db.execute(statement.order_by(Alert.created_at.desc()).limit(limit)).all()
     
-    if severity:
-        query = query.filter(Alert.severity == severity)
-    if source:
-        query = query.filter(Alert.source == source)
-    if acknowledged is not None:
-        query = query.filter(Alert.acknowledged == acknowledged)
-    
-    alerts = query.order_by(Alert.created_at.desc()).limit(limit).all()
-    
-    return [
-        {
-            "id": a.id,
-            "case_id": a.case_id,
-            "source": a.source,
-            "alert_type": a.alert_type,
-            "message": a.message,
-            "severity": a.severity,
-            "acknowledged": a.acknowledged,
-            "acknowledged_by": a.acknowledged_by,
-            "created_at": a.created_at
-        }
-        for a in alerts
-    ]
+    return json_rows(rows, ALERT_FIELDS, response.headers)
+
+@router.get("/export")
+async def export_alerts(
+    severity: Optional[str] = None,
+    source: Optional[str] = None,
+    acknowledged: Optional[bool] = None,
+    format: str = "ndjson"
+):
+    """Stream every matching alert, oldest first, as NDJSON or a JSON array"""
+    statement = filtered(select(*ALERT_COLUMNS), severity, source, acknowledged)
+    return stream_export(statement.order_by(Alert.created_at), ALERT_FIELDS, format, "alerts")
 
 @router.post("/", response_model=AlertResponse)
 async def create_alert(alert: AlertCreate, db: Session = Depends(get_db)):
-    """Create a new alert"""
+    """
+    Create a new alert, or count a repeat of an open one with the same
+    source, type and message (see correlation.py)
+    """
+    case_id = alert.case_id
     # Verify case exists if provided
-    if alert.case_id:
-        case = db.query(Case).filter(Case.id == alert.case_id).first()
+    if case_id:
+        case = db.query(Case).filter(Case.id == case_id).first()
         if not case:
             raise HTTPException(status_code=404, detail="Case not found")
+    elif alert.client_id:
+        if db.get(Client, alert.client_id) is None:
+            raise HTTPException(status_code=404, detail="Client not found")
+        case_id = correlation.open_case_for(db, alert.client_id)
+    
+    fingerprint = correlation.fingerprint(alert.source, alert.alert_type, alert.message)
+    repeat = correlation.find_repeat(db, fingerprint)
+    if repeat:
+        previous = correlation.fold(repeat, alert.severity.value, case_id)
+        result = _alert_dict(repeat)
+        record_change(db, "alert", "repeat", result, previous)
+        db.commit()
+        return result
     
+    now = datetime.utcnow()
     db_alert = Alert(
-        case_id=alert.case_id,
+        case_id=case_id,
         source=alert.source,
         alert_type=alert.alert_type,
         message=alert.message,
-        severity=alert.severity.value
+        severity=alert.severity.value,
+        fingerprint=fingerprint,
+        created_at=now,
+        last_seen_at=now
     )
     db.add(db_alert)
+    db.flush()  # fills defaults (id, occurrences) for the change event
+    result = _alert_dict(db_alert)
+    record_change(db, "alert", "insert", result)
     db.commit()
-    db.refresh(db_alert)
+    correlation.remember(fingerprint, result["id"])
     
-    return {
-        "id": db_alert.id,
-        "case_id": db_alert.case_id,
-        "source": db_alert.source,
-        "alert_type": db_alert.alert_type,
-        "message": db_alert.message,
-        "severity": db_alert.severity,
-        "acknowledged": db_alert.acknowledged,
-        "acknowledged_by": db_alert.acknowledged_by,
-        "created_at": db_alert.created_at
-    }
+    return result
 
 @router.put("/{alert_id}/acknowledge")
 async def acknowledge_alert(
@@ -86,10 +130,14 @@ async def acknowledge_alert(
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
+    previous = {"acknowledged": alert.acknowledged, "acknowledged_by": alert.acknowledged_by}
+    fingerprint = alert.fingerprint
     alert.acknowledged = True
     alert.acknowledged_by = acknowledged_by
     alert.acknowledged_at = datetime.utcnow()
+    record_change(db, "alert", "ack", _alert_dict(alert), previous)
     db.commit()
+    correlation.index.discard(fingerprint)  # the next repeat is a new alert
     
     return {"message": "Alert acknowledged", "id": alert_id}
 
@@ -100,32 +148,55 @@ async def delete_alert(alert_id: str, db: Session = Depends(get_db)):
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
+    fingerprint = alert.fingerprint
+    record_change(db, "alert", "delete", _alert_dict(alert))
     db.delete(alert)
     db.commit()
+    correlation.index.discard(fingerprint)
     
     return {"message": "Alert deleted", "id": alert_id}
 
 @router.get("/stats", response_model=AlertStats)
-async def get_alert_stats(db: Session = Depends(get_db)):
+async def get_alert_stats(request: Request, response: Response, db: Session = Depends(get_db)):
     """Get alert statistics"""
-    alerts = db.query(Alert).all()
-    
-    by_severity = {}
-    by_source = {}
-    unacknowledged = 0
-    
-    for alert in alerts:
-        by_severity[alert.severity] = by_severity.get(alert.severity, 0) + 1
-        by_source[alert.source] = by_source.get(alert.source, 0) + 1
-        if not alert.acknowledged:
-            unacknowledged += 1
-    
-    return {
-        "total": len(alerts),
-        "unacknowledged": unacknowledged,
-        "by_severity": by_severity,
-        "by_source": by_source
-    }
+    not_modified = check_etag(request, response, "alert-stats", data_versions(db, ["alert"]))
+    if not_modified:
+        return not_modified
+    return alert_counts(db)
+
+@router.get("/timeseries")
+async def get_alert_timeseries(
+    request: Request,
+    response: Response,
+    bucket: str = "1h",
+    by: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    measure: str = "alerts",
+    db: Session = Depends(get_db)
+):
+    """
+    Alerts raised per bucket in [start, end) (default: the last 24 hours),
+    optionally split by severity or source. measure=occurrences also counts
+    repeats folded into existing alerts. Long ranges come back downsampled;
+    `bucket` in the response is the width used.
+    """
+    if bucket not in timeseries.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(timeseries.BUCKETS)}")
+    if by is not None and by not in timeseries.GROUPS:
+        raise HTTPException(status_code=400, detail=f"by must be one of: {', '.join(timeseries.GROUPS)}")
+    if measure not in timeseries.MEASURES:
+        raise HTTPException(status_code=400, detail=f"measure must be one of: {', '.join(timeseries.MEASURES)}")
+    now = datetime.utcnow()
+    end = timeseries.naive_utc(end) or now
+    start = timeseries.naive_utc(start) or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    # Open-ended ranges move with the clock, so the minute is part of the tag
+    not_modified = check_etag(request, response, f"alert-timeseries-{now:%Y%m%d%H%M}", data_versions(db, ["alert"]))
+    if not_modified:
+        return not_modified
+    return timeseries.histogram(db, bucket, start, end, by, measure)
 
 @router.post("/bulk-acknowledge")
 async def bulk_acknowledge(
@@ -138,9 +209,12 @@ async def bulk_acknowledge(
     for alert_id in alert_ids:
         alert = db.query(Alert).filter(Alert.id == alert_id).first()
         if alert and not alert.acknowledged:
+            previous = {"acknowledged": False, "acknowledged_by": alert.acknowledged_by}
             alert.acknowledged = True
             alert.acknowledged_by = acknowledged_by
             alert.acknowledged_at = datetime.utcnow()
+            record_change(db, "alert", "ack", _alert_dict(alert), previous)
+            correlation.index.discard(alert.fingerprint)
             count += 1
     
     db.commit()
@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Iterator, Optional
+from datetime import datetime
+
+import orjson
+
+from database import get_db
+from archive import archiver, segments, read_archive, ALERT_ARCHIVE_DAYS
+from serialization import EXPORT_BATCH, EXPORT_FORMATS
+from timeseries import naive_utc
+
+router = APIRouter()
+
+def _chunks(alerts: Iterator[dict], fmt: str) -> Iterator[bytes]:
+    if fmt == "json":
+        yield b"["
+    batch, first = [], True
+    for alert in alerts:
+        batch.append(alert)
+        if len(batch) == EXPORT_BATCH:
+            yield _encode(batch, fmt, first)
+            batch, first = [], False
+    if batch:
+        yield _encode(batch, fmt, first)
+    if fmt == "json":
+        yield b"]"
+
+def _encode(batch: list, fmt: str, first: bool) -> bytes:
+    if fmt == "ndjson":
+        return b"".join(orjson.dumps(alert, option=orjson.OPT_APPEND_NEWLINE) for alert in batch)
+    chunk = b",".join(orjson.dumps(alert) for alert in batch)
+    return chunk if first else b"," + chunk
+
+# "" rather than "/": /api/soc/alerts/archive would otherwise match the
+# alerts router's /{alert_id} (DELETE only, so 405) before any slash redirect
+@router.get("")
+async def query_archive(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    severity: Optional[str] = None,
+    source: Optional[str] = None,
+    alert_type: Optional[str] = None,
+    case_id: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    format: str = "ndjson",
+    db: Session = Depends(get_db)
+):
+    """
+    Stream archived alerts created in [start, end), oldest first, as NDJSON
+    or a JSON array. Only the monthly segments overlapping the range are
+    read; `q` is a case-insensitive substring of the message.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    start, end = naive_utc(start), naive_utc(end)
+    months = {segment.month: segment.bytes for segment in segments(db, start, end)}
+    needle = q.lower() if q else None
+
+    def match(alert: dict) -> bool:
+        return ((not severity or alert["severity"] == severity)
+                and (not source or alert["source"] == source)
+                and (not alert_type or alert["alert_type"] == alert_type)
+                and (not case_id or alert["case_id"] == case_id)
+                and (not needle or needle in alert["message"].lower()))
+
+    return StreamingResponse(
+        _chunks(read_archive(months, start, end, match, limit), format),
+        media_type=EXPORT_FORMATS[format]
+    )
+
+@router.get("/segments")
+async def list_segments(db: Session = Depends(get_db)):
+    """Archive segments: one per month of alert creation"""
+    return [
+        {
+            "month": segment.month,
+            "rows": segment.rows,
+            "bytes": segment.bytes,
+            "first_at": segment.first_at,
+            "last_at": segment.last_at
+        }
+        for segment in segments(db)
+    ]
+
+@router.post("/run")
+async def run_archive(older_than_days: int = Query(ALERT_ARCHIVE_DAYS or 90, ge=1)):
+    """Archive acknowledged alerts older than `older_than_days` now, instead of waiting for the next run"""
+    return await run_in_threadpool(archiver.run, older_than_days)
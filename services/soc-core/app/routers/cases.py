@@ -1,48 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
-from database import get_db, Case, Client
+from database import get_db, Case, Client, Alert
 from schemas import CaseCreate, CaseUpdate, CaseResponse
+from changefeed import record_change, changed_fields
+from versions import data_versions, check_etag
+from routers.summary import case_counts
+from serialization import fields_of, json_rows, stream_export
 
 router = APIRouter()
 
+# Counted per row from the alerts.case_id index instead of loading each case's alerts
+ALERT_COUNT = select(func.count()).where(Alert.case_id == Case.id).correlate(Case).scalar_subquery()
+CASE_COLUMNS = (Case.id, Case.client_id, Case.title, Case.description, Case.status, Case.priority,
+                Case.assigned_to, Case.created_at, Case.closed_at, ALERT_COUNT.label("alert_count"))
+CASE_FIELDS = fields_of(CASE_COLUMNS)
+
+def filtered(statement, status: Optional[str], priority: Optional[str], client_id: Optional[str]):
+    if status:
+        statement = statement.where(Case.status == status)
+    if priority:
+        statement = statement.where(Case.priority == priority)
+    if client_id:
+        statement = statement.where(Case.client_id == client_id)
+    return statement
+
+def _case_dict(case: Case, alert_count: int) -> dict:
+    return {
+        "id": case.id,
+        "client_id": case.client_id,
+        "title": case.title,
+        "description": case.description,
+        "status": case.status,
+        "priority": case.priority,
+        "assigned_to": case.assigned_to,
+        "created_at": case.created_at,
+        "closed_at": case.closed_at,
+        "alert_count": alert_count
+    }
+
 @router.get("/", response_model=List[CaseResponse])
 async def list_cases(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     priority: Optional[str] = None,
     client_id: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """List all cases with optional filters"""
-    query = db.query(Case)
+    not_modified = check_etag(request, response, "cases", data_versions(db, ["case", "alert"]))
+    if not_modified:
+        return not_modified
+    statement = filtered(select(*CASE_COLUMNS), status, priority, client_id)
+    rows = db.execute(statement.order_by(Case.created_at.desc())).all()
     
-    if status:
-        query = query.filter(Case.status == status)
-    if priority:
-        query = query.filter(Case.priority == priority)
-    if client_id:
-        query = query.filter(Case.client_id == client_id)
-    
-    cases = query.order_by(Case.created_at.desc()).all()
-    
-    result = []
-    for case in cases:
-        result.append({
-            "id": case.id,
-            "client_id": case.client_id,
-            "title": case.title,
-            "description": case.description,
-            "status": case.status,
-            "priority": case.priority,
-            "assigned_to": case.assigned_to,
-            "created_at": case.created_at,
-            "closed_at": case.closed_at,
-            "alert_count": len(case.alerts)
-        })
-    
-    return result
+    return json_rows(rows, CASE_FIELDS, response.headers)
+
+@router.get("/export")
+async def export_cases(
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    client_id: Optional[str] = None,
+    format: str = "ndjson"
+):
+    """Stream every matching case, oldest first, as NDJSON or a JSON array"""
+    statement = filtered(select(*CASE_COLUMNS), status, priority, client_id)
+    return stream_export(statement.order_by(Case.created_at), CASE_FIELDS, format, "cases")
 
 @router.post("/", response_model=CaseResponse)
 async def create_case(case: CaseCreate, db: Session = Depends(get_db)):
@@ -61,17 +88,19 @@ async def create_case(case: CaseCreate, db: Session = Depends(get_db)):
         assigned_to=case.assigned_to
     )
     db.add(db_case)
+    db.flush()  # fills defaults (id, status, created_at) for the change event
+    result = _case_dict(db_case, 0)
+    record_change(db, "case", "insert", result)
     db.commit()
-    db.refresh(db_case)
     
-    return {
-        **db_case.__dict__,
-        "alert_count": 0
-    }
+    return result
 
 @router.get("/{case_id}", response_model=CaseResponse)
-async def get_case(case_id: str, db: Session = Depends(get_db)):
+async def get_case(case_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific case with alerts"""
+    not_modified = check_etag(request, response, "case", data_versions(db, ["case", "alert"]))
+    if not_modified:
+        return not_modified
     case = db.query(Case).filter(Case.id == case_id).first()
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
@@ -93,21 +122,21 @@ async def update_case(
         raise HTTPException(status_code=404, detail="Case not found")
     
     update_data = update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        if value is not None:
-            if hasattr(value, 'value'):
-                setattr(case, key, value.value)
-            else:
-                setattr(case, key, value)
+    values = {
+        key: value.value if hasattr(value, 'value') else value
+        for key, value in update_data.items() if value is not None
+    }
+    previous = changed_fields(case, values)
+    for key, value in values.items():
+        setattr(case, key, value)
     
     case.updated_at = datetime.utcnow()
+    result = _case_dict(case, len(case.alerts))
+    if previous:
+        record_change(db, "case", "update", result, previous)
     db.commit()
-    db.refresh(case)
     
-    return {
-        **case.__dict__,
-        "alert_count": len(case.alerts)
-    }
+    return result
 
 @router.post("/{case_id}/close")
 async def close_case(case_id: str, db: Session = Depends(get_db)):
@@ -116,16 +145,21 @@ async def close_case(case_id: str, db: Session = Depends(get_db)):
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     
+    previous = {"status": case.status, "closed_at": case.closed_at}
     case.status = "closed"
     case.closed_at = datetime.utcnow()
     case.updated_at = datetime.utcnow()
+    record_change(db, "case", "close", _case_dict(case, len(case.alerts)), previous)
     db.commit()
     
     return {"message": "Case closed", "id": case_id}
 
 @router.get("/{case_id}/alerts")
-async def get_case_alerts(case_id: str, db: Session = Depends(get_db)):
+async def get_case_alerts(case_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get all alerts for a case"""
+    not_modified = check_etag(request, response, "case-alerts", data_versions(db, ["case", "alert"]))
+    if not_modified:
+        return not_modified
     case = db.query(Case).filter(Case.id == case_id).first()
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
@@ -138,25 +172,22 @@ async def get_case_alerts(case_id: str, db: Session = Depends(get_db)):
             "message": alert.message,
             "severity": alert.severity,
             "acknowledged": alert.acknowledged,
-            "created_at": alert.created_at
+            "created_at": alert.created_at,
+            "occurrences": alert.occurrences,
+            "last_seen_at": alert.last_seen_at
         }
         for alert in case.alerts
     ]
 
 @router.get("/stats/overview")
-async def get_case_stats(db: Session = Depends(get_db)):
+async def get_case_stats(request: Request, response: Response, db: Session = Depends(get_db)):
     """Get case statistics"""
-    cases = db.query(Case).all()
-    
-    by_status = {}
-    by_priority = {}
-    
-    for case in cases:
-        by_status[case.status] = by_status.get(case.status, 0) + 1
-        by_priority[case.priority] = by_priority.get(case.priority, 0) + 1
-    
+    not_modified = check_etag(request, response, "case-stats", data_versions(db, ["case"]))
+    if not_modified:
+        return not_modified
+    counts = case_counts(db)
     return {
-        "total": len(cases),
-        "by_status": by_status,
-        "by_priority": by_priority
+        "total": counts["total"],
+        "by_status": counts["by_status"],
+        "by_priority": counts["by_priority"]
     }
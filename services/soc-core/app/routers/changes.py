@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Request, Header
+from fastapi.responses import Response, StreamingResponse
+from typing import Optional
+
+from changefeed import feed, CHANGE_PAGE_SIZE
+
+router = APIRouter()
+
+SSE_HEARTBEAT = 15  # seconds between keep-alive comments
+
+@router.get("/")
+async def list_changes(since: Optional[int] = None, limit: int = CHANGE_PAGE_SIZE):
+    """
+    Changes after cursor `since`, oldest first. Without `since`, only the
+    current cursor: load the data, then follow changes from that cursor.
+    `reset: true` means the cursor is too old and the client must reload.
+    """
+    if since is None:
+        return {"cursor": feed.cursor, "reset": False, "events": []}
+    events, reset = await feed.read(since, max(1, min(limit, CHANGE_PAGE_SIZE)))
+    cursor = events[-1][0] if events else (feed.cursor if reset else since)
+    # Events are stored pre-serialized; splice them instead of re-encoding
+    body = f'{{"cursor":{cursor},"reset":{"true" if reset else "false"},"events":[{",".join(e for _, e in events)}]}}'
+    return Response(body, media_type="application/json")
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Server-sent events: `change` events carrying the same JSON as GET /, with
+    the cursor as the event id so EventSource resumes via Last-Event-ID, and
+    `reset` when the client has to reload
+    """
+    cursor = feed.cursor
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    elif since is not None:
+        cursor = since
+
+    async def events():
+        nonlocal cursor
+        feed.subscribers += 1
+        try:
+            yield f"retry: 3000\nevent: hello\ndata: {{\"cursor\":{cursor}}}\n\n"
+            while not await request.is_disconnected():
+                batch, reset = await feed.read(cursor)
+                if reset:
+                    cursor = feed.cursor
+                    yield f"id: {cursor}\nevent: reset\ndata: {{\"cursor\":{cursor}}}\n\n"
+                    continue
+                if batch:
+                    cursor = batch[-1][0]
+                    yield "".join(f"id: {event_id}\nevent: change\ndata: {data}\n\n" for event_id, data in batch)
+                    continue
+                if not await feed.wait(cursor, SSE_HEARTBEAT):
+                    yield ": keep-alive\n\n"
+        finally:
+            feed.subscribers -= 1
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # nginx: flush each event
+    })
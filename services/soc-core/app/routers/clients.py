@@ -1,47 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
-from database import get_db, Client
+from database import get_db, Client, Case
 from schemas import ClientCreate, ClientUpdate, ClientResponse
+from changefeed import record_change, changed_fields
+from versions import data_versions, check_etag
+from serialization import fields_of, json_rows, stream_export
 
 router = APIRouter()
 
+# Counted per row from the cases.client_id index instead of loading each client's cases
+CASE_COUNT = select(func.count()).where(Case.client_id == Client.id).correlate(Client).scalar_subquery()
+CLIENT_COLUMNS = (Client.id, Client.name, Client.code_name, Client.email, Client.phone, Client.risk_level,
+                  Client.status, Client.notes, Client.created_at, CASE_COUNT.label("case_count"))
+CLIENT_FIELDS = fields_of(CLIENT_COLUMNS)
+
+def filtered(statement, status: Optional[str], risk_level: Optional[str]):
+    if status:
+        statement = statement.where(Client.status == status)
+    if risk_level:
+        statement = statement.where(Client.risk_level == risk_level)
+    return statement
+
+def _client_dict(client: Client, case_count: int) -> dict:
+    return {
+        "id": client.id,
+        "name": client.name,
+        "code_name": client.code_name,
+        "email": client.email,
+        "phone": client.phone,
+        "risk_level": client.risk_level,
+        "status": client.status,
+        "notes": client.notes,
+        "created_at": client.created_at,
+        "case_count": case_count
+    }
+
 @router.get("/", response_model=List[ClientResponse])
 async def list_clients(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     risk_level: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """List all clients with optional filters"""
-    query = db.query(Client)
-    
-    if status:
-        query = query.filter(Client.status == status)
-    if risk_level:
-        query = query.filter(Client.risk_level == risk_level)
-    
-    clients = query.order_by(Client.created_at.desc()).all()
-    
-    # Add case count
-    result = []
-    for client in clients:
-        client_dict = {
-            "id": client.id,
-            "name": client.name,
-            "code_name": client.code_name,
-            "email": client.email,
-            "phone": client.phone,
-            "risk_level": client.risk_level,
-            "status": client.status,
-            "notes": client.notes,
-            "created_at": client.created_at,
-            "case_count": len(client.cases)
-        }
-        result.append(client_dict)
+    not_modified = check_etag(request, response, "clients", data_versions(db, ["client", "case"]))
+    if not_modified:
+        return not_modified
+    statement = filtered(select(*CLIENT_COLUMNS), status, risk_level)
+    rows = db.execute(statement.order_by(Client.created_at.desc())).all()
     
-    return result
+    return json_rows(rows, CLIENT_FIELDS, response.headers)
+
+@router.get("/export")
+async def export_clients(status: Optional[str] = None, risk_level: Optional[str] = None, format: str = "ndjson"):
+    """Stream every matching client, oldest first, as NDJSON or a JSON array"""
+    statement = filtered(select(*CLIENT_COLUMNS), status, risk_level)
+    return stream_export(statement.order_by(Client.created_at), CLIENT_FIELDS, format, "clients")
 
 @router.post("/", response_model=ClientResponse)
 async def create_client(client: ClientCreate, db: Session = Depends(get_db)):
@@ -55,17 +74,19 @@ async def create_client(client: ClientCreate, db: Session = Depends(get_db)):
         notes=client.notes
     )
     db.add(db_client)
+    db.flush()  # fills defaults (id, status, created_at) for the change event
+    result = _client_dict(db_client, 0)
+    record_change(db, "client", "insert", result)
     db.commit()
-    db.refresh(db_client)
     
-    return {
-        **db_client.__dict__,
-        "case_count": 0
-    }
+    return result
 
 @router.get("/{client_id}", response_model=ClientResponse)
-async def get_client(client_id: str, db: Session = Depends(get_db)):
+async def get_client(client_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific client"""
+    not_modified = check_etag(request, response, "client", data_versions(db, ["client", "case"]))
+    if not_modified:
+        return not_modified
     client = db.query(Client).filter(Client.id == client_id).first()
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
@@ -87,21 +108,21 @@ async def update_client(
         raise HTTPException(status_code=404, detail="Client not found")
     
     update_data = update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        if value is not None:
-            if hasattr(value, 'value'):  # Enum
-                setattr(client, key, value.value)
-            else:
-                setattr(client, key, value)
+    values = {
+        key: value.value if hasattr(value, 'value') else value  # Enum
+        for key, value in update_data.items() if value is not None
+    }
+    previous = changed_fields(client, values)
+    for key, value in values.items():
+        setattr(client, key, value)
     
     client.updated_at = datetime.utcnow()
+    result = _client_dict(client, len(client.cases))
+    if previous:
+        record_change(db, "client", "update", result, previous)
     db.commit()
-    db.refresh(client)
     
-    return {
-        **client.__dict__,
-        "case_count": len(client.cases)
-    }
+    return result
 
 @router.delete("/{client_id}")
 async def delete_client(client_id: str, db: Session = Depends(get_db)):
@@ -110,14 +131,18 @@ async def delete_client(client_id: str, db: Session = Depends(get_db)):
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
+    record_change(db, "client", "delete", _client_dict(client, len(client.cases)))
     db.delete(client)
     db.commit()
     
     return {"message": "Client deleted", "id": client_id}
 
 @router.get("/{client_id}/cases")
-async def get_client_cases(client_id: str, db: Session = Depends(get_db)):
+async def get_client_cases(client_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get all cases for a client"""
+    not_modified = check_etag(request, response, "client-cases", data_versions(db, ["client", "case"]))
+    if not_modified:
+        return not_modified
     client = db.query(Client).filter(Client.id == client_id).first()
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select, text, literal_column, or_, and_
+from sqlalchemy.orm import Session
+from typing import Optional
+import base64
+import json
+import re
+
+import orjson
+
+from database import get_db, Client, Case, Alert, SEARCH_TABLES
+from versions import data_versions, check_etag
+from routers import alerts, cases, clients
+
+router = APIRouter()
+
+MAX_LIMIT = 100
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+# entity -> (base table, response columns, data versions the rows depend on)
+SEARCHABLE = {
+    "alerts": (Alert.__table__, alerts.ALERT_COLUMNS, ["alert"]),
+    "cases": (Case.__table__, cases.CASE_COLUMNS, ["case", "alert"]),
+    "clients": (Client.__table__, clients.CLIENT_COLUMNS, ["client", "case"])
+}
+
+def fts_query(q: str) -> str:
+    """
+    User input -> FTS5 expression: words and "quoted phrases" are all
+    required, a trailing * makes a prefix match. Everything is quoted, so
+    FTS5 operators and punctuation in the input can't cause syntax errors.
+    """
+    parts = []
+    for phrase, word in _TERM.findall(q):
+        term = phrase if phrase else word
+        prefix = not phrase and term.endswith("*")
+        term = term.rstrip("*").replace('"', '""').strip()
+        if term:
+            parts.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(parts)
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(values, list) and values and all(isinstance(v, (int, float)) for v in values):
+            return values
+    except ValueError:
+        pass
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/api/soc/search")
+async def search(
+    request: Request,
+    response: Response,
+    q: str,
+    entity: str = "alerts",
+    sort: str = "rank",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    severity: Optional[str] = None,
+    source: Optional[str] = None,
+    acknowledged: Optional[bool] = None,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    client_id: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Full-text search over alert type/message, case title/description or
+    client name/code name/notes, with the entity's list filters. sort=rank
+    orders by bm25 relevance; sort=recent by newest first and stays cheap
+    however many rows match. Pass next_cursor back as `cursor` for the next page.
+    """
+    if entity not in SEARCHABLE:
+        raise HTTPException(status_code=400, detail=f"entity must be one of: {', '.join(SEARCHABLE)}")
+    if sort not in ("rank", "recent"):
+        raise HTTPException(status_code=400, detail="sort must be rank or recent")
+    expression = fts_query(q)
+    if not expression:
+        raise HTTPException(status_code=400, detail="Empty search query")
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    table, columns, depends_on = SEARCHABLE[entity]
+    not_modified = check_etag(request, response, f"search-{entity}", data_versions(db, depends_on))
+    if not_modified:
+        return not_modified
+
+    fts = SEARCH_TABLES[table.name]
+    statement = select(*columns, fts.c.rank.label("score"), fts.c.rowid.label("search_rowid")) \
+        .select_from(fts) \
+        .join(table, literal_column(f"{table.name}.rowid") == fts.c.rowid) \
+        .where(text(f"{fts.name} MATCH :expression").bindparams(expression=expression))
+    if entity == "alerts":
+        statement = alerts.filtered(statement, severity, source, acknowledged)
+    elif entity == "cases":
+        statement = cases.filtered(statement, status, priority, client_id)
+    else:
+        statement = clients.filtered(statement, status, risk_level)
+
+    # Keyset pagination on the sort key plus rowid as a tiebreaker
+    after = _decode_cursor(cursor) if cursor else None
+    if sort == "rank":
+        if after:
+            if len(after) != 2:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            statement = statement.where(or_(fts.c.rank > after[0], and_(fts.c.rank == after[0], fts.c.rowid > after[1])))
+        statement = statement.order_by(fts.c.rank, fts.c.rowid)
+    else:
+        if after:
+            statement = statement.where(fts.c.rowid < after[-1])
+        statement = statement.order_by(fts.c.rowid.desc())
+
+    rows = db.execute(statement.limit(limit + 1)).all()
+    fields = [column.key for column in columns]
+    results = []
+    for row in rows[:limit]:
+        result = dict(zip(fields, row))
+        result["score"] = round(-row.score, 4)  # bm25 is lower-is-better; report higher-is-better
+        results.append(result)
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor([last.score, last.search_rowid] if sort == "rank" else [last.search_rowid])
+    body = {"entity": entity, "query": expression, "results": results, "next_cursor": next_cursor}
+    return Response(orjson.dumps(body), media_type="application/json", headers=response.headers)
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import get_db, Client, Case, Alert
+from versions import data_versions, check_etag
+
+router = APIRouter()
+
+def client_counts(db: Session) -> dict:
+    by_status = dict(db.query(Client.status, func.count()).group_by(Client.status).all())
+    return {"total": sum(by_status.values()), "active": by_status.get("active", 0), "by_status": by_status}
+
+def case_counts(db: Session) -> dict:
+    by_status, by_priority = {}, {}
+    for status, priority, count in db.query(Case.status, Case.priority, func.count()).group_by(Case.status, Case.priority):
+        by_status[status] = by_status.get(status, 0) + count
+        by_priority[priority] = by_priority.get(priority, 0) + count
+    return {
+        "total": sum(by_status.values()),
+        "open": by_status.get("open", 0),
+        "by_status": by_status,
+        "by_priority": by_priority
+    }
+
+def alert_counts(db: Session) -> dict:
+    """Alert totals from the (acknowledged, severity, source) covering index"""
+    by_severity, by_source = {}, {}
+    unacknowledged = critical_unacknowledged = 0
+    rows = db.query(Alert.acknowledged, Alert.severity, Alert.source, func.count()) \
+        .group_by(Alert.acknowledged, Alert.severity, Alert.source)
+    for acknowledged, severity, source, count in rows:
+        by_severity[severity] = by_severity.get(severity, 0) + count
+        by_source[source] = by_source.get(source, 0) + count
+        if not acknowledged:
+            unacknowledged += count
+            if severity == "critical":
+                critical_unacknowledged += count
+    return {
+        "total": sum(by_severity.values()),
+        "unacknowledged": unacknowledged,
+        "critical": by_severity.get("critical", 0),
+        "critical_unacknowledged": critical_unacknowledged,
+        "by_severity": by_severity,
+        "by_source": by_source
+    }
+
+@router.get("/api/soc/summary")
+async def get_summary(request: Request, response: Response, db: Session = Depends(get_db)):
+    """Client, case and alert counts for the dashboard header; 304 when nothing changed"""
+    not_modified = check_etag(request, response, "summary", data_versions(db))
+    if not_modified:
+        return not_modified
+    return {
+        "clients": client_counts(db),
+        "cases": case_counts(db),
+        "alerts": alert_counts(db)
+    }
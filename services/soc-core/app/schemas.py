@@ -97,6 +97,7 @@ class CaseResponse(BaseModel):
 # Alert Schemas
 class AlertCreate(BaseModel):
     case_id: Optional[str] = None
+    client_id: Optional[str] = None  # without case_id: link to the client's newest open case
     source: str
     alert_type: str
     message: str
@@ -112,6 +113,8 @@ class AlertResponse(BaseModel):
     acknowledged: bool
     acknowledged_by: Optional[str]
     created_at: datetime
+    occurrences: int = 1
+    last_seen_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
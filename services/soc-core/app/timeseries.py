@@ -0,0 +1,108 @@
+"""
+Alert histograms from pre-aggregated buckets
+
+Triggers on alerts keep per-minute and per-hour counts by severity and
+source in alert_buckets as rows are written (see database.py), so a chart
+reads at most a few thousand bucket rows from the primary key, however many
+alerts the range holds. Wider buckets are summed from the hour rows and
+narrower ones from the minute rows; a range that would need more than
+MAX_POINTS buckets is downsampled to the next width that fits. Minute rows
+are kept for ALERT_BUCKET_MINUTE_DAYS, hour rows indefinitely.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import os
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from database import engine, AlertBucket
+
+ALERT_BUCKET_MINUTE_DAYS = int(os.getenv("ALERT_BUCKET_MINUTE_DAYS", "7"))
+MAX_POINTS = 1000
+
+BUCKETS = {
+    "1m": 60, "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "3h": 10800, "6h": 21600, "12h": 43200,
+    "1d": 86400, "7d": 604800
+}
+GROUPS = {"severity": AlertBucket.severity, "source": AlertBucket.source}
+MEASURES = {"alerts": AlertBucket.alerts, "occurrences": AlertBucket.occurrences}
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Query parameters may carry an offset; stored timestamps are naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _epoch(value: datetime) -> int:
+    if value.tzinfo is None:  # naive timestamps are UTC, as stored
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat()
+
+def choose_bucket(bucket: str, start: int, end: int, now: int) -> str:
+    """
+    The requested bucket, widened until the range fits in MAX_POINTS, and to
+    hours once the range reaches back past the minute rows
+    """
+    names = list(BUCKETS)
+    i = names.index(bucket)
+    minutes_from = now - ALERT_BUCKET_MINUTE_DAYS * 86400
+    while i < len(names) - 1 and (
+        (end - start) / BUCKETS[names[i]] > MAX_POINTS
+        or (BUCKETS[names[i]] % 3600 and start < minutes_from)
+    ):
+        i += 1
+    return names[i]
+
+def histogram(
+    db: Session,
+    bucket: str,
+    start: datetime,
+    end: datetime,
+    by: Optional[str] = None,
+    measure: str = "alerts"
+) -> dict:
+    """Counts per bucket in [start, end), dense (empty buckets are 0), one series per group"""
+    now = _epoch(datetime.utcnow())
+    first, last = _epoch(start), _epoch(end)
+    bucket = choose_bucket(bucket, first, last, now)
+    width = BUCKETS[bucket]
+    resolution = 3600 if width % 3600 == 0 else 60
+    first = first // width * width
+    last = -(-last // width) * width  # round up: the bucket holding `end` is included
+
+    slot = (AlertBucket.start // width * width).label("slot")
+    group = GROUPS[by] if by else None
+    statement = select(slot, *([group] if group is not None else []), func.sum(MEASURES[measure])) \
+        .where(AlertBucket.resolution == resolution, AlertBucket.start >= first, AlertBucket.start < last) \
+        .group_by(slot, *([group] if group is not None else []))
+
+    count = (last - first) // width
+    series: Dict[str, List[int]] = {}
+    total = [0] * count
+    for row in db.execute(statement):
+        i = (row[0] - first) // width
+        value = int(row[-1])
+        total[i] += value
+        if group is not None:
+            series.setdefault(row[1], [0] * count)[i] += value
+    return {
+        "bucket": bucket,
+        "start": _iso(first),
+        "end": _iso(last),
+        "by": by,
+        "measure": measure,
+        "timestamps": [_iso(first + i * width) for i in range(count)],
+        "total": total,
+        "series": series
+    }
+
+def prune_minute_buckets():
+    """Drop minute rows older than ALERT_BUCKET_MINUTE_DAYS (hour rows keep the history)"""
+    cutoff = _epoch(datetime.utcnow() - timedelta(days=ALERT_BUCKET_MINUTE_DAYS))
+    with engine.begin() as conn:
+        conn.execute(delete(AlertBucket).where(AlertBucket.resolution == 60, AlertBucket.start < cutoff))
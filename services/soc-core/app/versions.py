@@ -0,0 +1,51 @@
+"""
+Data versions and conditional GET for SOC Core read endpoints
+
+Every client/case/alert change goes through record_change(), so the newest
+change_events id per entity is a version of that entity's data: one index
+seek each, without touching the data itself. ETags are built from the
+versions a response depends on and checked before the heavy query runs;
+a matching If-None-Match gets a bodyless 304.
+"""
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import ChangeEvent
+
+ENTITIES = ("client", "case", "alert")
+
+def data_versions(db: Session, entities: Iterable[str] = ENTITIES) -> Dict[str, int]:
+    """{entity: newest change id} in one statement"""
+    entities = tuple(entities)
+    row = db.execute(select(*(
+        select(func.max(ChangeEvent.id)).where(ChangeEvent.entity == entity).scalar_subquery()
+        for entity in entities
+    ))).one()
+    return {entity: version or 0 for entity, version in zip(entities, row)}
+
+def make_etag(name: str, versions: Dict[str, int]) -> str:
+    # Weak: equal data, not byte-identical serialization
+    return f'W/"{name}-' + ".".join(str(versions[e]) for e in sorted(versions)) + '"'
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+def check_etag(request: Request, response: Response, name: str, versions: Dict[str, int]) -> Optional[Response]:
+    """
+    A 304 to return at once if the client's copy is current; otherwise None,
+    with the ETag set on the response the endpoint goes on to build
+    """
+    etag = make_etag(name, versions)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # cache, but revalidate every time
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
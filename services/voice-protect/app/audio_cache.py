@@ -0,0 +1,130 @@
+"""
+Decoded-audio cache
+
+Decoding (MP3/OGG through ffmpeg, resampling) is often the most expensive
+part of analysis, watermark embedding and verification, and the same upload
+tends to go through more than one of them. The first stage to decode an
+upload writes the PCM it produces to a .npy file keyed by the upload's
+content hash while it streams, and every later stage - in any worker process
+- maps that file read-only instead of decoding again.
+
+Files are written with a fixed 128-byte .npy header whose shape is filled in
+once the stream ends, then atomically renamed into place, so readers never
+see a partial array. Total size is capped at VOICE_AUDIO_CACHE_BYTES with
+least-recently-used eviction (hits refresh the file's mtime).
+"""
+from typing import Callable, Iterator, Optional, Tuple
+import glob
+import os
+import struct
+import uuid
+
+import numpy as np
+
+CACHE_DIR = os.getenv("VOICE_AUDIO_CACHE_DIR", "/app/data/decoded")
+MAX_BYTES = int(os.getenv("VOICE_AUDIO_CACHE_BYTES", str(2 * 1024 ** 3)))
+HEADER_SIZE = 128
+MAGIC = b"\x93NUMPY\x01\x00"
+
+def _header(shape: tuple) -> bytes:
+    """A version 1.0 .npy header for float32 data, padded to exactly HEADER_SIZE bytes"""
+    body = "{'descr': '<f4', 'fortran_order': False, 'shape': %r, }" % (shape,)
+    body_len = HEADER_SIZE - len(MAGIC) - 2
+    return MAGIC + struct.pack("<H", body_len) + (body.ljust(body_len - 1) + "\n").encode("latin1")
+
+def _path(content_hash: str, tag: str) -> str:
+    return os.path.join(CACHE_DIR, f"{content_hash}.{tag}.npy")
+
+def _touch(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _evict(keep: str):
+    """Drop least-recently-used entries until the cache fits in MAX_BYTES"""
+    entries = []
+    for path in glob.glob(os.path.join(CACHE_DIR, "*.npy")):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)  # readers holding a mapping keep their pages
+            total -= size
+        except OSError:
+            pass
+
+def load(content_hash: str, tag: str) -> Optional[np.ndarray]:
+    """Zero-copy read-only view of a cached array, or None"""
+    path = _path(content_hash, tag)
+    try:
+        array = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    _touch(path)
+    return array
+
+def _write_through(blocks: Iterator[np.ndarray], content_hash: str, tag: str) -> Iterator[np.ndarray]:
+    """Yield blocks unchanged while appending them to the cache file"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    final = _path(content_hash, tag)
+    tmp = f"{final}.{uuid.uuid4().hex}.tmp"
+    rows, shape_tail = 0, ()
+    completed = False
+    with open(tmp, "wb") as f:
+        try:
+            f.write(_header((0,)))
+            for block in blocks:
+                block = np.ascontiguousarray(block, dtype="<f4")
+                shape_tail = block.shape[1:]
+                rows += len(block)
+                f.write(block.tobytes())
+                yield block
+            f.seek(0)
+            f.write(_header((rows,) + shape_tail))
+            completed = True
+        finally:
+            f.close()
+            if completed and rows:
+                os.replace(tmp, final)
+                _evict(keep=final)
+            else:
+                os.remove(tmp)
+
+def _slices(array: np.ndarray, block: int) -> Iterator[np.ndarray]:
+    for start in range(0, len(array), block):
+        yield array[start:start + block]
+
+def cached_blocks(content_hash: Optional[str], tag: str, decode: Callable[[], Iterator[np.ndarray]],
+                  block: int) -> Iterator[np.ndarray]:
+    """
+    Blocks of decoded audio for an upload: slices of the cached memmap when
+    present, otherwise decode() streamed through to the cache.
+    """
+    if not content_hash:
+        yield from decode()
+        return
+    array = load(content_hash, tag)
+    if array is not None:
+        yield from _slices(array, block)
+        return
+    yield from _write_through(decode(), content_hash, tag)
+
+def find_native(content_hash: str) -> Optional[Tuple[str, int]]:
+    """(tag, sample rate) of a cached native-rate decode of this upload, if any"""
+    for path in glob.glob(os.path.join(CACHE_DIR, f"{content_hash}.native*.npy")):
+        tag = os.path.basename(path)[len(content_hash) + 1:-len(".npy")]
+        return tag, int(tag[len("native"):])
+    return None
+
+def stats() -> dict:
+    sizes = [os.path.getsize(p) for p in glob.glob(os.path.join(CACHE_DIR, "*.npy"))]
+    return {"entries": len(sizes), "bytes": sum(sizes), "max_bytes": MAX_BYTES}
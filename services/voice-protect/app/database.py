@@ -0,0 +1,69 @@
+"""
+SQLite connection shared by the analysis store and the watermark registry
+
+One file on the data volume in WAL mode, so readers (status polls, verify
+lookups) never block the writer. All access goes through a single
+connection guarded by a lock; statements are short indexed lookups.
+"""
+from typing import Iterable, Optional
+import os
+import sqlite3
+import threading
+
+DB_PATH = os.getenv("VOICE_DB_PATH", "/app/data/voice.db")
+
+class Database:
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._schemas = []
+
+    def register_schema(self, schema: str):
+        """DDL to run (idempotently) when the connection is opened"""
+        self._schemas.append(schema)
+        if self._conn is not None:
+            self._conn.executescript(schema)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for schema in self._schemas:
+                conn.executescript(schema)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def execute(self, sql: str, args: Iterable = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self.conn.execute(sql, tuple(args))
+
+    def fetchone(self, sql: str, args: Iterable = ()) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute(sql, tuple(args)).fetchone()
+
+    def fetchall(self, sql: str, args: Iterable = ()) -> list:
+        with self._lock:
+            return self.conn.execute(sql, tuple(args)).fetchall()
+
+    def executemany(self, sql: str, rows: Iterable[tuple]):
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(sql, rows)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+# Shared by the store and the registry
+db = Database()
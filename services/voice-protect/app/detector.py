@@ -0,0 +1,243 @@
+"""
+Streaming AI-voice detection engine
+
+Audio is decoded in fixed-size blocks (soundfile, with an ffmpeg pipe as a
+fallback for formats libsndfile can't read), resampled on the fly and turned
+into frame features with one vectorized STFT per block: log-mel MFCCs,
+spectral flatness, centroid, high-band energy ratio and frame energy. Frames
+are grouped into fixed-length segments that are scored as soon as they fill
+up, so memory stays bounded no matter how long the recording is.
+
+The segment scorer is a heuristic baseline built on artefacts common to
+neural vocoders (over-smooth spectral dynamics, missing high-band detail,
+unnaturally stable flatness). It is deliberately isolated in score_segment()
+so a trained model can replace it without touching the streaming pipeline.
+"""
+from typing import Iterator, List, Optional
+import numpy as np
+import shutil
+import subprocess
+
+import librosa
+import soundfile as sf
+from scipy.fft import dct
+
+TARGET_SR = 16000
+BLOCK_SECONDS = 10
+N_FFT = 512  # 32 ms
+HOP = 160  # 10 ms
+N_MELS = 40
+N_MFCC = 20
+SEGMENT_SECONDS = 4
+HIGH_BAND_HZ = 4000
+SILENCE_DB = -50.0  # frames quieter than this are ignored
+MAX_REPORTED_SEGMENTS = 10
+EPS = 1e-10
+
+class DecodeError(Exception):
+    """Raised when an audio file cannot be decoded"""
+
+def _soundfile_blocks(path: str, sr: int, block_seconds: float) -> Iterator[np.ndarray]:
+    try:
+        f = sf.SoundFile(path)
+    except Exception as e:
+        raise DecodeError(f"Could not decode audio: {e}")
+    with f:
+        native_sr = f.samplerate
+        resampler = None
+        if native_sr != sr:
+            import soxr  # ships with librosa
+            resampler = soxr.ResampleStream(native_sr, sr, 1, dtype="float32")
+
+        for block in f.blocks(blocksize=int(native_sr * block_seconds), dtype="float32", always_2d=True):
+            mono = block.mean(axis=1)
+            yield resampler.resample_chunk(mono) if resampler else mono
+        if resampler:
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            if len(tail):
+                yield tail
+
+def _ffmpeg_blocks(path: str, sr: int, block_seconds: float) -> Iterator[np.ndarray]:
+    if not shutil.which("ffmpeg"):
+        raise DecodeError("Unsupported audio format")
+    cmd = ["ffmpeg", "-v", "error", "-i", path, "-f", "f32le", "-ac", "1", "-ar", str(sr), "-"]
+    block_bytes = int(sr * block_seconds) * 4
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        while True:
+            chunk = proc.stdout.read(block_bytes)
+            if not chunk:
+                break
+            yield np.frombuffer(chunk[:len(chunk) // 4 * 4], dtype=np.float32)
+        if proc.wait() != 0:
+            raise DecodeError(proc.stderr.read().decode(errors="replace").strip() or "ffmpeg failed")
+
+def iter_audio_blocks(path: str, sr: int = TARGET_SR, block_seconds: float = BLOCK_SECONDS) -> Iterator[np.ndarray]:
+    """Yield mono float32 blocks of the file at sr, never holding the whole file"""
+    try:
+        sf.info(path)
+    except Exception:
+        yield from _ffmpeg_blocks(path, sr, block_seconds)
+        return
+    yield from _soundfile_blocks(path, sr, block_seconds)
+
+class FeatureExtractor:
+    """
+    Incremental STFT feature extractor.
+
+    process() accepts arbitrary-length sample blocks and returns features for
+    every complete frame, carrying the partial frame over to the next call so
+    framing is identical to a single STFT over the whole signal.
+    """
+
+    FEATURES = ["energy_db", "flatness", "centroid", "high_band_ratio"] + [f"mfcc_{i}" for i in range(N_MFCC)]
+
+    def __init__(self, sr: int = TARGET_SR):
+        self.sr = sr
+        self.window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS).astype(np.float32).T
+        self.freqs = np.fft.rfftfreq(N_FFT, 1 / sr).astype(np.float32)
+        self.high_band = self.freqs >= HIGH_BAND_HZ
+        self._tail = np.zeros(0, dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Return a (frames, len(FEATURES)) array for the new complete frames"""
+        buf = np.concatenate([self._tail, samples.astype(np.float32, copy=False)])
+        if len(buf) < N_FFT:
+            self._tail = buf
+            return np.zeros((0, len(self.FEATURES)), dtype=np.float32)
+
+        n_frames = 1 + (len(buf) - N_FFT) // HOP
+        frames = np.lib.stride_tricks.sliding_window_view(buf, N_FFT)[::HOP][:n_frames]
+        self._tail = buf[n_frames * HOP:].copy()
+        return self._features(frames)
+
+    def _features(self, frames: np.ndarray) -> np.ndarray:
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2 + EPS
+        total = power.sum(axis=1)
+
+        energy_db = 10 * np.log10(total / N_FFT)
+        flatness = np.exp(np.log(power).mean(axis=1)) / power.mean(axis=1)
+        centroid = (power @ self.freqs) / total
+        high_band_ratio = power[:, self.high_band].sum(axis=1) / total
+        log_mel = np.log(power @ self.mel_basis + EPS)
+        mfcc = dct(log_mel, type=2, axis=1, norm="ortho")[:, :N_MFCC]
+
+        return np.column_stack([energy_db, flatness, centroid, high_band_ratio, mfcc]).astype(np.float32)
+
+def score_segment(features: np.ndarray) -> Optional[float]:
+    """
+    Likelihood in [0, 1] that a segment of frame features is synthetic speech.
+
+    Returns None when the segment is mostly silence.
+    """
+    voiced = features[features[:, 0] > SILENCE_DB]
+    if len(voiced) < len(features) // 4 or len(voiced) < 10:
+        return None
+
+    mfcc = voiced[:, 4:]
+    # Natural speech has rich frame-to-frame spectral movement
+    delta_var = float(np.diff(mfcc, axis=0).var(axis=0).mean())
+    return score_cues(delta_var, float(voiced[:, 1].std()), float(voiced[:, 3].mean()), float(voiced[:, 0].std()))
+
+def score_cues(delta_var: float, flatness_std: float, high_band: float, energy_std: float) -> float:
+    """Combine the segment statistics into a likelihood (shared with the rolling scorer)"""
+    # Each cue maps to roughly [-1, 1], positive = more synthetic-looking
+    cues = np.array([
+        np.tanh((4.0 - delta_var) / 4.0),
+        np.tanh((0.05 - flatness_std) / 0.05),
+        np.tanh((0.02 - high_band) / 0.02),
+        np.tanh((8.0 - energy_std) / 8.0),
+    ])
+    weights = np.array([1.5, 1.0, 1.0, 0.5])
+    return float(1 / (1 + np.exp(-(cues @ weights))))
+
+class StreamingDetector:
+    """Feeds sample blocks through feature extraction and scores each completed segment"""
+
+    def __init__(self, sr: int = TARGET_SR):
+        self.sr = sr
+        self.extractor = FeatureExtractor(sr)
+        self.frames_per_segment = SEGMENT_SECONDS * sr // HOP
+        self._pending: List[np.ndarray] = []
+        self._pending_frames = 0
+        self.segment_scores: List[Optional[float]] = []
+        self.samples_seen = 0
+        # Running sums over voiced frames for the summary
+        self._voiced_frames = 0
+        self._sums = np.zeros(len(FeatureExtractor.FEATURES), dtype=np.float64)
+
+    def feed(self, samples: np.ndarray):
+        self.samples_seen += len(samples)
+        features = self.extractor.process(samples)
+        if not len(features):
+            return
+
+        voiced = features[features[:, 0] > SILENCE_DB]
+        self._voiced_frames += len(voiced)
+        self._sums += voiced.sum(axis=0)
+
+        self._pending.append(features)
+        self._pending_frames += len(features)
+        while self._pending_frames >= self.frames_per_segment:
+            stacked = np.concatenate(self._pending)
+            self.segment_scores.append(score_segment(stacked[:self.frames_per_segment]))
+            rest = stacked[self.frames_per_segment:]
+            self._pending = [rest] if len(rest) else []
+            self._pending_frames = len(rest)
+
+    def finish(self) -> dict:
+        # Score a trailing partial segment if it is long enough to mean anything
+        if self._pending_frames >= self.frames_per_segment // 2:
+            self.segment_scores.append(score_segment(np.concatenate(self._pending)))
+        self._pending, self._pending_frames = [], 0
+        return self.summary()
+
+    def summary(self) -> dict:
+        scored = [(i, s) for i, s in enumerate(self.segment_scores) if s is not None]
+        scores = np.array([s for _, s in scored], dtype=np.float64)
+        mean_score = float(scores.mean()) if len(scores) else 0.0
+        means = self._sums / max(self._voiced_frames, 1)
+        names = FeatureExtractor.FEATURES
+
+        suspicious = sorted(scored, key=lambda item: item[1], reverse=True)[:MAX_REPORTED_SEGMENTS]
+        return {
+            "is_ai_generated": bool(len(scores) and mean_score >= 0.5),
+            "confidence": round(abs(mean_score - 0.5) * 2, 3) if len(scores) else 0.0,
+            "analysis_details": {
+                "ai_likelihood": round(mean_score, 3),
+                "duration_seconds": round(self.samples_seen / self.sr, 2),
+                "segments_scored": len(scores),
+                "segments_silent": len(self.segment_scores) - len(scores),
+                "segment_seconds": SEGMENT_SECONDS,
+                "max_segment_score": round(float(scores.max()), 3) if len(scores) else None,
+                "spectral_analysis": {
+                    "mean_flatness": round(float(means[names.index("flatness")]), 4),
+                    "mean_centroid_hz": round(float(means[names.index("centroid")]), 1),
+                    "high_band_ratio": round(float(means[names.index("high_band_ratio")]), 4),
+                },
+                "temporal_analysis": {
+                    "voiced_ratio": round(self._voiced_frames / max(self.samples_seen // HOP, 1), 3),
+                },
+                "artifact_detection": {
+                    "suspicious_segments": [
+                        {"start": i * SEGMENT_SECONDS, "end": (i + 1) * SEGMENT_SECONDS, "score": round(s, 3)}
+                        for i, s in suspicious if s >= 0.5
+                    ]
+                }
+            }
+        }
+
+def analyze_file(path: str, content_hash: Optional[str] = None) -> dict:
+    """
+    Run detection over a file block by block. CPU-bound - call off the event loop.
+
+    With a content_hash the decoded 16 kHz audio is read from (or written
+    to) the shared decoded-audio cache.
+    """
+    from audio_cache import cached_blocks
+
+    detector = StreamingDetector()
+    blocks = cached_blocks(content_hash, str(TARGET_SR), lambda: iter_audio_blocks(path), TARGET_SR * BLOCK_SECONDS)
+    for block in blocks:
+        detector.feed(block)
+    return detector.finish()
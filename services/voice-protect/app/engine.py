@@ -0,0 +1,112 @@
+"""
+Worker pool for voice analysis
+
+Detection is CPU-bound, so submissions run in a ProcessPoolExecutor whose
+workers import librosa and build the mel filterbank once at startup. The
+event loop only awaits futures; admitted work beyond the pool size waits in
+the executor queue, and past VOICE_MAX_QUEUE submissions the API answers
+503 + Retry-After instead of accepting more.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger("aegis-voice-protect")
+
+MAX_WORKERS = int(os.getenv("VOICE_WORKERS", str(os.cpu_count() or 1)))
+MAX_QUEUE_DEPTH = int(os.getenv("VOICE_MAX_QUEUE", "128"))  # queued + running analyses
+
+class EngineBusy(Exception):
+    """Raised when the pool is at its queue-depth limit"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Analysis engine busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+# ===== Worker process side =====
+
+def _init_worker():
+    # Pay for the heavy imports and filterbank once per process, not per job
+    from detector import FeatureExtractor
+    FeatureExtractor()
+
+def _ping() -> int:
+    return os.getpid()
+
+# ===== Event loop side =====
+
+class AnalysisEngine:
+    def __init__(self, max_workers: int = MAX_WORKERS, max_queue_depth: int = MAX_QUEUE_DEPTH):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_depth = max(1, max_queue_depth)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running = 0
+        self._avg_duration = 5.0  # seconds, exponentially weighted
+
+    async def start(self):
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._executor, _ping) for _ in range(self.max_workers)])
+        logger.info(f"Analysis engine started with {self.max_workers} workers")
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._tasks)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.depth / self.max_workers * self._avg_duration))
+
+    def check_capacity(self):
+        if self.depth >= self.max_queue_depth:
+            raise EngineBusy(self.retry_after())
+
+    def submit(self, task_id: str, coro) -> asyncio.Task:
+        """Admit a background coroutine that awaits run() for its CPU-bound part"""
+        self.check_capacity()
+        task = asyncio.create_task(coro)
+        self._tasks[task_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(task_id, None))
+        return task
+
+    def task(self, task_id: str) -> Optional[asyncio.Task]:
+        return self._tasks.get(task_id)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) in a worker process"""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        self._running += 1
+        try:
+            result = await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._running -= 1
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - start)
+        return result
+
+    def status(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "running": self._running,
+            "background_jobs": self.depth,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_job_seconds": round(self._avg_duration, 3)
+        }
+
+engine = AnalysisEngine()
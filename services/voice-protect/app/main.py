@@ -1,11 +1,31 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import health, analyze, watermark
+from contextlib import asynccontextmanager
+from routers import health, analyze, watermark, stream
+from engine import engine
+from database import db
+from shared.metrics import instrument
+from shared.security import configure_logging, RequestLoggingMiddleware
+from shared.profiling import enable_profiling
+
+configure_logging("voice-protect")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup - warm the worker pool, pick up interrupted submissions, load the registry
+    await engine.start()
+    await analyze.resume_unfinished()
+    watermark.load_registry()
+    yield
+    # Shutdown
+    await engine.stop()
+    db.close()
 
 app = FastAPI(
     title="Aegis Voice Protection API",
     description="AI audio detection and watermarking service",
     version="1.0.0",
+    lifespan=lifespan,
     docs_url="/api/docs",
     openapi_url="/api/openapi.json"
 )
@@ -18,9 +38,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-only request profiling (X-Profile: 1), inside logging and metrics
+enable_profiling(app, "/api/voice/profiles")
+
+# Request IDs and sampled JSON access logs, then metrics outermost so latency
+# includes the other middleware; serves /metrics
+app.add_middleware(RequestLoggingMiddleware)
+instrument(app)
+
 app.include_router(health.router)
 app.include_router(analyze.router, prefix="/api/voice", tags=["Analysis"])
 app.include_router(watermark.router, prefix="/api/voice", tags=["Watermark"])
+app.include_router(stream.router, prefix="/api/voice", tags=["Streaming"])
 
 if __name__ == "__main__":
     import uvicorn
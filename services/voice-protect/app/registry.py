@@ -0,0 +1,340 @@
+"""
+Watermark registry
+
+Every issued watermark is recorded in SQLite (ID, owner, content hash of the
+original, embed parameters, timestamps). Lookups go through two in-memory
+layers first:
+
+- a NumPy bloom filter over all registered IDs, so random or forged IDs are
+  rejected without touching disk (false-positive rate VOICE_BLOOM_ERROR_RATE)
+- an LRU of recently verified records, so repeat checks of popular IDs are
+  answered from memory
+
+The registry also keeps the packed 64-bit codewords of every ID for bulk
+correlation against uploaded clips.
+
+Worker processes share the table but each has its own filter, so a miss
+is only trusted once PRAGMA data_version shows no other connection has
+committed since the last look; otherwise rows updated since then are read
+into the filter first. The filter may answer "maybe" wrongly, never "no".
+
+New IDs are reserved (a row without an output) before anything is written
+under them, so a collision with an issued ID is redrawn instead of
+overwriting its owner's file; reservations only count as watermarks once
+register() fills them in.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import math
+import os
+import time
+import uuid
+
+import numpy as np
+
+from database import Database, db
+from watermarking import pack_codewords
+
+BLOOM_CAPACITY = int(os.getenv("VOICE_BLOOM_CAPACITY", "10000000"))
+BLOOM_ERROR_RATE = float(os.getenv("VOICE_BLOOM_ERROR_RATE", "0.001"))
+LRU_SIZE = int(os.getenv("VOICE_REGISTRY_LRU", "10000"))
+LOAD_BATCH = 100000
+SQL_IN_BATCH = 500
+REFRESH_SLACK = 5.0  # seconds: rows are stamped before they commit, so re-read a little overlap
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    watermark_id TEXT PRIMARY KEY,
+    owner TEXT,
+    content_hash TEXT,
+    original_filename TEXT,
+    output_path TEXT,
+    params TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_watermarks_owner ON watermarks (owner);
+CREATE INDEX IF NOT EXISTS ix_watermarks_content_hash ON watermarks (content_hash);
+CREATE INDEX IF NOT EXISTS ix_watermarks_updated_at ON watermarks (updated_at);
+"""
+
+class BloomFilter:
+    """Fixed-size bloom filter on a NumPy bit array with double hashing"""
+
+    def __init__(self, capacity: int = BLOOM_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, keys: Sequence[str]) -> np.ndarray:
+        digests = np.frombuffer(
+            b"".join(hashlib.blake2b(k.encode(), digest_size=16).digest() for k in keys), dtype=np.uint64
+        ).reshape(-1, 2)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return (digests[:, :1] + steps * (digests[:, 1:] | np.uint64(1))) % np.uint64(self.size)
+
+    def add_many(self, keys: Sequence[str]):
+        if not len(keys):
+            return
+        positions = self._positions(keys).ravel()
+        byte_index, bit = positions >> np.uint64(3), (positions & np.uint64(7)).astype(np.uint8)
+        # One fancy-indexed OR per bit value - duplicates write the same byte,
+        # so this is safe and far faster than np.bitwise_or.at
+        for value in range(8):
+            selected = byte_index[bit == value]
+            self.bits[selected] |= np.uint8(1 << value)
+        self.count += len(keys)
+
+    def contains_many(self, keys: Sequence[str]) -> np.ndarray:
+        if not len(keys):
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(keys)
+        bits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.contains_many([key])[0])
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+class WatermarkRegistry:
+    def __init__(self, database: Database = db):
+        self.db = database
+        self.db.register_schema(SCHEMA)
+        self.bloom = BloomFilter()
+        self._lru: "OrderedDict[str, dict]" = OrderedDict()
+        self._ids: List[str] = []
+        self._packed = np.zeros((0, 8), dtype=np.uint8)  # codewords, 64 bits per row
+        self._packed_rows = 0
+        self._data_version: Optional[int] = None
+        self._seen_until = 0.0  # rows updated before this (minus the slack) are in the filter
+        self._recent: Dict[str, Tuple[float, bool]] = {}  # id -> (updated_at, issued) inside the slack
+        self.stats = {"bloom_rejects": 0, "lru_hits": 0, "db_lookups": 0, "refreshes": 0}
+
+    @staticmethod
+    def normalize(watermark_id: str) -> str:
+        return watermark_id.strip().upper()
+
+    @staticmethod
+    def _row(row) -> dict:
+        record = dict(row)
+        record["params"] = json.loads(record["params"]) if record["params"] else {}
+        return record
+
+    def load(self):
+        """Build the bloom filter from every registered ID (called at startup)"""
+        self._data_version = self.db.fetchone("PRAGMA data_version")[0]
+        started = time.time()
+        self.bloom = BloomFilter(max(BLOOM_CAPACITY, 2 * self.count()))
+        self._ids = []
+        self._recent = {}
+        cursor = self.db.execute("SELECT watermark_id, output_path IS NOT NULL, updated_at FROM watermarks")
+        while True:
+            batch = cursor.fetchmany(LOAD_BATCH)
+            if not batch:
+                break
+            self.bloom.add_many([r[0] for r in batch])  # reservations too: reserve() must not reissue them
+            self._ids.extend(r[0] for r in batch if r[1])
+            self._recent.update((r[0], (r[2], bool(r[1]))) for r in batch if r[2] > started - REFRESH_SLACK)
+        self._seen_until = started
+        self._packed, self._packed_rows = np.zeros((0, 8), dtype=np.uint8), 0
+
+    def refresh(self) -> bool:
+        """
+        Add rows other worker processes wrote since the last look; a no-op
+        (one pragma read) unless another connection has committed. True if
+        rows were read.
+        """
+        version = self.db.fetchone("PRAGMA data_version")[0]
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        started = time.time()
+        rows = self.db.fetchall(
+            "SELECT watermark_id, output_path IS NOT NULL, updated_at FROM watermarks WHERE updated_at > ?",
+            (self._seen_until - REFRESH_SLACK,)
+        )
+        self.stats["refreshes"] += 1
+        self._seen_until = started
+        for watermark_id, issued, updated_at in rows:
+            self._note(watermark_id, updated_at, bool(issued))
+        self._recent = {k: v for k, v in self._recent.items() if v[0] > started - REFRESH_SLACK}
+        if self.bloom.full:
+            self.load()
+        return bool(rows)
+
+    def _note(self, watermark_id: str, updated_at: float, issued: bool):
+        """Add an ID to the filter (and to the candidates once issued), once"""
+        seen = self._recent.get(watermark_id)
+        if seen is None:
+            self.bloom.add_many([watermark_id])
+        if issued and not (seen and seen[1]):
+            self._ids.append(watermark_id)
+        self._recent[watermark_id] = (updated_at, issued or bool(seen and seen[1]))
+
+    def count(self) -> int:
+        return self.db.fetchone("SELECT COUNT(*) FROM watermarks")[0]
+
+    def reserve(self, owner: Optional[str] = None) -> str:
+        """
+        Claim a new watermark ID. IDs are drawn until neither the bloom filter
+        nor the table knows them; INSERT OR IGNORE makes the claim atomic, so
+        concurrent requests (or workers) never get the same ID.
+        """
+        while True:
+            watermark_id = str(uuid.uuid4())[:8].upper()
+            if watermark_id in self.bloom and self.db.fetchone(
+                "SELECT 1 FROM watermarks WHERE watermark_id = ?", (watermark_id,)
+            ):
+                continue
+            now = time.time()
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO watermarks (watermark_id, owner, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (watermark_id, owner, now, now)
+            )
+            if cursor.rowcount == 1:
+                self._note(watermark_id, now, False)
+                return watermark_id
+
+    def release(self, watermark_id: str):
+        """Give back a reservation whose embed failed"""
+        watermark_id = self.normalize(watermark_id)
+        self.db.execute("DELETE FROM watermarks WHERE watermark_id = ? AND output_path IS NULL", (watermark_id,))
+        self._lru.pop(watermark_id, None)
+
+    def register(self, watermark_id: str, owner: Optional[str], content_hash: Optional[str],
+                 original_filename: Optional[str], output_path: Optional[str], params: Optional[dict] = None,
+                 created_at: Optional[float] = None) -> dict:
+        """Record an issued watermark, filling in its reservation if it has one"""
+        now = time.time()
+        record = {
+            "watermark_id": self.normalize(watermark_id),
+            "owner": owner,
+            "content_hash": content_hash,
+            "original_filename": original_filename,
+            "output_path": output_path,
+            "params": params or {},
+            "created_at": created_at or now,
+            "updated_at": now
+        }
+        cursor = self.db.execute(
+            "INSERT INTO watermarks (watermark_id, owner, content_hash, original_filename, output_path, params, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (watermark_id) DO UPDATE SET owner = excluded.owner, content_hash = excluded.content_hash, "
+            "original_filename = excluded.original_filename, output_path = excluded.output_path, "
+            "params = excluded.params, updated_at = excluded.updated_at WHERE watermarks.output_path IS NULL",
+            (record["watermark_id"], owner, content_hash, original_filename, output_path,
+             json.dumps(record["params"]), record["created_at"], now)
+        )
+        if cursor.rowcount != 1:
+            raise ValueError(f"Watermark {record['watermark_id']} is already registered")
+        self._lru.pop(record["watermark_id"], None)
+        self._note(record["watermark_id"], now, True)
+        if self.bloom.full:
+            self.load()
+        return record
+
+    def register_many(self, records: Sequence[dict]):
+        """Bulk insert (backfills, imports) in one transaction"""
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR IGNORE INTO watermarks (watermark_id, owner, content_hash, original_filename, output_path, "
+            "params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((self.normalize(r["watermark_id"]), r.get("owner"), r.get("content_hash"), r.get("original_filename"),
+              r.get("output_path"), json.dumps(r.get("params") or {}), r.get("created_at") or now, now)
+             for r in records)
+        )
+        self.load()
+
+    def _remember(self, record: dict):
+        self._lru[record["watermark_id"]] = record
+        self._lru.move_to_end(record["watermark_id"])
+        if len(self._lru) > LRU_SIZE:
+            self._lru.popitem(last=False)
+
+    def lookup(self, watermark_id: str) -> Optional[dict]:
+        watermark_id = self.normalize(watermark_id)
+        record = self._lru.get(watermark_id)
+        if record:
+            self._lru.move_to_end(watermark_id)
+            self.stats["lru_hits"] += 1
+            return record
+        if watermark_id not in self.bloom and not (self.refresh() and watermark_id in self.bloom):
+            self.stats["bloom_rejects"] += 1
+            return None
+
+        self.stats["db_lookups"] += 1
+        row = self.db.fetchone(
+            "SELECT * FROM watermarks WHERE watermark_id = ? AND output_path IS NOT NULL", (watermark_id,)
+        )
+        if not row:
+            return None  # bloom false positive or a reservation
+        record = self._row(row)
+        self._remember(record)
+        return record
+
+    def lookup_many(self, watermark_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Batch verify: bloom filter in one vectorized pass, one IN query per 500 survivors"""
+        ids = list(dict.fromkeys(self.normalize(w) for w in watermark_ids))
+        results: Dict[str, Optional[dict]] = {w: None for w in ids}
+        hits = self.bloom.contains_many(ids)
+        if not hits.all() and self.refresh():
+            hits = self.bloom.contains_many(ids)
+        maybe = [w for w, hit in zip(ids, hits) if hit]
+        self.stats["bloom_rejects"] += len(ids) - len(maybe)
+
+        missing = []
+        for watermark_id in maybe:
+            record = self._lru.get(watermark_id)
+            if record:
+                self.stats["lru_hits"] += 1
+                results[watermark_id] = record
+            else:
+                missing.append(watermark_id)
+
+        for i in range(0, len(missing), SQL_IN_BATCH):
+            batch = missing[i:i + SQL_IN_BATCH]
+            self.stats["db_lookups"] += len(batch)
+            rows = self.db.fetchall(
+                f"SELECT * FROM watermarks WHERE watermark_id IN ({','.join('?' * len(batch))}) "
+                "AND output_path IS NOT NULL", batch
+            )
+            for row in rows:
+                record = self._row(row)
+                self._remember(record)
+                results[record["watermark_id"]] = record
+        return results
+
+    def by_owner(self, owner: str, limit: int = 100) -> List[dict]:
+        rows = self.db.fetchall(
+            "SELECT * FROM watermarks WHERE owner = ? ORDER BY created_at DESC LIMIT ?", (owner, limit)
+        )
+        return [self._row(r) for r in rows]
+
+    def candidates(self) -> tuple:
+        """(ids, packed codewords) for every registered watermark, for bulk correlation"""
+        self.refresh()
+        if self._packed_rows < len(self._ids):
+            new = pack_codewords(self._ids[self._packed_rows:])
+            self._packed = np.concatenate([self._packed, new])
+            self._packed_rows = len(self._ids)
+        return self._ids[:self._packed_rows], self._packed
+
+    def status(self) -> dict:
+        return {
+            "registered": len(self._ids),
+            "bloom_bits": self.bloom.size,
+            "bloom_hashes": self.bloom.hashes,
+            "lru_entries": len(self._lru),
+            **self.stats
+        }
+
+# Shared by all routers
+registry = WatermarkRegistry()
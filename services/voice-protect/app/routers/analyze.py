@@ -1,10 +1,36 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+# Voice Protection Routers
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+import aiofiles
+import asyncio
+import hashlib
+import json
+import logging
+import time
 import uuid
 import os
+import zipfile
+from detector import analyze_file, DecodeError
+from engine import engine, EngineBusy
+from store import store, AnalysisStatus
+import audio_cache
 
 router = APIRouter()
+logger = logging.getLogger("aegis-voice-protect")
+
+UPLOAD_DIR = os.getenv("VOICE_UPLOAD_DIR", "/app/data/uploads")
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# Files extracted and waiting or running at once - bounds temp disk and memory
+BATCH_IN_FLIGHT = int(os.getenv("VOICE_BATCH_IN_FLIGHT", str(2 * engine.max_workers)))
+BATCH_MAX_MEMBER_BYTES = int(os.getenv("VOICE_BATCH_MAX_MEMBER_BYTES", str(512 * 1024 * 1024)))
+# Sync requests for audio another worker process is analysing follow its record
+SYNC_POLL_INTERVAL = 0.5  # seconds
+SYNC_WAIT_TIMEOUT = float(os.getenv("VOICE_SYNC_WAIT_TIMEOUT", "300"))  # then answer 202 instead
+AUDIO_EXTENSIONS = {"wav", "mp3", "ogg", "flac", "m4a", "aac", "opus", "webm", "aiff", "aif"}
 
 class AnalysisResult(BaseModel):
     audio_id: str
@@ -12,49 +38,284 @@ class AnalysisResult(BaseModel):
     confidence: float
     model_detected: Optional[str] = None
     analysis_details: dict
+    cached: bool = False
+
+async def save_upload(audio: UploadFile, audio_id: str) -> Tuple[str, str]:
+    """Stream an upload to disk in chunks, hashing it on the way"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_path = f"{UPLOAD_DIR}/{audio_id}_{os.path.basename(audio.filename or 'audio')}"
+    digest = hashlib.sha256()
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await audio.read(CHUNK_SIZE):
+            digest.update(chunk)
+            await f.write(chunk)
+    return digest.hexdigest(), file_path
+
+async def process_analysis(audio_id: str, file_path: str, content_hash: Optional[str] = None) -> Optional[Exception]:
+    """Analyse one submission in the worker pool and persist the outcome"""
+    store.set_status(audio_id, AnalysisStatus.PROCESSING)
+    try:
+        result = await engine.run(analyze_file, file_path, content_hash)
+    except DecodeError as e:
+        store.fail(audio_id, str(e))
+        return e
+    except Exception as e:
+        logger.exception(f"Analysis {audio_id} failed")
+        store.fail(audio_id, str(e) or type(e).__name__)
+        return e
+    store.complete(audio_id, result)
+    return None
+
+async def resume_unfinished():
+    """Re-queue submissions interrupted by a restart (called at startup)"""
+    for record in store.unfinished():
+        audio_id = record["audio_id"]
+        if not record["input_path"] or not os.path.exists(record["input_path"]):
+            store.fail(audio_id, "Upload lost before analysis finished")
+            continue
+        try:
+            engine.submit(audio_id, process_analysis(audio_id, record["input_path"], record["content_hash"]))
+        except EngineBusy:
+            store.fail(audio_id, "Interrupted by a restart, please resubmit")
+
+def _result(record: dict, cached: bool = False) -> AnalysisResult:
+    return AnalysisResult(audio_id=record["audio_id"], model_detected=None, cached=cached, **record["result"])
+
+def _accepted(audio_id: str, status: str) -> JSONResponse:
+    return JSONResponse(status_code=202, content={
+        "audio_id": audio_id,
+        "status": status,
+        "status_url": f"/api/voice/analysis/{audio_id}"
+    })
+
+async def _wait(audio_id: str) -> AnalysisResult:
+    """Wait for a submission to finish, then answer from the store"""
+    task = engine.task(audio_id)
+    if task:
+        error = await asyncio.shield(task)
+        if isinstance(error, DecodeError):
+            raise HTTPException(status_code=400, detail=str(error))
+        record = store.get(audio_id)
+    else:
+        # Running in another worker process (or already finished): poll its record
+        deadline = time.monotonic() + SYNC_WAIT_TIMEOUT
+        record = store.get(audio_id)
+        while record["status"] in (AnalysisStatus.QUEUED, AnalysisStatus.PROCESSING) \
+                and time.monotonic() < deadline:
+            await asyncio.sleep(SYNC_POLL_INTERVAL)
+            record = store.get(audio_id)
+    if record["status"] == AnalysisStatus.FAILED:
+        raise HTTPException(status_code=500, detail=record["error"] or "Analysis failed")
+    if record["status"] != AnalysisStatus.COMPLETED:
+        return _accepted(audio_id, record["status"])
+    return _result(record)
 
-@router.post("/analyze", response_model=AnalysisResult)
-async def analyze_audio(audio: UploadFile = File(...)):
+@router.post("/analyze", response_model=AnalysisResult, responses={202: {"description": "Queued (mode=async)"}})
+async def analyze_audio(
+    audio: UploadFile = File(...),
+    mode: str = Query("sync", pattern="^(sync|async)$", description="async returns 202 with an audio_id to poll")
+):
     """Analyze audio file to detect AI-generated content"""
-    
+
     # Validate file type
     allowed_types = ["audio/wav", "audio/mpeg", "audio/mp3", "audio/ogg", "audio/flac"]
     if audio.content_type not in allowed_types:
         raise HTTPException(
-            status_code=400, 
+            status_code=400,
             detail=f"Invalid file type. Allowed: {', '.join(allowed_types)}"
         )
-    
-    # Save uploaded file
+
+    try:
+        engine.check_capacity()
+    except EngineBusy as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis engine at capacity, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
     audio_id = str(uuid.uuid4())
-    upload_dir = "/app/data/uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = f"{upload_dir}/{audio_id}_{audio.filename}"
-    
-    with open(file_path, "wb") as f:
-        content = await audio.read()
-        f.write(content)
-    
-    # TODO: Integrate actual AI detection models
-    # Placeholder response
-    return AnalysisResult(
-        audio_id=audio_id,
-        is_ai_generated=False,
-        confidence=0.0,
-        model_detected=None,
-        analysis_details={
-            "spectral_analysis": "pending",
-            "temporal_analysis": "pending",
-            "artifact_detection": "pending"
-        }
-    )
+    content_hash, file_path = await save_upload(audio, audio_id)
+
+    # Identical audio already analysed (or being analysed) - reuse it
+    existing = store.find_by_hash(content_hash)
+    if existing:
+        os.remove(file_path)
+        if existing["status"] == AnalysisStatus.COMPLETED:
+            return _result(existing, cached=True)
+        if mode == "async":
+            return _accepted(existing["audio_id"], existing["status"])
+        return await _wait(existing["audio_id"])
+
+    store.create(audio_id, content_hash, audio.filename, file_path)
+    engine.submit(audio_id, process_analysis(audio_id, file_path, content_hash))
+
+    # Long files shouldn't hold the request open - poll /analysis/{audio_id}
+    if mode == "async":
+        return _accepted(audio_id, AnalysisStatus.QUEUED)
+    return await _wait(audio_id)
+
+def _is_zip(upload: UploadFile) -> bool:
+    return upload.content_type in ("application/zip", "application/x-zip-compressed") or \
+        (upload.filename or "").lower().endswith(".zip")
+
+def _batch_members(uploads: List[UploadFile]) -> Iterator[Tuple[str, Optional[int], callable]]:
+    """(name, size, opener) for every audio file in the uploads, zips read member by member"""
+    for upload in uploads:
+        if not _is_zip(upload):
+            upload.file.seek(0)
+            yield upload.filename or "audio", None, lambda f=upload.file: f
+            continue
+        try:
+            archive = zipfile.ZipFile(upload.file)
+        except zipfile.BadZipFile:
+            yield upload.filename or "archive.zip", None, None
+            continue
+        with archive:
+            for member in archive.infolist():
+                ext = member.filename.rsplit(".", 1)[-1].lower() if "." in member.filename else ""
+                if member.is_dir() or ext not in AUDIO_EXTENSIONS or "__MACOSX" in member.filename:
+                    continue
+                yield member.filename, member.file_size, lambda m=member: archive.open(m)
+
+def _spool_member(src: BinaryIO, name: str, audio_id: str) -> Tuple[str, str]:
+    """Copy one batch member to a temp upload file in chunks, hashing it on the way"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_path = f"{UPLOAD_DIR}/{audio_id}_{os.path.basename(name)}"
+    digest = hashlib.sha256()
+    written = 0
+    with open(file_path, "wb") as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            written += len(chunk)
+            if written > BATCH_MAX_MEMBER_BYTES:
+                dst.close()
+                os.remove(file_path)
+                raise ValueError(f"File exceeds {BATCH_MAX_MEMBER_BYTES // (1024 * 1024)} MiB limit")
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest(), file_path
+
+def _batch_line(name: str, record: Optional[dict] = None, cached: bool = False, error: Optional[str] = None) -> dict:
+    line = {"type": "result", "filename": name}
+    if record:
+        line.update(audio_id=record["audio_id"], status=record["status"], cached=cached)
+        if record["result"]:
+            line.update(
+                is_ai_generated=record["result"]["is_ai_generated"],
+                confidence=record["result"]["confidence"],
+                ai_likelihood=record["result"]["analysis_details"]["ai_likelihood"],
+                duration_seconds=record["result"]["analysis_details"]["duration_seconds"]
+            )
+        error = error or record["error"]
+    else:
+        line["status"] = AnalysisStatus.FAILED
+    if error:
+        line["error"] = error
+    return line
+
+async def _analyze_member(name: str, audio_id: str, content_hash: str, file_path: str) -> dict:
+    """Analyse one extracted batch member (or reuse a stored verdict) and drop its temp file"""
+    try:
+        existing = store.find_by_hash(content_hash)
+        if existing and existing["status"] == AnalysisStatus.COMPLETED:
+            return _batch_line(name, existing, cached=True)
+        store.create(audio_id, content_hash, name, file_path)
+        await process_analysis(audio_id, file_path, content_hash)
+        return _batch_line(name, store.get(audio_id))
+    finally:
+        os.remove(file_path)
+
+async def _batch_results(uploads: List[UploadFile]):
+    """NDJSON lines as files finish, with at most BATCH_IN_FLIGHT extracted at once"""
+    started = time.monotonic()
+    summary = {"type": "summary", "files": 0, "completed": 0, "failed": 0, "cached": 0, "ai_generated": 0}
+    likelihoods = []
+    pending = set()
+
+    def emit(line: dict) -> str:
+        summary["files"] += 1
+        if line["status"] == AnalysisStatus.COMPLETED:
+            summary["completed"] += 1
+            summary["cached"] += line["cached"]
+            summary["ai_generated"] += line["is_ai_generated"]
+            likelihoods.append(line["ai_likelihood"])
+        else:
+            summary["failed"] += 1
+        return json.dumps(line) + "\n"
+
+    async def drain(until: int):
+        nonlocal pending
+        lines = []
+        while len(pending) > until:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            lines += [emit(task.result()) for task in done]
+        return lines
+
+    members = _batch_members(uploads)
+    while True:
+        member = await run_in_threadpool(next, members, None)
+        if member is None:
+            break
+        name, size, opener = member
+        if opener is None:
+            yield emit(_batch_line(name, error="Not a valid zip archive"))
+            continue
+        if size is not None and size > BATCH_MAX_MEMBER_BYTES:
+            yield emit(_batch_line(name, error=f"File exceeds {BATCH_MAX_MEMBER_BYTES // (1024 * 1024)} MiB limit"))
+            continue
+
+        # Wait for a slot before extracting, so temp files on disk stay bounded
+        for line in await drain(BATCH_IN_FLIGHT - 1):
+            yield line
+        audio_id = str(uuid.uuid4())
+        try:
+            with opener() as src:
+                content_hash, file_path = await run_in_threadpool(_spool_member, src, name, audio_id)
+        except Exception as e:
+            yield emit(_batch_line(name, error=str(e) or type(e).__name__))
+            continue
+        pending.add(asyncio.create_task(_analyze_member(name, audio_id, content_hash, file_path)))
+
+    for line in await drain(0):
+        yield line
+
+    summary["mean_ai_likelihood"] = round(sum(likelihoods) / len(likelihoods), 3) if likelihoods else None
+    summary["seconds"] = round(time.monotonic() - started, 2)
+    yield json.dumps(summary) + "\n"
+
+@router.post("/analyze/batch")
+async def analyze_batch(files: List[UploadFile] = File(..., description="Audio files and/or zip archives")):
+    """
+    Screen many recordings in one request. Streams one NDJSON line per file
+    as its verdict is ready, then a summary line.
+    """
+    return StreamingResponse(_batch_results(files), media_type="application/x-ndjson")
 
 @router.get("/analysis/{audio_id}")
 async def get_analysis(audio_id: str):
     """Get analysis results for a previously submitted audio"""
-    # Placeholder - would retrieve from database
-    return {
+    record = store.get(audio_id)
+    if not record:
+        return {
+            "audio_id": audio_id,
+            "status": "not_found",
+            "message": "Analysis not found or expired"
+        }
+
+    response = {
         "audio_id": audio_id,
-        "status": "not_found",
-        "message": "Analysis not found or expired"
+        "status": record["status"],
+        "filename": record["filename"],
+        "created_at": record["created_at"],
+        "completed_at": record["completed_at"]
     }
+    if record["result"]:
+        response.update(_result(record).model_dump(exclude={"audio_id", "cached"}))
+    if record["error"]:
+        response["error"] = record["error"]
+    return response
+
+@router.get("/engine")
+async def get_engine_status():
+    """Worker pool, result store and decoded-audio cache status"""
+    return {**engine.status(), "analyses": store.counts(), "audio_cache": audio_cache.stats()}
@@ -0,0 +1,91 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
+import json
+import time
+import numpy as np
+from streaming import RollingDetector
+
+router = APIRouter()
+
+MAX_FRAME_BYTES = 64 * 1024  # ~2 s of 16 kHz int16 - live clients send 20-100 ms
+ALERT_THRESHOLD = 0.5
+
+@router.websocket("/stream")
+async def stream_audio(
+    websocket: WebSocket,
+    sample_rate: int = Query(16000),
+    window: float = Query(4.0, description="Rolling window in seconds"),
+    emit_every: float = Query(0.5, description="Seconds of audio between score messages")
+):
+    """
+    Live voice-clone screening.
+
+    Send binary messages of little-endian int16 mono PCM at sample_rate; the
+    server answers with {"type": "score"} messages carrying the rolling AI
+    likelihood over the last `window` seconds. Send {"type": "end"} (text)
+    to receive a {"type": "summary"} and close.
+    """
+    if not (8000 <= sample_rate <= 48000 and 1 <= window <= 30 and 0.01 <= emit_every <= 10):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    detector = RollingDetector(sample_rate, window)
+    # Emit schedule counted in samples so float drift never skips a beat
+    emit_samples = max(1, int(emit_every * sample_rate))
+    next_emit = emit_samples
+    scores = []
+    alerts = 0
+    max_processing_ms = 0.0
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            data = message.get("bytes")
+            if data is not None:
+                if len(data) > MAX_FRAME_BYTES or len(data) % 2:
+                    await websocket.send_json({"type": "error", "detail": "Frames must be int16 PCM up to 64 KiB"})
+                    continue
+                # Constant work per frame (ring-buffer update), so it runs inline
+                start = time.perf_counter()
+                detector.push(np.frombuffer(data, dtype="<i2"))
+                due = detector.samples_seen >= next_emit
+                score = detector.score() if due else None
+                processing_ms = (time.perf_counter() - start) * 1000
+                max_processing_ms = max(max_processing_ms, processing_ms)
+
+                if due:
+                    while next_emit <= detector.samples_seen:
+                        next_emit += emit_samples
+                    if score is not None:
+                        scores.append(score)
+                        alerts += score >= ALERT_THRESHOLD
+                    await websocket.send_json({
+                        "type": "score",
+                        "t": round(detector.seconds, 3),
+                        "ai_likelihood": round(score, 3) if score is not None else None,
+                        "window_seconds": window,
+                        "processing_ms": round(processing_ms, 3)
+                    })
+                continue
+
+            try:
+                command = json.loads(message.get("text") or "{}")
+            except ValueError:
+                command = {}
+            if command.get("type") == "end":
+                await websocket.send_json({
+                    "type": "summary",
+                    "duration_seconds": round(detector.seconds, 2),
+                    "scores": len(scores),
+                    "mean_ai_likelihood": round(sum(scores) / len(scores), 3) if scores else None,
+                    "max_ai_likelihood": round(max(scores), 3) if scores else None,
+                    "alerts": alerts,
+                    "max_processing_ms": round(max_processing_ms, 3)
+                })
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime, timezone
 import uuid
 import os
+from detector import DecodeError
+from engine import engine
+from registry import registry
+from routers.analyze import save_upload
+from watermarking import embed_file, detect_file, STRENGTH, CHIP_RATE, CHIPS_PER_BIT
 
 router = APIRouter()
 
+UPLOAD_DIR = os.getenv("VOICE_UPLOAD_DIR", "/app/data/uploads")
+OUTPUT_DIR = os.getenv("VOICE_OUTPUT_DIR", "/app/data/outputs")
+
 class WatermarkResult(BaseModel):
     watermark_id: str
     original_filename: str
@@ -18,10 +27,52 @@ class VerifyResult(BaseModel):
     owner: Optional[str] = None
     timestamp: Optional[str] = None
 
+class BatchVerifyRequest(BaseModel):
+    watermark_ids: List[str] = Field(..., max_length=10000)
+
+class DetectResult(BaseModel):
+    detected: bool
+    watermark_id: Optional[str] = None
+    owner: Optional[str] = None
+    score: float
+    method: str
+    duration_seconds: float
+    coverage: float
+
+def _verify_result(watermark_id: str, record: Optional[dict]) -> VerifyResult:
+    if not record:
+        return VerifyResult(watermark_id=watermark_id, is_valid=False)
+    return VerifyResult(
+        watermark_id=record["watermark_id"],
+        is_valid=True,
+        owner=record["owner"],
+        timestamp=datetime.fromtimestamp(record["created_at"], timezone.utc).isoformat()
+    )
+
+def load_registry():
+    """Load the bloom filter, registering outputs issued before the registry existed (called at startup)"""
+    registry.load()
+    if registry.count() or not os.path.isdir(OUTPUT_DIR):
+        return
+    suffix = "_watermarked.wav"
+    legacy = [
+        {"watermark_id": name[:-len(suffix)], "output_path": os.path.join(OUTPUT_DIR, name),
+         "created_at": os.path.getmtime(os.path.join(OUTPUT_DIR, name))}
+        for name in os.listdir(OUTPUT_DIR) if name.endswith(suffix)
+    ]
+    if legacy:
+        registry.register_many(legacy)
+
+def _discard(watermark_id: str, output_path: str):
+    """Drop the partial output of a failed embed and give its ID back"""
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    registry.release(watermark_id)
+
 @router.post("/watermark", response_model=WatermarkResult)
 async def add_watermark(
     audio: UploadFile = File(...),
-    owner: Optional[str] = None
+    owner: Optional[str] = Form(None)
 ):
     """Add invisible watermark to audio file for ownership verification"""
     
@@ -33,26 +84,39 @@ async def add_watermark(
             detail=f"Invalid file type. Allowed: {', '.join(allowed_types)}"
         )
     
-    # Generate watermark ID
-    watermark_id = str(uuid.uuid4())[:8].upper()
+    # Reserve an ID no other watermark has, before writing anything under it
+    watermark_id = registry.reserve(owner)
+    output_path = f"{OUTPUT_DIR}/{watermark_id}_watermarked.wav"
     
-    # Save uploaded file
-    upload_dir = "/app/data/uploads"
-    output_dir = "/app/data/outputs"
-    os.makedirs(upload_dir, exist_ok=True)
-    os.makedirs(output_dir, exist_ok=True)
+    try:
+        # Save uploaded file
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        content_hash, file_path = await save_upload(audio, watermark_id)
+        
+        # Spread-spectrum embed, block by block in the worker pool
+        embedded = await engine.run(embed_file, file_path, output_path, watermark_id, content_hash)
+    except DecodeError as e:
+        _discard(watermark_id, output_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        _discard(watermark_id, output_path)
+        raise
     
-    file_path = f"{upload_dir}/{watermark_id}_{audio.filename}"
-    output_path = f"{output_dir}/{watermark_id}_watermarked.wav"
-    
-    with open(file_path, "wb") as f:
-        content = await audio.read()
-        f.write(content)
-    
-    # TODO: Integrate actual watermarking (librosa, pydub)
-    # For now, just copy the file
-    import shutil
-    shutil.copy(file_path, output_path)
+    registry.register(
+        watermark_id,
+        owner=owner,
+        content_hash=content_hash,
+        original_filename=audio.filename,
+        output_path=output_path,
+        params={
+            "scheme": "spread-spectrum",
+            "strength": STRENGTH,
+            "chip_rate": CHIP_RATE,
+            "chips_per_bit": CHIPS_PER_BIT,
+            "sample_rate": embedded["sample_rate"],
+            "duration_seconds": embedded["duration_seconds"]
+        }
+    )
     
     return WatermarkResult(
         watermark_id=watermark_id,
@@ -64,29 +128,45 @@ async def add_watermark(
 @router.get("/verify/{watermark_id}", response_model=VerifyResult)
 async def verify_watermark(watermark_id: str):
     """Verify if a watermark exists and retrieve ownership info"""
-    
-    # TODO: Lookup in database
-    output_path = f"/app/data/outputs/{watermark_id}_watermarked.wav"
-    
-    if os.path.exists(output_path):
-        return VerifyResult(
-            watermark_id=watermark_id,
-            is_valid=True,
-            owner="Unknown",
-            timestamp="2026-01-10"
-        )
-    
-    return VerifyResult(
-        watermark_id=watermark_id,
-        is_valid=False
-    )
+    # Bloom filter rejects unknown IDs in memory; hits come from the LRU or one indexed read
+    return _verify_result(watermark_id, registry.lookup(watermark_id))
+
+@router.post("/verify/batch", response_model=List[VerifyResult])
+async def verify_watermarks(request: BatchVerifyRequest):
+    """Verify many watermark IDs in one request"""
+    records = registry.lookup_many(request.watermark_ids)
+    return [_verify_result(w, records.get(registry.normalize(w))) for w in request.watermark_ids]
+
+@router.get("/registry")
+async def get_registry_status():
+    """Registry size and bloom filter / LRU hit counters"""
+    return registry.status()
+
+@router.post("/verify", response_model=DetectResult)
+async def detect_watermark(audio: UploadFile = File(...)):
+    """Recover the watermark ID embedded in an uploaded clip (16 s or longer)"""
+    clip_id = f"verify-{uuid.uuid4()}"
+    content_hash, file_path = await save_upload(audio, clip_id)
+    candidates, packed = registry.candidates()
+    try:
+        result = await engine.run(detect_file, file_path, candidates, packed, content_hash)
+    except DecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(file_path)
+
+    # A blindly decoded ID must also be one we issued
+    record = registry.lookup(result["watermark_id"]) if result["watermark_id"] else None
+    if result["detected"] and not record:
+        result.update(detected=False, watermark_id=None)
+    return DetectResult(**result, owner=record["owner"] if record else None)
 
 @router.get("/download/{watermark_id}")
 async def download_watermarked(watermark_id: str):
     """Download watermarked audio file"""
     from fastapi.responses import FileResponse
     
-    output_path = f"/app/data/outputs/{watermark_id}_watermarked.wav"
+    output_path = f"{OUTPUT_DIR}/{watermark_id}_watermarked.wav"
     
     if not os.path.exists(output_path):
         raise HTTPException(status_code=404, detail="File not found")
@@ -0,0 +1,98 @@
+"""
+Persistent store for voice analysis results
+
+Every submission is kept in SQLite keyed by audio_id and indexed by the
+SHA-256 of the audio, which lets identical uploads reuse an earlier verdict
+instead of being analysed again.
+"""
+from typing import List, Optional
+import json
+import sqlite3
+import time
+
+from database import Database, db
+
+class AnalysisStatus:
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    audio_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    filename TEXT,
+    input_path TEXT,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    completed_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_analyses_hash_status ON analyses (content_hash, status);
+CREATE INDEX IF NOT EXISTS ix_analyses_status ON analyses (status);
+"""
+
+class AnalysisStore:
+    def __init__(self, database: Database = db):
+        self.db = database
+        self.db.register_schema(SCHEMA)
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[dict]:
+        if row is None:
+            return None
+        record = dict(row)
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+    def create(self, audio_id: str, content_hash: str, filename: Optional[str], input_path: Optional[str],
+               status: str = AnalysisStatus.QUEUED):
+        self.db.execute(
+            "INSERT INTO analyses (audio_id, content_hash, filename, input_path, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (audio_id, content_hash, filename, input_path, status, time.time())
+        )
+
+    def get(self, audio_id: str) -> Optional[dict]:
+        return self._row(self.db.fetchone("SELECT * FROM analyses WHERE audio_id = ?", (audio_id,)))
+
+    def find_by_hash(self, content_hash: str) -> Optional[dict]:
+        """Latest completed or still-running analysis of identical audio"""
+        row = self.db.fetchone(
+            "SELECT * FROM analyses WHERE content_hash = ? AND status != ? "
+            "ORDER BY status = ? DESC, created_at DESC LIMIT 1",
+            (content_hash, AnalysisStatus.FAILED, AnalysisStatus.COMPLETED)
+        )
+        return self._row(row)
+
+    def set_status(self, audio_id: str, status: str):
+        self.db.execute("UPDATE analyses SET status = ? WHERE audio_id = ?", (status, audio_id))
+
+    def complete(self, audio_id: str, result: dict):
+        self.db.execute(
+            "UPDATE analyses SET status = ?, result = ?, error = NULL, completed_at = ? WHERE audio_id = ?",
+            (AnalysisStatus.COMPLETED, json.dumps(result), time.time(), audio_id)
+        )
+
+    def fail(self, audio_id: str, error: str):
+        self.db.execute(
+            "UPDATE analyses SET status = ?, error = ?, completed_at = ? WHERE audio_id = ?",
+            (AnalysisStatus.FAILED, error, time.time(), audio_id)
+        )
+
+    def unfinished(self) -> List[dict]:
+        """Submissions left queued or processing by a previous run"""
+        rows = self.db.fetchall(
+            "SELECT * FROM analyses WHERE status IN (?, ?) ORDER BY created_at",
+            (AnalysisStatus.QUEUED, AnalysisStatus.PROCESSING)
+        )
+        return [self._row(r) for r in rows]
+
+    def counts(self) -> dict:
+        rows = self.db.fetchall("SELECT status, COUNT(*) AS n FROM analyses GROUP BY status")
+        return {r["status"]: r["n"] for r in rows}
+
+# Shared by all routers
+store = AnalysisStore()
@@ -0,0 +1,122 @@
+"""
+Rolling voice-clone scoring for live audio
+
+PCM arrives in small frames (typically 20 ms). Each frame is resampled and
+pushed through the incremental FeatureExtractor, and the resulting 10 ms
+feature rows go into fixed-size ring buffers covering the last few seconds.
+The statistics the segment scorer needs (voiced-frame means and variances,
+MFCC delta variance) are kept as running sums that are updated as rows enter
+and leave the window, so the cost per frame is constant no matter how long
+the window is or how long the call lasts.
+"""
+from typing import Optional
+import numpy as np
+
+from detector import (FeatureExtractor, HOP, N_MFCC, SILENCE_DB, TARGET_SR, score_cues)
+
+WINDOW_SECONDS = 4.0
+RESYNC_WINDOWS = 16  # recompute running sums from the rings every N windows to cancel drift
+
+# Columns of FeatureExtractor.FEATURES used by the scorer
+ENERGY, FLATNESS, HIGH_BAND = 0, 1, 3
+STAT_COLUMNS = [ENERGY, FLATNESS, HIGH_BAND]
+MFCC_START = 4
+
+class RollingDetector:
+    def __init__(self, sample_rate: int = TARGET_SR, window_seconds: float = WINDOW_SECONDS):
+        self.sample_rate = sample_rate
+        self.window = max(10, int(window_seconds * TARGET_SR / HOP))  # feature rows
+        self.extractor = FeatureExtractor(TARGET_SR)
+        self._resampler = None
+        if sample_rate != TARGET_SR:
+            import soxr  # ships with librosa
+            self._resampler = soxr.ResampleStream(sample_rate, TARGET_SR, 1, dtype="float32")
+
+        # Ring buffers, one slot per feature row
+        self._stats = np.zeros((self.window, len(STAT_COLUMNS)), dtype=np.float64)
+        self._voiced = np.zeros(self.window, dtype=bool)
+        self._diffs = np.zeros((self.window, N_MFCC), dtype=np.float64)
+        self._has_diff = np.zeros(self.window, dtype=bool)
+        self._head = 0
+        self.frames = 0
+        self.samples_seen = 0
+        self._last_mfcc: Optional[np.ndarray] = None
+
+        # Running sums over the voiced rows currently in the window
+        self._n = 0
+        self._sum = np.zeros(len(STAT_COLUMNS))
+        self._sumsq = np.zeros(len(STAT_COLUMNS))
+        self._n_diff = 0
+        self._diff_sum = np.zeros(N_MFCC)
+        self._diff_sumsq = np.zeros(N_MFCC)
+
+    @property
+    def seconds(self) -> float:
+        """Audio received so far, in seconds"""
+        return self.samples_seen / self.sample_rate
+
+    def push(self, pcm: np.ndarray) -> int:
+        """Add int16 or float PCM samples; returns the number of feature rows added"""
+        self.samples_seen += len(pcm)
+        samples = pcm.astype(np.float32) / 32768.0 if pcm.dtype == np.int16 else pcm.astype(np.float32, copy=False)
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+        rows = self.extractor.process(samples)
+        for row in rows:
+            self._push_row(row)
+        return len(rows)
+
+    def _push_row(self, row: np.ndarray):
+        i = self._head
+        if self.frames >= self.window:
+            # Evict the oldest row's contribution
+            if self._voiced[i]:
+                self._n -= 1
+                self._sum -= self._stats[i]
+                self._sumsq -= self._stats[i] ** 2
+            if self._has_diff[i]:
+                self._n_diff -= 1
+                self._diff_sum -= self._diffs[i]
+                self._diff_sumsq -= self._diffs[i] ** 2
+
+        voiced = bool(row[ENERGY] > SILENCE_DB)
+        self._stats[i] = row[STAT_COLUMNS]
+        self._voiced[i] = voiced
+        self._has_diff[i] = False
+        if voiced:
+            self._n += 1
+            self._sum += self._stats[i]
+            self._sumsq += self._stats[i] ** 2
+            mfcc = row[MFCC_START:].astype(np.float64)
+            if self._last_mfcc is not None:
+                self._diffs[i] = mfcc - self._last_mfcc
+                self._has_diff[i] = True
+                self._n_diff += 1
+                self._diff_sum += self._diffs[i]
+                self._diff_sumsq += self._diffs[i] ** 2
+            self._last_mfcc = mfcc
+
+        self._head = (i + 1) % self.window
+        self.frames += 1
+        if self.frames % (self.window * RESYNC_WINDOWS) == 0:
+            self._resync()
+
+    def _resync(self):
+        voiced, has_diff = self._voiced, self._has_diff
+        self._n = int(voiced.sum())
+        self._sum = self._stats[voiced].sum(axis=0)
+        self._sumsq = (self._stats[voiced] ** 2).sum(axis=0)
+        self._n_diff = int(has_diff.sum())
+        self._diff_sum = self._diffs[has_diff].sum(axis=0)
+        self._diff_sumsq = (self._diffs[has_diff] ** 2).sum(axis=0)
+
+    def score(self) -> Optional[float]:
+        """AI likelihood over the current window, or None if it is mostly silence"""
+        in_window = min(self.frames, self.window)
+        if self._n < in_window // 4 or self._n < 10 or self._n_diff < 2:
+            return None
+        mean = self._sum / self._n
+        std = np.sqrt(np.maximum(self._sumsq / self._n - mean ** 2, 0.0))
+        diff_mean = self._diff_sum / self._n_diff
+        delta_var = float(np.maximum(self._diff_sumsq / self._n_diff - diff_mean ** 2, 0.0).mean())
+        return score_cues(delta_var, float(std[1]), float(mean[2]), float(std[0]))
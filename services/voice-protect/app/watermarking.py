@@ -0,0 +1,301 @@
+"""
+Spread-spectrum audio watermarking
+
+A watermark ID (8 hex chars = 32 bits) is expanded to a 64-bit codeword:
+the ID bits followed by 32 keyed parity bits (HMAC of the ID). Each codeword
+bit occupies one 0.25 s frame in which a keyed +/-1 pseudo-noise chip
+sequence (4,000 chips/s, so it survives resampling to 16 kHz) is added to
+the audio, sign-modulated by the bit and scaled to a small fraction of the
+frame's own RMS. The codeword repeats for the whole recording, so any clip of
+at least one period (16 s) carries the full ID.
+
+Embedding runs block by block at the file's native rate. Detection decodes
+at 16 kHz, correlates every sample position against the chip template with
+an FFT per block and folds the correlations into one codeword period, so
+longer clips simply accumulate more evidence in a fixed-size buffer. From the
+folded correlations it recovers frame alignment, then either decodes the ID
+blindly (parity check over every cyclic shift) or scores all candidate IDs
+at once with a single matrix product.
+"""
+from typing import Iterator, Optional, Sequence, Tuple
+import hashlib
+import hmac
+import os
+
+import numpy as np
+import soundfile as sf
+from scipy.fft import irfft, next_fast_len, rfft
+from scipy.ndimage import uniform_filter1d
+
+from detector import iter_audio_blocks, DecodeError
+import audio_cache
+
+WATERMARK_KEY = os.getenv("VOICE_WATERMARK_KEY", "aegis-voice-watermark").encode()
+STRENGTH = float(os.getenv("VOICE_WATERMARK_STRENGTH", "0.05"))  # watermark RMS / host RMS
+
+ID_BITS = 32
+PARITY_BITS = 32
+CODE_BITS = ID_BITS + PARITY_BITS
+CHIP_RATE = 4000  # chips per second
+CHIPS_PER_BIT = 1000  # 0.25 s per codeword bit
+DETECT_SR = 16000
+SAMPLES_PER_CHIP = DETECT_SR // CHIP_RATE
+FRAME = CHIPS_PER_BIT * SAMPLES_PER_CHIP  # samples per bit at DETECT_SR
+PERIOD = CODE_BITS * FRAME  # one full codeword at DETECT_SR (16 s)
+PERIOD_SECONDS = PERIOD / DETECT_SR
+FOLD_CHUNK = PERIOD  # correlation block size
+LEVEL_WINDOW = FRAME // 4  # samples in the loudness envelope used to level the host
+WHITEN_BINS = 64  # spectral envelope smoothing width for whitening
+MIN_RMS = 1e-4  # watermark floor in near-silent frames
+BLOCK_SECONDS = 10
+
+# A random codeword scores ~N(0, 1/64); 0.8 is 6.4 sigma, about one false
+# match per thousand clips even against 100k IDs x 128 shifts
+MATCH_MIN_SCORE = 0.8
+MATCH_CHUNK = 65536  # candidates unpacked per matrix product
+
+def _pn_sequence() -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(WATERMARK_KEY + b":pn").digest()[:8], "big")
+    return np.random.default_rng(seed).choice(np.array([-1.0, 1.0], dtype=np.float32), CHIPS_PER_BIT)
+
+PN = _pn_sequence()
+
+def _parity(id_bits: int) -> int:
+    mac = hmac.new(WATERMARK_KEY, id_bits.to_bytes(4, "big"), hashlib.sha256).digest()
+    return int.from_bytes(mac[:4], "big")
+
+def _id_value(watermark_id: str) -> int:
+    try:
+        value = int(watermark_id, 16)
+    except ValueError:
+        raise ValueError(f"Watermark ID must be {ID_BITS // 4} hex characters")
+    if len(watermark_id) != ID_BITS // 4:
+        raise ValueError(f"Watermark ID must be {ID_BITS // 4} hex characters")
+    return value
+
+def codeword(watermark_id: str) -> np.ndarray:
+    """64 bits as +/-1: the ID followed by its keyed parity"""
+    value = _id_value(watermark_id)
+    word = (value << PARITY_BITS) | _parity(value)
+    bits = (word >> np.arange(CODE_BITS - 1, -1, -1, dtype=np.uint64)) & 1
+    return np.where(bits == 1, 1.0, -1.0).astype(np.float32)
+
+def codeword_matrix(watermark_ids: Sequence[str]) -> np.ndarray:
+    """(len(ids), 64) matrix of +/-1 codewords for bulk matching"""
+    values = np.array([_id_value(w) for w in watermark_ids], dtype=np.uint64)
+    parity = np.array([_parity(int(v)) for v in values], dtype=np.uint64)
+    words = np.stack([values, parity], axis=1).astype(">u4").view(np.uint8)
+    bits = np.unpackbits(words, axis=1)
+    return np.where(bits == 1, 1.0, -1.0).astype(np.float32)
+
+def pack_codewords(watermark_ids: Sequence[str]) -> np.ndarray:
+    """(len(ids), 8) uint8 - codewords packed one bit each, 8 bytes per ID"""
+    return np.packbits(codeword_matrix(watermark_ids) > 0, axis=1)
+
+def _bits_to_id(bits: np.ndarray) -> Optional[str]:
+    """Hard-decision ID from 64 bits if its parity checks out"""
+    word = int("".join("1" if b else "0" for b in bits), 2)
+    value, parity = word >> PARITY_BITS, word & 0xFFFFFFFF
+    if _parity(value) != parity:
+        return None
+    return f"{value:08X}"
+
+# ===== Embedding =====
+
+def _watermark_signal(start: int, n: int, sr: int, bits: np.ndarray, frame_rms: np.ndarray,
+                      frame_ids: np.ndarray) -> np.ndarray:
+    chip = (np.arange(start, start + n, dtype=np.int64) * CHIP_RATE) // sr
+    signs = bits[(chip // CHIPS_PER_BIT) % CODE_BITS]
+    return PN[chip % CHIPS_PER_BIT] * signs * (STRENGTH * frame_rms[frame_ids])
+
+FFMPEG_SR = 44100  # rate used for formats libsndfile can't read
+
+def _native_blocks(path: str, content_hash: Optional[str] = None) -> Tuple[int, Iterator[np.ndarray]]:
+    """Sample rate and samples[n, channels] blocks at the file's own rate"""
+    cached = audio_cache.find_native(content_hash) if content_hash else None
+    if cached:
+        tag, sr = cached
+        array = audio_cache.load(content_hash, tag)
+        if array is not None:
+            return sr, (array[i:i + sr * BLOCK_SECONDS] for i in range(0, len(array), sr * BLOCK_SECONDS))
+
+    try:
+        info = sf.info(path)
+    except Exception:
+        info = None
+    if info is not None and info.format == "WAV":
+        # Uncompressed - reading it again is as cheap as reading a cache entry
+        def read():
+            with sf.SoundFile(path) as f:
+                yield from f.blocks(blocksize=int(info.samplerate * BLOCK_SECONDS), dtype="float32", always_2d=True)
+        return info.samplerate, read()
+
+    if info is not None:
+        sr = info.samplerate
+
+        def decode():
+            with sf.SoundFile(path) as f:
+                yield from f.blocks(blocksize=int(sr * BLOCK_SECONDS), dtype="float32", always_2d=True)
+    else:
+        # Formats libsndfile can't read are decoded through ffmpeg (mono)
+        sr = FFMPEG_SR
+
+        def decode():
+            for block in iter_audio_blocks(path, sr=sr, block_seconds=BLOCK_SECONDS):
+                yield block[:, None]
+    return sr, audio_cache.cached_blocks(content_hash, f"native{sr}", decode, sr * BLOCK_SECONDS)
+
+def embed_file(input_path: str, output_path: str, watermark_id: str, content_hash: Optional[str] = None) -> dict:
+    """Write input_path to output_path (WAV) with watermark_id embedded. CPU-bound"""
+    bits = codeword(watermark_id)
+    out = None
+    position = 0
+    sr, blocks = _native_blocks(input_path, content_hash)
+    try:
+        for block in blocks:
+            if out is None:
+                out = sf.SoundFile(output_path, "w", samplerate=sr, channels=block.shape[1], subtype="PCM_16",
+                                   format="WAV")
+            n = len(block)
+            # Scale to each bit frame's loudness so quiet passages get a quieter mark
+            frame_of = (np.arange(position, position + n, dtype=np.int64) * CHIP_RATE // sr) // CHIPS_PER_BIT
+            frame_ids = frame_of - frame_of[0]
+            energy = np.bincount(frame_ids, weights=np.square(block.mean(axis=1), dtype=np.float64))
+            counts = np.bincount(frame_ids)
+            frame_rms = np.maximum(np.sqrt(energy / np.maximum(counts, 1)), MIN_RMS).astype(np.float32)
+
+            mark = _watermark_signal(position, n, sr, bits, frame_rms, frame_ids)
+            out.write(np.clip(block + mark[:, None], -1.0, 1.0))
+            position += n
+    finally:
+        if out is not None:
+            out.close()
+    if out is None:
+        raise DecodeError("Audio file is empty")
+    return {"watermark_id": watermark_id, "duration_seconds": round(position / sr, 2), "sample_rate": sr}
+
+# ===== Detection =====
+
+class WatermarkDetector:
+    """Accumulates chip correlations over one codeword period, block by block"""
+
+    def __init__(self):
+        self.template = np.repeat(PN, SAMPLES_PER_CHIP)
+        self._template_fft = {}
+        self.folded = np.zeros(PERIOD, dtype=np.float64)
+        self.coverage = np.zeros(PERIOD, dtype=np.int32)
+        self._buf = np.zeros(0, dtype=np.float32)
+        self._position = 0  # absolute index of the next correlation output
+        self.samples_seen = 0
+
+    def feed(self, samples: np.ndarray):
+        if not len(samples):
+            return
+        self.samples_seen += len(samples)
+        self._buf = np.concatenate([self._buf, samples.astype(np.float32, copy=False)])
+        if len(self._buf) >= FOLD_CHUNK + FRAME - 1:
+            self._correlate()
+
+    def _correlate(self):
+        """Whitened correlation of every full-frame position in the buffer"""
+        if len(self._buf) < FRAME:
+            return
+        n_fft = next_fast_len(len(self._buf))
+        if n_fft not in self._template_fft:
+            self._template_fft[n_fft] = np.conj(rfft(self.template, n_fft))
+        # The mark follows the host's loudness; levelling the host first gives
+        # loud and quiet frames equal say in the bit decisions
+        level = np.sqrt(uniform_filter1d(np.square(self._buf), LEVEL_WINDOW)) + MIN_RMS
+        spectrum = rfft(self._buf / level, n_fft)
+        # Dividing by the smoothed spectral envelope stops voiced harmonics
+        # from swamping the flat-spectrum chips
+        envelope = uniform_filter1d(np.abs(spectrum), WHITEN_BINS) + 1e-9
+        corr = irfft(spectrum / envelope * self._template_fft[n_fft], n_fft)[:len(self._buf) - FRAME + 1]
+        self._fold(corr)
+        self._buf = self._buf[len(corr):]
+
+    def _fold(self, corr: np.ndarray):
+        index, offset = self._position % PERIOD, 0
+        while offset < len(corr):
+            take = min(PERIOD - index, len(corr) - offset)
+            self.folded[index:index + take] += corr[offset:offset + take]
+            self.coverage[index:index + take] += 1
+            offset += take
+            index = 0
+        self._position += len(corr)
+
+    def soft_bits(self) -> np.ndarray:
+        """Per-bit correlation sums at the best frame alignment (codeword shift unknown)"""
+        self._correlate()
+        frames = self.folded.reshape(CODE_BITS, FRAME)
+        alignment = int(np.argmax(np.square(frames).sum(axis=0)))
+        return frames[:, alignment].astype(np.float32)
+
+    def _shifts(self, soft: np.ndarray) -> np.ndarray:
+        """(64, 128) matrix of every cyclic shift of soft, in both polarities"""
+        # Soft-limit so a few loud frames can't dominate: a random codeword
+        # still scores with variance exactly 1/64 whatever the magnitudes
+        scale = float(np.median(np.abs(soft))) or 1.0
+        soft = np.tanh(soft / scale)
+        index = (np.arange(CODE_BITS)[:, None] + np.arange(CODE_BITS)[None, :]) % CODE_BITS
+        shifted = soft[index]
+        norm = float(np.linalg.norm(soft)) * np.sqrt(CODE_BITS)
+        shifted = shifted / norm if norm else shifted
+        return np.concatenate([shifted, -shifted], axis=1)
+
+    def decode(self) -> dict:
+        """
+        Blind decode: the ID whose parity checks out under some cyclic shift.
+
+        32 parity bits over 128 shift/polarity tries put the false-positive
+        rate around 3e-8, so a passing parity check is the detection.
+        """
+        shifts = self._shifts(self.soft_bits())
+        for column in range(shifts.shape[1]):
+            watermark_id = _bits_to_id(shifts[:, column] > 0)
+            if watermark_id:
+                score = float(np.abs(shifts[:, column]).sum())
+                return {"watermark_id": watermark_id, "score": round(score, 4), "detected": True}
+        return {"watermark_id": None, "score": 0.0, "detected": False}
+
+    def match(self, candidates: Sequence[str], packed: Optional[np.ndarray] = None) -> dict:
+        """Score every candidate at once: (K, 64) codewords @ (64, 128) shifts, in chunks"""
+        if not len(candidates):
+            return {"watermark_id": None, "score": 0.0, "detected": False}
+        if packed is None:
+            packed = pack_codewords(candidates)
+        shifts = self._shifts(self.soft_bits())
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for i in range(0, len(candidates), MATCH_CHUNK):
+            codewords = np.unpackbits(packed[i:i + MATCH_CHUNK], axis=1).astype(np.float32) * 2 - 1
+            scores[i:i + MATCH_CHUNK] = (codewords @ shifts).max(axis=1)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        detected = score >= MATCH_MIN_SCORE
+        return {"watermark_id": candidates[best] if detected else None, "score": round(score, 4), "detected": detected}
+
+    @property
+    def coverage_ratio(self) -> float:
+        """Fraction of the codeword period seen at least once"""
+        return float((self.coverage > 0).mean())
+
+def detect_file(path: str, candidates: Sequence[str] = (), packed: Optional[np.ndarray] = None,
+                content_hash: Optional[str] = None) -> dict:
+    """Recover a watermark from a clip, blind first and then against candidates. CPU-bound"""
+    detector = WatermarkDetector()
+    # Same 16 kHz decode as analysis, so the two share cache entries
+    blocks = audio_cache.cached_blocks(
+        content_hash, str(DETECT_SR), lambda: iter_audio_blocks(path, sr=DETECT_SR, block_seconds=BLOCK_SECONDS),
+        DETECT_SR * BLOCK_SECONDS
+    )
+    for block in blocks:
+        detector.feed(block)
+
+    result = detector.decode()
+    result["method"] = "blind"
+    if not result["detected"] and len(candidates):
+        result = detector.match(candidates, packed)
+        result["method"] = "candidates"
+    result["duration_seconds"] = round(detector.samples_seen / DETECT_SR, 2)
+    result["coverage"] = round(detector.coverage_ratio, 3)
+    return result
@@ -0,0 +1,219 @@
+"""
+Aegis Profiling - opt-in per-request profiles for slow endpoint diagnosis
+
+A request is profiled when an admin sends `X-Profile: 1` (with an admin key
+in X-API-Key) or when it falls into PROFILE_SAMPLE_RATE. A profile holds:
+
+- cProfile statistics for the event loop thread while the request was in
+  flight (other requests sharing the loop at that moment show up too)
+- wall-clock and loop-thread CPU time
+- spans: SQL statements and outbound HTTP calls with their start offsets and
+  durations, collected through a context variable so they belong to this
+  request only
+
+Profiles are written to PROFILE_DIR as JSON plus a .prof file (loadable by
+pstats/snakeviz), keeping the newest PROFILE_MAX_FILES, and are listed and
+downloaded through the admin-only router mounted by enable_profiling().
+"""
+from contextvars import ContextVar
+from typing import List, Optional
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/aegis-profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ADMIN_KEYS = set(filter(None, os.getenv("PROFILE_ADMIN_KEYS", "aegis-admin-key").split(",")))
+TOP_FUNCTIONS = 40
+MAX_SPANS = 2000
+MAX_SQL_CHARS = 500
+
+class _Profile:
+    __slots__ = ("id", "start", "spans", "dropped")
+
+    def __init__(self):
+        self.id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        self.start = time.perf_counter()
+        self.spans: List[dict] = []
+        self.dropped = 0
+
+_current: ContextVar[Optional[_Profile]] = ContextVar("aegis_profile", default=None)
+_profiler_lock = threading.Lock()  # one cProfile at a time per process
+
+def record_span(kind: str, detail: str, seconds: float):
+    """Attach a timed operation to the request being profiled, if any (cheap no-op otherwise)"""
+    profile = _current.get()
+    if profile is None:
+        return
+    if len(profile.spans) >= MAX_SPANS:
+        profile.dropped += 1
+        return
+    end = time.perf_counter() - profile.start
+    profile.spans.append({
+        "kind": kind,
+        "detail": detail[:MAX_SQL_CHARS],
+        "start_ms": round((end - seconds) * 1000, 3),
+        "duration_ms": round(seconds * 1000, 3)
+    })
+
+# httpx event hooks: httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) records outbound calls
+async def _on_request(request):
+    if _current.get() is not None:
+        request.extensions["aegis_profile_start"] = time.perf_counter()
+
+async def _on_response(response):
+    start = response.request.extensions.get("aegis_profile_start")
+    if start is not None:
+        # Time to response headers; the body is read after the hook runs
+        url = response.request.url.copy_with(query=None)
+        record_span("http", f"{response.request.method} {url} {response.status_code}", time.perf_counter() - start)
+
+HTTP_EVENT_HOOKS = {"request": [_on_request], "response": [_on_response]}
+
+def _is_admin(headers) -> bool:
+    return headers.get("x-api-key") in PROFILE_ADMIN_KEYS
+
+def _top_functions(profiler: cProfile.Profile) -> List[dict]:
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return [{
+        "function": f"{func} ({os.path.basename(filename)}:{line})",
+        "calls": nc,
+        "self_ms": round(tt * 1000, 3),
+        "cumulative_ms": round(ct * 1000, 3)
+    } for (filename, line, func), (cc, nc, tt, ct, callers) in rows]
+
+def _save(document: dict, profiler: Optional[cProfile.Profile]):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, document["id"])
+    if profiler is not None:
+        profiler.dump_stats(base + ".prof")
+    with open(base + ".json", "w") as f:
+        json.dump(document, f, indent=1)
+    # Ring buffer: drop the oldest profiles (ids sort by time)
+    for old in sorted(glob.glob(os.path.join(PROFILE_DIR, "*.json")))[:-PROFILE_MAX_FILES or None]:
+        for path in (old, old[:-len(".json")] + ".prof"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class ProfilingMiddleware:
+    """Pure ASGI; requests that aren't profiled pay one header scan and a random()"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode(): v.decode("latin-1") for k, v in scope["headers"] if k in (b"x-profile", b"x-api-key")}
+        requested = headers.get("x-profile", "").lower() in ("1", "true", "yes") and _is_admin(headers)
+        if not requested and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        profile = _Profile()
+        token = _current.set(profile)
+        status = 500
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        profiler = cProfile.Profile() if _profiler_lock.acquire(blocking=False) else None
+        cpu_start = time.thread_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _profiler_lock.release()
+            wall_ms = (time.perf_counter() - profile.start) * 1000
+            cpu_ms = (time.thread_time() - cpu_start) * 1000
+            _current.reset(token)
+            spans = profile.spans
+            document = {
+                "id": profile.id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(scope.get("route"), "path_format", None),
+                "status": status,
+                "trigger": "header" if requested else "sample",
+                "wall_ms": round(wall_ms, 3),
+                "loop_cpu_ms": round(cpu_ms, 3),
+                "sql": {"count": sum(s["kind"] == "sql" for s in spans),
+                        "total_ms": round(sum(s["duration_ms"] for s in spans if s["kind"] == "sql"), 3)},
+                "http": {"count": sum(s["kind"] == "http" for s in spans),
+                         "total_ms": round(sum(s["duration_ms"] for s in spans if s["kind"] == "http"), 3)},
+                "spans": spans,
+                "spans_dropped": profile.dropped,
+                # None when another profiled request held the profiler
+                "functions": _top_functions(profiler) if profiler is not None else None
+            }
+            await run_in_threadpool(_save, document, profiler)
+
+# ===== Admin endpoints =====
+
+async def require_admin(request: Request):
+    if not _is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="Admin API key required")
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+def _profile_path(profile_id: str, suffix: str) -> str:
+    if not profile_id.replace("-", "").isalnum():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = os.path.join(PROFILE_DIR, profile_id + suffix)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return path
+
+@router.get("")
+async def list_profiles():
+    """Stored profiles, newest first"""
+    def read():
+        summaries = []
+        for path in sorted(glob.glob(os.path.join(PROFILE_DIR, "*.json")), reverse=True):
+            try:
+                with open(path) as f:
+                    doc = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({k: doc.get(k) for k in ("id", "method", "path", "route", "status", "trigger",
+                                                      "wall_ms", "loop_cpu_ms", "sql", "http")})
+        return summaries
+    return {"profiles": await run_in_threadpool(read)}
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str):
+    """Full profile: timings, SQL/HTTP spans and top functions"""
+    return FileResponse(_profile_path(profile_id, ".json"), media_type="application/json")
+
+@router.get("/{profile_id}/pstats")
+async def download_pstats(profile_id: str):
+    """Raw cProfile dump for pstats/snakeviz"""
+    return FileResponse(_profile_path(profile_id, ".prof"), media_type="application/octet-stream",
+                        filename=f"{profile_id}.prof")
+
+def enable_profiling(app, prefix: str):
+    """Add the profiling middleware and mount the admin endpoints at prefix"""
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(router, prefix=prefix, tags=["Profiling"], include_in_schema=False)
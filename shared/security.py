@@ -2,22 +2,25 @@
 Aegis API Security Middleware
 - API Key Authentication
 - Rate Limiting
-- Request Logging
+- Request Logging (structured JSON, written off the event loop, sampled)
 """
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import APIKeyHeader
 from starlette.middleware.base import BaseHTTPMiddleware
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import json
+import queue
+import random
 import time
 import os
 import logging
+import uuid
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger("aegis-api")
 
 # API Key configuration
@@ -107,28 +110,155 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         return await call_next(request)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Request logging middleware"""
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        client_ip = get_client_ip(request)
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Calculate duration
-        duration = time.time() - start_time
-        
-        # Log request
-        logger.info(
-            f"{request.method} {request.url.path} - "
-            f"Status: {response.status_code} - "
-            f"Duration: {duration:.3f}s - "
-            f"IP: {client_ip}"
-        )
-        
-        return response
+# ===== Structured logging =====
+
+# Logging configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records; overflow is dropped, never blocks
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # fraction of successful requests logged
+LOG_SAMPLE_ROUTES = os.getenv("LOG_SAMPLE_ROUTES", "/health=0,/metrics=0")  # per-route overrides
+LOG_SLOW_MS = float(os.getenv("LOG_SLOW_MS", "1000"))  # slower requests are always logged
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_listener: Optional[QueueListener] = None
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    """'/health=0,/api/soc/alerts/=0.1' -> {route template: sample rate}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, rate = item.rpartition("=")
+        rates[route] = float(rate)
+    return rates
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured fields come from extra={"fields": {...}}"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; formatting and I/O happen there"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and request ID now, while the caller's state and context are current
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(service: str):
+    """
+    Route all logging through a bounded queue to a listener thread that
+    writes JSON lines to stdout. Call once at startup (idempotent).
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter(service))
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # flushes what is still queued
+
+    root = logging.getLogger()
+    root.handlers = [_NonBlockingQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    # uvicorn's own loggers go through the queue too; its access log is
+    # replaced by RequestLoggingMiddleware
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+class RequestLoggingMiddleware:
+    """
+    Pure ASGI request logging: assigns a request ID (X-Request-ID, echoed
+    back), then logs one structured record per request. Successful requests
+    are sampled (LOG_SAMPLE_RATE, LOG_SAMPLE_ROUTES by route template);
+    errors and requests slower than LOG_SLOW_MS are always logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.route_rates = _parse_rates(LOG_SAMPLE_ROUTES)
+        self.log = logging.getLogger("aegis.access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = forwarded = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+            elif name == b"x-forwarded-for":
+                forwarded = value.decode("latin-1").split(",")[0].strip()
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status = 500
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            route = getattr(scope.get("route"), "path_format", None)
+            if status >= 400 or duration_ms >= LOG_SLOW_MS or self._sampled(route):
+                client = forwarded or (scope["client"][0] if scope.get("client") else None)
+                self.log.log(
+                    logging.WARNING if status >= 500 else logging.INFO,
+                    f"{scope['method']} {scope['path']} {status}",
+                    extra={"fields": {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "route": route,
+                        "status": status,
+                        "duration_ms": round(duration_ms, 2),
+                        "client": client,
+                        "slow": duration_ms >= LOG_SLOW_MS
+                    }}
+                )
+            request_id_var.reset(token)
+
+    def _sampled(self, route: Optional[str]) -> bool:
+        rate = self.route_rates.get(route, LOG_SAMPLE_RATE)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
 
 class ErrorHandlingMiddleware(BaseHTTPMiddleware):
     """Global error handling middleware"""
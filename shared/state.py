@@ -0,0 +1,237 @@
+"""
+Aegis State - job and scan state that every worker process can see
+
+Services used to keep jobs and scans in module-level dicts, which only work
+with a single uvicorn worker: each process had its own copy. Routers now
+keep that state in a StateStore namespace on a pluggable backend, chosen
+with STATE_BACKEND:
+
+- memory (default): a lock-protected dict in this process, for a single
+  worker and for development
+- sqlite: one WAL-mode SQLite file (STATE_DB_PATH) shared by all worker
+  processes of a container; writes are short IMMEDIATE transactions
+
+Values are stored encoded (JSON by default) on both backends, so an object
+read from a store is a copy: change it and write it back with set(), or use
+update() for an atomic read-modify-write when several requests or workers
+may change the same record. The sqlite backend also carries a small event
+log (publish/read_events) so in-process pub/sub can be relayed between
+workers.
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "/app/data/state.db")
+BUSY_TIMEOUT_MS = 5000
+
+class MemoryBackend:
+    """Namespaced key/value state in this process"""
+    shared = False
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.RLock()  # handlers on the loop and in the threadpool both write
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._data.get(namespace, {}).get(key)
+
+    def set(self, namespace: str, key: str, raw: str):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = raw
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            return self._data.get(namespace, {}).pop(key, None) is not None
+
+    def items(self, namespace: str) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._data.get(namespace, {}).items())
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return len(self._data.get(namespace, {}))
+
+    def update(self, namespace: str, key: str, fn: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        with self._lock:
+            raw = fn(self.get(namespace, key))
+            if raw is None:
+                self.delete(namespace, key)
+            else:
+                self.set(namespace, key, raw)
+            return raw
+
+class SQLiteBackend:
+    """Namespaced key/value state in a SQLite file shared by worker processes"""
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()  # sqlite3 connections stay on their thread
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS state (namespace TEXT NOT NULL, key TEXT NOT NULL, "
+                         "value TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (namespace, key)) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS state_events (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "channel TEXT NOT NULL, origin TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)")
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        A write transaction: the write lock is taken up front, so reads inside
+        it stay current. Nested calls join the outermost transaction.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        row = self.connection().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return row[0] if row else None
+
+    def set(self, namespace: str, key: str, raw: str):
+        self.connection().execute(
+            "INSERT INTO state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (namespace, key, raw, time.time()))
+
+    def delete(self, namespace: str, key: str) -> bool:
+        cursor = self.connection().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+        return cursor.rowcount > 0
+
+    def items(self, namespace: str) -> List[Tuple[str, str]]:
+        return self.connection().execute("SELECT key, value FROM state WHERE namespace = ?", (namespace,)).fetchall()
+
+    def count(self, namespace: str) -> int:
+        return self.connection().execute("SELECT count(*) FROM state WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def update(self, namespace: str, key: str, fn: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        with self.transaction():
+            raw = fn(self.get(namespace, key))
+            if raw is None:
+                self.delete(namespace, key)
+            else:
+                self.set(namespace, key, raw)
+            return raw
+
+    # ----- event relay -----
+
+    def publish(self, channel: str, origin: str, payload: str):
+        self.connection().execute(
+            "INSERT INTO state_events (channel, origin, payload, created_at) VALUES (?, ?, ?, ?)",
+            (channel, origin, payload, time.time()))
+
+    def read_events(self, channel: str, after: int, limit: int = 500) -> List[Tuple[int, str, str]]:
+        """(id, origin, payload) of the events after cursor `after`, oldest first"""
+        return self.connection().execute(
+            "SELECT id, origin, payload FROM state_events WHERE id > ? AND channel = ? ORDER BY id LIMIT ?",
+            (after, channel, limit)).fetchall()
+
+    def last_event_id(self) -> int:
+        return self.connection().execute("SELECT coalesce(max(id), 0) FROM state_events").fetchone()[0]
+
+    def prune_events(self, older_than: float):
+        self.connection().execute("DELETE FROM state_events WHERE created_at < ?", (time.time() - older_than,))
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def state_backend():
+    """The process-wide backend selected by STATE_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STATE_BACKEND == "memory":
+                _backend = MemoryBackend()
+            elif STATE_BACKEND == "sqlite":
+                _backend = SQLiteBackend(STATE_DB_PATH)
+            else:
+                raise ValueError(f"Unknown STATE_BACKEND {STATE_BACKEND!r} (expected memory or sqlite)")
+        return _backend
+
+class StateStore:
+    """One namespace of records, e.g. a service's jobs, on the configured backend"""
+
+    def __init__(self, namespace: str, encode: Callable[[Any], str] = json.dumps,
+                 decode: Callable[[str], Any] = json.loads, backend=None):
+        self.namespace = namespace
+        self._encode = encode
+        self._decode = decode
+        self._backend = backend or state_backend()
+
+    def __contains__(self, key: str) -> bool:
+        return self._backend.get(self.namespace, key) is not None
+
+    def __len__(self) -> int:
+        return self._backend.count(self.namespace)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self._backend.get(self.namespace, key)
+        return default if raw is None else self._decode(raw)
+
+    def set(self, key: str, value: Any):
+        self._backend.set(self.namespace, key, self._encode(value))
+
+    def delete(self, key: str) -> bool:
+        return self._backend.delete(self.namespace, key)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(key, self._decode(raw)) for key, raw in self._backend.items(self.namespace)]
+
+    def values(self) -> List[Any]:
+        return [self._decode(raw) for _, raw in self._backend.items(self.namespace)]
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Atomically remove a record and return it"""
+        removed = default
+
+        def take(value: Any) -> None:
+            nonlocal removed
+            if value is not None:
+                removed = value
+            return None
+
+        self.update(key, take)
+        return removed
+
+    def update(self, key: str, fn: Callable[[Any], Any]) -> Any:
+        """
+        Atomically replace a record with fn(current record, or None if there
+        is none) and return the result; fn returning None deletes the record.
+        Reads and updates of other records inside fn join the same transaction.
+        """
+        result = None
+
+        def apply(raw: Optional[str]) -> Optional[str]:
+            nonlocal result
+            result = fn(None if raw is None else self._decode(raw))
+            return None if result is None else self._encode(result)
+
+        self._backend.update(self.namespace, key, apply)
+        return result